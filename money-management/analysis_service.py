@@ -1,11 +1,15 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import io
 import base64
-from datetime import datetime, timedelta
+import threading
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, date as _date
 import platform
-from matplotlib import font_manager
+
+# pandas and matplotlib are imported inside the functions that need them: importing this
+# module (and therefore the API) stays cheap, and CRUD-only workers never pay for them.
+# Call warm_up() to load them ahead of the first report instead.
 
 # --- Configuration ---
 
@@ -14,168 +18,311 @@ def configure_fonts() -> None:
     Configures matplotlib to use a Chinese-compatible font.
     Tries to detect common Chinese fonts on Windows/macOS/Linux.
     """
+    import matplotlib
+
     system = platform.system()
     
     # Common Chinese fonts to check
     # SimHei (Windows), Arial Unicode MS (macOS), WenQuanYi Micro Hei (Linux)
     # Microsoft YaHei is also good on Windows
     
-    plt.rcParams['axes.unicode_minus'] = False # Fix minus sign display
+    matplotlib.rcParams['axes.unicode_minus'] = False # Fix minus sign display
     
     try:
         if system == "Windows":
-            plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'SimSun', 'sans-serif']
+            matplotlib.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'SimSun', 'sans-serif']
         elif system == "Darwin":
-            plt.rcParams['font.sans-serif'] = ['Arial Unicode MS', 'PingFang SC', 'sans-serif']
+            matplotlib.rcParams['font.sans-serif'] = ['Arial Unicode MS', 'PingFang SC', 'sans-serif']
         else:
-            plt.rcParams['font.sans-serif'] = ['WenQuanYi Micro Hei', 'Droid Sans Fallback', 'sans-serif']
+            matplotlib.rcParams['font.sans-serif'] = ['WenQuanYi Micro Hei', 'Droid Sans Fallback', 'sans-serif']
     except Exception as e:
         print(f"Warning: Font configuration failed: {e}")
 
-# Apply font configuration on module load
-configure_fonts()
-
 # --- Feature 1: Visual Report ---
 
-def generate_visual_report(expense_list: list) -> str:
+# Custom Neon Palette
+NEON_PALETTE = ['#08F7FE', '#FE53BB', '#F5D300', '#00ff41', '#FF2C05', '#bc13fe']
+BACKGROUND_COLOR = '#212946'  # Dark blue-grey background
+
+# In-process renders temporarily swap global rcParams, so they must not interleave
+_style_lock = threading.Lock()
+
+# Per-thread list of (stage, seconds) while inside collect_stage_timings()
+_stage_timings = threading.local()
+
+
+@contextmanager
+def collect_stage_timings():
     """
-    Generates a visual report (Pie Chart + Line Chart) from expense data.
-    
+    Collects how long each report stage ("data", "plot", "savefig") run by this thread
+    inside the block took. Yields the list of (stage, seconds) pairs, filled as stages finish.
+    """
+    timings = []
+    previous = getattr(_stage_timings, "current", None)
+    _stage_timings.current = timings
+    try:
+        yield timings
+    finally:
+        _stage_timings.current = previous
+
+
+@contextmanager
+def _timed_stage(stage: str):
+    timings = getattr(_stage_timings, "current", None)
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.append((stage, time.perf_counter() - started))
+
+
+def apply_report_style() -> None:
+    """
+    Applies the report style (dark background + Chinese fonts) to this process for good.
+    Meant for dedicated render worker processes, see render_engine.py.
+    """
+    import matplotlib.style
+
+    matplotlib.style.use('dark_background')
+    configure_fonts()
+
+
+def _fold_categories(category_totals: dict) -> list:
+    """Sorts category totals (largest first) and folds slices under 5% into "其他" (Others)."""
+    ranked = sorted(category_totals.items(), key=lambda item: item[1], reverse=True)
+
+    # --- Optimization: Group small slices into "Others" ---
+    total_sum = sum(amount for _, amount in ranked)
+    threshold = 0.05 # Categories < 5% go to "Others"
+
+    # Split into big and small
+    big_cats = [(name, float(amount)) for name, amount in ranked if total_sum and amount / total_sum >= threshold]
+    small_cats = [amount for name, amount in ranked if not (total_sum and amount / total_sum >= threshold)]
+
+    if small_cats:
+        big_cats.append(('其他', float(sum(small_cats))))
+    return big_cats
+
+
+def _assemble_report_data(category_totals: dict, daily: list) -> dict:
+    """
+    Shapes aggregated inputs into report data.
+
+    Args:
+        category_totals (dict): category -> amount, or None if the input had no categories.
+        daily (list): (date, amount) pairs sorted by date.
+    """
+    if category_totals:
+        top_cat, top_cat_amount = max(category_totals.items(), key=lambda item: item[1])
+        categories = _fold_categories(category_totals)
+    else:
+        top_cat, top_cat_amount = "N/A", 0
+        categories = None
+
+    return {
+        "total_spent": float(sum(amount for _, amount in daily)),
+        "top_category": top_cat,
+        "top_category_amount": float(top_cat_amount),
+        "date_range": f"{daily[0][0].strftime('%m/%d')} - {daily[-1][0].strftime('%m/%d')}",
+        "categories": categories,
+        "daily": daily,
+    }
+
+
+def _is_arrow_table(data) -> bool:
+    # Checked by type name so pyarrow stays an optional dependency
+    return type(data).__module__.startswith("pyarrow") and hasattr(data, "to_pandas")
+
+
+def build_report_data(expense_list: list) -> dict:
+    """
+    Computes the series a visual report is drawn from.
+
     Args:
         expense_list (list): List of dicts, e.g.,
-                             [{"date": "2025-12-01", "item": "...", "amount": 5.5, "category": "Food"}]
-                             
+                             [{"date": "2025-12-01", "item": "...", "amount": 5.5, "category": "Food"}],
+                             or a pyarrow Table with the same columns (see snapshot.load_expenses).
+
     Returns:
-        str: Base64 encoded image string (PNG format).
+        dict: Plain, picklable data (totals, category breakdown, daily series),
+              or an empty dict if there is nothing to draw.
     """
-    if not expense_list:
-        return "" 
+    if expense_list is None or len(expense_list) == 0:
+        return {}
+
+    with _timed_stage("data"):
+        return _build_report_data(expense_list)
+
+
+def _build_report_data(expense_list) -> dict:
+    import pandas as pd
+
+    if _is_arrow_table(expense_list):
+        # Columnar input: convert only the columns the report uses, no per-row Python objects
+        wanted = [c for c in ("date", "transaction_date", "amount", "category") if c in expense_list.column_names]
+        df = expense_list.select(wanted).to_pandas()
+    else:
+        df = pd.DataFrame(expense_list)
 
-    # 1. Data Processing
-    df = pd.DataFrame(expense_list)
-    
     # Ensure date is datetime
     # Adjust column name if necessary based on actual input, but prompt specified 'date'
     date_col = 'date' if 'date' in df.columns else 'transaction_date'
     if date_col in df.columns:
-        df[date_col] = pd.to_datetime(df[date_col])
+        # Day resolution: timestamps with a time of day still make one point per day
+        df[date_col] = pd.to_datetime(df[date_col]).dt.normalize()
     else:
         # Fallback or error if no date column found
-        return ""
-        
-    # 2. Plotting
+        return {}
+
+    category_totals = None
+    if 'category' in df.columns:
+        category_totals = df.groupby('category')['amount'].sum().to_dict()
+
+    daily_data = df.groupby(date_col)['amount'].sum()
+    daily = [(ts.to_pydatetime(), float(amount)) for ts, amount in daily_data.items()]
+
+    return _assemble_report_data(category_totals, daily)
+
+
+def report_data_from_rollups(rollups: list) -> dict:
+    """
+    Computes report data from daily rollup rows instead of raw expenses (no pandas).
+
+    Args:
+        rollups (list): Dicts with "date", "category" and "amount" (the day's total),
+                        e.g. built from crud.get_daily_rollups.
+
+    Returns:
+        dict: Same shape as build_report_data.
+    """
+    if not rollups:
+        return {}
+
+    with _timed_stage("data"):
+        category_totals = {}
+        daily_totals = {}
+        for row in rollups:
+            category_totals[row["category"]] = category_totals.get(row["category"], 0.0) + row["amount"]
+            daily_totals[row["date"]] = daily_totals.get(row["date"], 0.0) + row["amount"]
+
+        return _assemble_report_data(category_totals, sorted(daily_totals.items()))
+
+
+def report_series(data: dict) -> dict:
+    """
+    Turns report data (build_report_data / report_data_from_rollups output) into compact,
+    JSON-ready chart series for clients that draw the charts themselves.
+
+    Returns:
+        dict: The summary values, "categories" as [name, amount] pairs (largest first,
+              small slices folded into "其他") and "daily" as ["YYYY-MM-DD", amount] pairs.
+    """
+    return {
+        "total_spent": round(data["total_spent"], 2),
+        "top_category": data["top_category"],
+        "top_category_amount": round(data["top_category_amount"], 2),
+        "date_range": data["date_range"],
+        "categories": [[name, round(amount, 2)] for name, amount in data["categories"] or []],
+        "daily": [[day.strftime("%Y-%m-%d"), round(amount, 2)] for day, amount in data["daily"]],
+    }
+
+
+def build_report_figure(data: dict):
+    """
+    Builds the report figure (Summary + Donut Chart + Trend Line) from `build_report_data` output.
+
+    Uses the object-oriented Figure/Axes API only, so no pyplot figure manager or
+    per-call style changes are involved. The caller is responsible for the rc style
+    (see apply_report_style / render_visual_report).
+
+    Returns:
+        matplotlib.figure.Figure
+    """
+    with _timed_stage("plot"):
+        return _build_report_figure(data)
+
+
+def _build_report_figure(data: dict):
     import matplotlib.patheffects as path_effects
+    from matplotlib.figure import Figure
 
-    # Use a dark/cyberpunk style
-    plt.style.use('dark_background')
-    
-    # Custom Neon Palette
-    neon_palette = ['#08F7FE', '#FE53BB', '#F5D300', '#00ff41', '#FF2C05', '#bc13fe']
-    sns.set_palette(neon_palette)
-    
-    # Ensure fonts are set again after style change
-    configure_fonts() 
-    
-    # Create a Grid Layout: 
+    # Create a Grid Layout:
     # Top Left: Summary Text
     # Top Right: Donut Chart
     # Bottom: Area Chart
-    fig = plt.figure(figsize=(12, 10))
-    fig.patch.set_facecolor('#212946') # Dark blue-grey background
-    
-    grid = plt.GridSpec(2, 2, height_ratios=[1, 1.2], hspace=0.3, wspace=0.3)
-    
+    fig = Figure(figsize=(12, 10))
+    fig.patch.set_facecolor(BACKGROUND_COLOR)
+
+    grid = fig.add_gridspec(2, 2, height_ratios=[1, 1.2], hspace=0.3, wspace=0.3)
+
     # --- A. Summary Panel (Top Left) ---
     ax_text = fig.add_subplot(grid[0, 0])
-    ax_text.set_facecolor('#212946')
+    ax_text.set_facecolor(BACKGROUND_COLOR)
     ax_text.axis('off')
-    
-    # Calculate totals
-    total_spent = df['amount'].sum()
-    if 'category' in df.columns:
-        top_cat = df.groupby('category')['amount'].sum().idxmax()
-        top_cat_amount = df.groupby('category')['amount'].sum().max()
-    else:
-        top_cat = "N/A"
-        top_cat_amount = 0
-        
-    date_range = f"{df[date_col].min().strftime('%m/%d')} - {df[date_col].max().strftime('%m/%d')}"
-    
-    # Text Effect: Glow/Outline
-    glow_effect = [path_effects.withStroke(linewidth=3, foreground='#212946')]
 
     # Draw fancy text
     t1 = ax_text.text(0.1, 0.9, "本周消费总览", fontsize=20, color='#08F7FE', fontweight='heavy', fontfamily='sans-serif')
-    t1.set_path_effects([path_effects.withStroke(linewidth=3, foreground='#212946', alpha=0.8)])
-    
-    t2 = ax_text.text(0.1, 0.65, f"￥{total_spent:,.2f}", fontsize=40, color='white', fontweight='bold')
+    t1.set_path_effects([path_effects.withStroke(linewidth=3, foreground=BACKGROUND_COLOR, alpha=0.8)])
+
+    t2 = ax_text.text(0.1, 0.65, f"￥{data['total_spent']:,.2f}", fontsize=40, color='white', fontweight='bold')
     # Add a subtle shadow/glow to the main number to make it pop
     t2.set_path_effects([path_effects.SimpleLineShadow(offset=(2, -2), alpha=0.3), path_effects.Normal()])
-    
-    t3 = ax_text.text(0.1, 0.45, f"周期: {date_range}", fontsize=14, color='#e0e0e0', fontweight='bold')
-    
-    t4 = ax_text.text(0.1, 0.25, f"最大开销: {top_cat}", fontsize=14, color='#FE53BB', fontweight='bold')
-    t5 = ax_text.text(0.1, 0.10, f"金额: ￥{top_cat_amount:,.2f}", fontsize=14, color='#FE53BB', fontweight='bold')
+
+    ax_text.text(0.1, 0.45, f"周期: {data['date_range']}", fontsize=14, color='#e0e0e0', fontweight='bold')
+
+    ax_text.text(0.1, 0.25, f"最大开销: {data['top_category']}", fontsize=14, color='#FE53BB', fontweight='bold')
+    ax_text.text(0.1, 0.10, f"金额: ￥{data['top_category_amount']:,.2f}", fontsize=14, color='#FE53BB', fontweight='bold')
 
     # --- B. Donut Chart (Top Right) ---
     ax_pie = fig.add_subplot(grid[0, 1])
-    ax_pie.set_facecolor('#212946')
-    
-    if 'category' in df.columns:
-        raw_cat_data = df.groupby('category')['amount'].sum().sort_values(ascending=False)
-        
-        # --- Optimization: Group small slices into "Others" ---
-        total_sum = raw_cat_data.sum()
-        threshold = 0.05 # Categories < 5% go to "Others"
-        
-        # Split into big and small
-        big_cats = raw_cat_data[raw_cat_data / total_sum >= threshold]
-        small_cats = raw_cat_data[raw_cat_data / total_sum < threshold]
-        
-        if not small_cats.empty:
-            others_sum = small_cats.sum()
-            # Create a new series for plotting
-            category_data = big_cats.copy()
-            category_data['其他'] = others_sum
-        else:
-            category_data = raw_cat_data
+    ax_pie.set_facecolor(BACKGROUND_COLOR)
+
+    categories = data['categories']
+    if categories:
+        labels = [name for name, _ in categories]
+        amounts = [amount for _, amount in categories]
 
         # Donut chart
         wedges, texts, autotexts = ax_pie.pie(
-            category_data, 
-            labels=category_data.index, 
-            autopct='%1.1f%%', 
+            amounts,
+            labels=labels,
+            autopct='%1.1f%%',
             startangle=140,
-            colors=neon_palette[:len(category_data)],
-            wedgeprops=dict(width=0.4, edgecolor='#212946', linewidth=2), # Thicker edge for cleaner look
+            colors=NEON_PALETTE[:len(amounts)],
+            wedgeprops=dict(width=0.4, edgecolor=BACKGROUND_COLOR, linewidth=2), # Thicker edge for cleaner look
             textprops=dict(color="white", fontsize=11, fontweight='bold'),
             pctdistance=0.80  # Move percentage text closer to the edge
         )
-        
+
         # Make percent labels stand out
-        plt.setp(autotexts, size=10, weight="bold", color="white")
+        for text in autotexts:
+            text.set(size=10, weight="bold", color="white")
         # Add stroke to labels for readability against dark background slices if they overlap
         for text in autotexts + texts:
-            text.set_path_effects([path_effects.withStroke(linewidth=2, foreground='#212946')])
-            
+            text.set_path_effects([path_effects.withStroke(linewidth=2, foreground=BACKGROUND_COLOR)])
+
         ax_pie.set_title('消费构成', color='white', fontsize=16, pad=20, fontweight='bold')
     else:
         ax_pie.text(0.5, 0.5, "No Category Data", ha='center', color='white')
 
     # --- C. Area Chart / Glow Line (Bottom) ---
     ax_line = fig.add_subplot(grid[1, :])
-    ax_line.set_facecolor('#212946')
-    
-    daily_data = df.groupby(date_col)['amount'].sum().reset_index()
-    
+    ax_line.set_facecolor(BACKGROUND_COLOR)
+
+    days = [day for day, _ in data['daily']]
+    amounts = [amount for _, amount in data['daily']]
+
     # Main line
-    sns.lineplot(data=daily_data, x=date_col, y='amount', ax=ax_line, 
-                 color='#08F7FE', linewidth=3, marker='o', markersize=8, markeredgecolor='white', markeredgewidth=2)
-    
+    ax_line.plot(days, amounts, color='#08F7FE', linewidth=3, marker='o', markersize=8,
+                 markeredgecolor='white', markeredgewidth=2)
+
     # "Glow" effect - simple fill under
-    ax_line.fill_between(daily_data[date_col], daily_data['amount'], color='#08F7FE', alpha=0.15)
-    ax_line.fill_between(daily_data[date_col], daily_data['amount'], color='#08F7FE', alpha=0.08) # Layering for gradient feel
-    
+    ax_line.fill_between(days, amounts, color='#08F7FE', alpha=0.15)
+    ax_line.fill_between(days, amounts, color='#08F7FE', alpha=0.08) # Layering for gradient feel
+
     # Grid styling
     ax_line.grid(color='#2A3459', linestyle='--', alpha=0.6) # Dashed grid
     ax_line.spines['bottom'].set_color('#4A5580')
@@ -184,63 +331,248 @@ def generate_visual_report(expense_list: list) -> str:
     ax_line.spines['left'].set_linewidth(2)
     ax_line.spines['top'].set_visible(False)
     ax_line.spines['right'].set_visible(False)
-    
+
     ax_line.tick_params(axis='x', colors='white', labelsize=10)
     ax_line.tick_params(axis='y', colors='white', labelsize=10)
-    
+
     ax_line.set_title('每日消费趋势 (Neon Trend)', color='white', fontsize=16, pad=20, fontweight='bold')
     ax_line.set_xlabel('', color='white')
     ax_line.set_ylabel('金额 (CNY)', color='white', fontweight='bold')
-    
+
     # Format x-axis dates nicely
     fig.autofmt_xdate()
-    
-    # plt.tight_layout() # tight_layout can conflict with custom GridSpec sometimes, use manual spacing if needed
-    
-    # 3. Output
-    buffer = io.BytesIO()
+
+    return fig
+
+
+class _ReportTemplate:
+    """
+    The report figure with everything that does not depend on the data already built:
+    layout, fonts, titles, spines, grid and tick styling, path effects. update() only
+    swaps the data artists (summary values, donut wedges, trend line), which is a
+    fraction of building the figure from scratch. One per thread, see _report_template().
+    """
+
+    def __init__(self):
+        import matplotlib.patheffects as path_effects
+        from matplotlib.figure import Figure
+
+        self._path_effects = path_effects
+        self.fig = Figure(figsize=(12, 10))
+        self.fig.patch.set_facecolor(BACKGROUND_COLOR)
+        grid = self.fig.add_gridspec(2, 2, height_ratios=[1, 1.2], hspace=0.3, wspace=0.3)
+
+        # --- A. Summary Panel (Top Left) ---
+        ax_text = self.fig.add_subplot(grid[0, 0])
+        ax_text.set_facecolor(BACKGROUND_COLOR)
+        ax_text.axis('off')
+        t1 = ax_text.text(0.1, 0.9, "本周消费总览", fontsize=20, color='#08F7FE', fontweight='heavy', fontfamily='sans-serif')
+        t1.set_path_effects([path_effects.withStroke(linewidth=3, foreground=BACKGROUND_COLOR, alpha=0.8)])
+        self.total_text = ax_text.text(0.1, 0.65, "", fontsize=40, color='white', fontweight='bold')
+        self.total_text.set_path_effects([path_effects.SimpleLineShadow(offset=(2, -2), alpha=0.3), path_effects.Normal()])
+        self.range_text = ax_text.text(0.1, 0.45, "", fontsize=14, color='#e0e0e0', fontweight='bold')
+        self.top_text = ax_text.text(0.1, 0.25, "", fontsize=14, color='#FE53BB', fontweight='bold')
+        self.top_amount_text = ax_text.text(0.1, 0.10, "", fontsize=14, color='#FE53BB', fontweight='bold')
+
+        # --- B. Donut Chart (Top Right) ---
+        self.ax_pie = self.fig.add_subplot(grid[0, 1])
+        self.ax_pie.set_facecolor(BACKGROUND_COLOR)
+        self.pie_title = self.ax_pie.set_title('消费构成', color='white', fontsize=16, pad=20, fontweight='bold')
+        self.no_category_text = self.ax_pie.text(0.5, 0.5, "No Category Data", ha='center', color='white')
+        self.pie_artists = []
+
+        # --- C. Area Chart / Glow Line (Bottom) ---
+        self.ax_line = self.fig.add_subplot(grid[1, :])
+        ax_line = self.ax_line
+        ax_line.set_facecolor(BACKGROUND_COLOR)
+        # Dates on x from the start, so later set_data calls are converted like a fresh plot
+        ax_line.xaxis.update_units([_date(2000, 1, 1)])
+        self.line, = ax_line.plot([], [], color='#08F7FE', linewidth=3, marker='o', markersize=8,
+                                  markeredgecolor='white', markeredgewidth=2)
+        self.fills = []
+
+        ax_line.grid(color='#2A3459', linestyle='--', alpha=0.6) # Dashed grid
+        ax_line.spines['bottom'].set_color('#4A5580')
+        ax_line.spines['left'].set_color('#4A5580')
+        ax_line.spines['bottom'].set_linewidth(2)
+        ax_line.spines['left'].set_linewidth(2)
+        ax_line.spines['top'].set_visible(False)
+        ax_line.spines['right'].set_visible(False)
+        ax_line.tick_params(axis='x', colors='white', labelsize=10)
+        ax_line.tick_params(axis='y', colors='white', labelsize=10)
+        ax_line.set_title('每日消费趋势 (Neon Trend)', color='white', fontsize=16, pad=20, fontweight='bold')
+        ax_line.set_xlabel('', color='white')
+        ax_line.set_ylabel('金额 (CNY)', color='white', fontweight='bold')
+
+    def update(self, data: dict):
+        """Swaps in the data of one report (build_report_data output) and returns the figure."""
+        path_effects = self._path_effects
+
+        self.total_text.set_text(f"￥{data['total_spent']:,.2f}")
+        self.range_text.set_text(f"周期: {data['date_range']}")
+        self.top_text.set_text(f"最大开销: {data['top_category']}")
+        self.top_amount_text.set_text(f"金额: ￥{data['top_category_amount']:,.2f}")
+
+        for artist in self.pie_artists:
+            artist.remove()
+        self.pie_artists = []
+        categories = data['categories']
+        if categories:
+            amounts = [amount for _, amount in categories]
+            wedges, texts, autotexts = self.ax_pie.pie(
+                amounts,
+                labels=[name for name, _ in categories],
+                autopct='%1.1f%%',
+                startangle=140,
+                colors=NEON_PALETTE[:len(amounts)],
+                wedgeprops=dict(width=0.4, edgecolor=BACKGROUND_COLOR, linewidth=2),
+                textprops=dict(color="white", fontsize=11, fontweight='bold'),
+                pctdistance=0.80
+            )
+            for text in autotexts:
+                text.set(size=10, weight="bold", color="white")
+            for text in autotexts + texts:
+                text.set_path_effects([path_effects.withStroke(linewidth=2, foreground=BACKGROUND_COLOR)])
+            self.pie_artists = wedges + texts + autotexts
+        self.pie_title.set_visible(bool(categories))
+        self.no_category_text.set_visible(not categories)
+
+        days = [day for day, _ in data['daily']]
+        amounts = [amount for _, amount in data['daily']]
+        self.line.set_data(days, amounts)
+        for fill in self.fills:
+            fill.remove()
+        self.fills = [
+            self.ax_line.fill_between(days, amounts, color='#08F7FE', alpha=0.15),
+            self.ax_line.fill_between(days, amounts, color='#08F7FE', alpha=0.08),
+        ]
+        self.ax_line.relim()
+        self.ax_line.autoscale_view()
+        self.fig.autofmt_xdate()
+        return self.fig
+
+
+_templates = threading.local()
+
+
+def _report_template() -> _ReportTemplate:
+    # Built on first use in each thread (render workers: once per process), under the rc style active then
+    template = getattr(_templates, "template", None)
+    if template is None:
+        template = _templates.template = _ReportTemplate()
+    return template
+
+
+def draw_report_figure(data: dict):
+    """
+    Like build_report_figure, but reuses this thread's styled report figure and only
+    swaps the data in. The returned figure is only valid until the next call in this thread.
+    """
+    with _timed_stage("plot"):
+        return _report_template().update(data)
+
+
+def _save_png(fig, target) -> None:
     # Save with the facecolor to ensure background persists
-    plt.savefig(buffer, format='png', bbox_inches='tight', dpi=100, facecolor=fig.get_facecolor())
-    buffer.seek(0)
-    image_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-    plt.close(fig) # Close to free memory
+    with _timed_stage("savefig"):
+        fig.savefig(target, format='png', bbox_inches='tight', dpi=100, facecolor=fig.get_facecolor())
 
-    return image_base64
 
-# --- Feature 2: Toxic Prediction ---
+def draw_visual_report(data: dict) -> memoryview:
+    """
+    Draws the report and returns the PNG as a memoryview over the encoder's buffer,
+    so it can be handed to a file or HTTP response without another copy.
+    """
+    buffer = io.BytesIO()
+    _save_png(draw_report_figure(data), buffer)
+    return buffer.getbuffer()
 
-def toxic_prediction(expense_list: list, budget: float = 2000.0) -> str:
+
+def save_visual_report(data: dict, path: str) -> None:
     """
-    Generates a "toxic" prediction of month-end spending based on current progress.
+    Draws the report straight into `path`. The file is written under a temporary
+    name and renamed, so readers never see a half-written image.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        _save_png(draw_report_figure(data), f)
+    os.replace(tmp_path, path)
+
+
+def render_visual_report(data: dict, path: str = None):
+    """
+    Renders report data in the current process, scoping the report style to this call.
+
+    Returns:
+        memoryview: PNG image, or None when it was written to `path` instead.
+    """
+    import matplotlib.style
+
+    with _style_lock, matplotlib.style.context('dark_background'):
+        # Ensure fonts are set again after style change
+        configure_fonts()
+        if path:
+            return save_visual_report(data, path)
+        return draw_visual_report(data)
+
+
+def warm_up() -> None:
+    """
+    Pays the first-report costs ahead of time: imports pandas and matplotlib, builds
+    matplotlib's font cache, resolves the report fonts and draws one throwaway report.
+    """
+    import pandas  # noqa: F401
+    from matplotlib import font_manager
+
+    configure_fonts()
+    font_manager.findfont(font_manager.FontProperties(family=["sans-serif"]))
+    template = report_data_from_rollups([
+        {"date": _date(2025, 1, 1), "category": "餐饮", "amount": 1.0},
+        {"date": _date(2025, 1, 2), "category": "交通", "amount": 1.0},
+    ])
+    render_visual_report(template)
+
+
+def generate_visual_report(expense_list: list, output: str = "png"):
+    """
+    Generates a visual report (Pie Chart + Line Chart) from expense data.
     
     Args:
-        expense_list (list): List of expense dicts.
+        expense_list (list): List of dicts, e.g.,
+                             [{"date": "2025-12-01", "item": "...", "amount": 5.5, "category": "Food"}]
+        output (str): "png" for raw PNG bytes, "base64" for a Base64 encoded string.
+                             
+    Returns:
+        memoryview | str: PNG image (empty if there is no data).
+    """
+    data = build_report_data(expense_list)
+    if not data:
+        return "" if output == "base64" else memoryview(b"")
+
+    image = render_visual_report(data)
+    if output == "base64":
+        return base64.b64encode(image).decode('utf-8')
+    return image
+
+# --- Feature 2: Toxic Prediction ---
+
+NO_EXPENSES_MESSAGE = "本宫还没看到任何账单，去花点钱再来找我！"
+
+
+def forecast_month_end(current_total: float, budget: float = 2000.0, now: datetime = None) -> dict:
+    """
+    Pure-Python month-end forecast from the month-to-date total (no pandas, no row data).
+
+    Args:
+        current_total (float): Spending from the 1st of the month up to and including today.
         budget (float): Monthly budget.
-        
+        now (datetime): Reference time, defaults to the current time.
+
     Returns:
-        str: Markdown formatted string with the prediction and commentary.
+        dict: current_total, days_passed, days_in_month, daily_average, predicted_total, overrun.
     """
-    if not expense_list:
-        return "本宫还没看到任何账单，去花点钱再来找我！"
+    now = now or datetime.now()
 
-    df = pd.DataFrame(expense_list)
-    date_col = 'date' if 'date' in df.columns else 'transaction_date'
-    
-    if date_col in df.columns:
-        df[date_col] = pd.to_datetime(df[date_col])
-    
-    # Logic: Filter for current month
-    now = datetime.now()
-    current_month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    
-    # We filter data to only include this month's expenses for accurate prediction
-    if date_col in df.columns:
-        current_month_df = df[df[date_col] >= current_month_start]
-    else:
-        current_month_df = df # Fallback if no date
-    
-    current_total = current_month_df['amount'].sum()
-    
     # Days passed (including today)
     days_passed = now.day
     
@@ -260,14 +592,26 @@ def toxic_prediction(expense_list: list, budget: float = 2000.0) -> str:
         daily_average = current_total / days_passed
         
     predicted_total = current_total + (daily_average * days_left)
-    overrun = predicted_total - budget
-    
+    return {
+        "current_total": float(current_total),
+        "days_passed": days_passed,
+        "days_in_month": days_in_month,
+        "daily_average": daily_average,
+        "predicted_total": predicted_total,
+        "overrun": predicted_total - budget,
+    }
+
+
+def format_toxic_report(forecast: dict) -> str:
+    """Renders a forecast_month_end result in the toxic persona (Markdown)."""
+    overrun = forecast["overrun"]
+
     # Copywriting (Toxic Persona)
     report = f"### 🔮 毒舌AI 财运预测\n\n"
-    report += f"- **当前已花**: {current_total:.2f} 元\n"
-    report += f"- **本月进度**: {days_passed}/{days_in_month} 天\n"
-    report += f"- **日均消费**: {daily_average:.2f} 元\n"
-    report += f"- **预计月底**: {predicted_total:.2f} 元\n\n"
+    report += f"- **当前已花**: {forecast['current_total']:.2f} 元\n"
+    report += f"- **本月进度**: {forecast['days_passed']}/{forecast['days_in_month']} 天\n"
+    report += f"- **日均消费**: {forecast['daily_average']:.2f} 元\n"
+    report += f"- **预计月底**: {forecast['predicted_total']:.2f} 元\n\n"
     
     if overrun > 500:
         report += f"**💀 严重超支警告**\n\n"
@@ -280,3 +624,142 @@ def toxic_prediction(expense_list: list, budget: float = 2000.0) -> str:
         report += f"> 哟，居然没超支？预计结余 {abs(overrun):.2f} 元。保持这个节奏，本宫勉强夸你一句：干得漂亮。😏"
         
     return report
+
+
+def precomputed_forecast(forecast: dict, budget: float = 2000.0, now: datetime = None) -> dict:
+    """
+    Turns a stored batch forecast (current_total, daily_average, predicted_total) into a
+    forecast_month_end-shaped dict for the given budget.
+    """
+    result = forecast_month_end(forecast["current_total"], budget, now)
+    result["daily_average"] = forecast["daily_average"]
+    result["predicted_total"] = forecast["predicted_total"]
+    result["overrun"] = forecast["predicted_total"] - budget
+    return result
+
+
+def toxic_prediction_from_daily_totals(daily_totals: list, budget: float = 2000.0, now: datetime = None) -> str:
+    """
+    Generates the toxic prediction from this month's per-day sums,
+    e.g. the output of crud.get_month_daily_totals.
+
+    Args:
+        daily_totals (list): (day, total) pairs for the current month up to today.
+        budget (float): Monthly budget.
+    """
+    if not daily_totals:
+        return NO_EXPENSES_MESSAGE
+    current_total = sum(total for _, total in daily_totals)
+    return format_toxic_report(forecast_month_end(current_total, budget, now))
+
+
+def toxic_prediction(expense_list: list, budget: float = 2000.0) -> str:
+    """
+    Generates a "toxic" prediction of month-end spending based on current progress.
+    
+    Args:
+        expense_list (list): List of expense dicts.
+        budget (float): Monthly budget.
+        
+    Returns:
+        str: Markdown formatted string with the prediction and commentary.
+    """
+    if not expense_list:
+        return NO_EXPENSES_MESSAGE
+
+    # Logic: Filter for current month
+    now = datetime.now()
+    current_month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    # We filter data to only include this month's expenses for accurate prediction
+    current_total = 0.0
+    for e in expense_list:
+        date = e.get('date', e.get('transaction_date'))
+        if isinstance(date, str):
+            date = datetime.fromisoformat(date)
+        elif isinstance(date, _date) and not isinstance(date, datetime):
+            date = datetime.combine(date, datetime.min.time())
+        if date is None or date >= current_month_start:
+            current_total += e['amount']
+
+    return format_toxic_report(forecast_month_end(current_total, budget, now))
+
+
+# --- Feature 3: Batch Forecast (all users) ---
+
+# History used by the weekday-seasonality model
+SEASONALITY_WEEKS = 8
+
+
+def batch_forecast(daily_totals, budget: float = 2000.0, now: datetime = None, seasonality: bool = False):
+    """
+    Month-end forecast for many users in one vectorized pass.
+
+    Args:
+        daily_totals: DataFrame, pyarrow Table (or records) with columns user_id, date, amount —
+                      one row per user and day, e.g. crud.get_daily_totals_for_all_users or
+                      snapshot.load_daily_totals. For the seasonality
+                      model it should reach back SEASONALITY_WEEKS before today.
+        budget (float): Budget used for the `overrun` column.
+        now (datetime): Reference time, defaults to the current time.
+        seasonality (bool): Predict the rest of the month from each user's average spending per
+                            weekday over the last SEASONALITY_WEEKS weeks, instead of the flat
+                            month-to-date daily average.
+
+    Returns:
+        DataFrame indexed by user_id with current_total, daily_average, predicted_total, overrun.
+    """
+    import numpy as np
+    import pandas as pd
+
+    now = now or datetime.now()
+    if isinstance(daily_totals, pd.DataFrame):
+        frame = daily_totals
+    elif _is_arrow_table(daily_totals):
+        frame = daily_totals.select(["user_id", "date", "amount"]).to_pandas()
+    else:
+        frame = pd.DataFrame.from_records(daily_totals, columns=["user_id", "date", "amount"])
+    columns = ["current_total", "daily_average", "predicted_total", "overrun"]
+    if frame.empty:
+        return pd.DataFrame(columns=columns, index=pd.Index([], name="user_id"))
+
+    dates = pd.to_datetime(frame["date"])
+    today = pd.Timestamp(now.date())
+    month_start = today.replace(day=1)
+    month_end = month_start + pd.offsets.MonthEnd(0)
+    days_passed = today.day
+    days_left = (month_end - today).days
+
+    users = pd.Index(frame["user_id"].unique(), name="user_id")
+    in_month = (dates >= month_start) & (dates <= today)
+    current_total = frame.loc[in_month].groupby("user_id")["amount"].sum().reindex(users, fill_value=0.0)
+    daily_average = current_total / days_passed
+
+    if seasonality:
+        # Mean spend per (user, weekday) over full past weeks, then summed over the remaining days' weekdays
+        history_start = today - pd.Timedelta(weeks=SEASONALITY_WEEKS)
+        in_history = (dates >= history_start) & (dates < today)
+        history = frame.loc[in_history].assign(weekday=dates[in_history].dt.weekday)
+        weekday_totals = history.pivot_table(
+            index="user_id", columns="weekday", values="amount", aggfunc="sum", fill_value=0.0
+        ).reindex(index=users, columns=range(7), fill_value=0.0)
+        weekday_mean = weekday_totals / SEASONALITY_WEEKS
+
+        remaining = pd.date_range(today + pd.Timedelta(days=1), month_end, freq="D")
+        remaining_weekdays = np.bincount(remaining.weekday, minlength=7)
+        predicted_rest = pd.Series(weekday_mean.to_numpy() @ remaining_weekdays, index=users)
+
+        # Users without history fall back to the flat model
+        has_history = weekday_totals.sum(axis=1) > 0
+        predicted_rest = predicted_rest.where(has_history, daily_average * days_left)
+        predicted_total = current_total + predicted_rest
+    else:
+        predicted_total = current_total + daily_average * days_left
+
+    result = pd.DataFrame({
+        "current_total": current_total,
+        "daily_average": daily_average,
+        "predicted_total": predicted_total,
+    })
+    result["overrun"] = result["predicted_total"] - budget
+    return result
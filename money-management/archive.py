@@ -0,0 +1,227 @@
+"""
+Monthly archive of old expenses (python manage.py archive).
+
+Expenses older than ARCHIVE_AFTER_MONTHS whole months move out of the `expenses` table into one
+table per month, expenses_archive_YYYY_MM, with the same columns, ids and (user_id,
+transaction_date) index. Their daily_rollups rows are folded into `monthly_summaries`, one row
+per user, month and category. `expenses`, its indexes and daily_rollups stay the size of the
+recent history, however many years pile up.
+
+Two views tie the tables together: expenses_archive (every archive table) and expenses_history
+(expenses plus the archive), mapped as models.ArchivedExpense / models.ExpenseHistory. crud.py
+only reads them when a request reaches back past `archived_before`; everything newer is served
+by `expenses` alone. So:
+
+- daily_rollups always aggregates `expenses`, and monthly_summaries the archive tables.
+- Archived months stay writable for deletes (`delete_archived`). An expense added later with an
+  old transaction_date lands in `expenses` and is archived by the next run.
+- The item_name search index only covers `expenses`; archived months are searched with LIKE.
+
+Rows never come back on their own: the views make them readable, not movable. Archiving runs
+one transaction per month, so it can be interrupted and run again.
+"""
+import os
+from datetime import date, datetime
+
+from sqlalchemy import (Column, DateTime, Float, Index, Integer, MetaData, String, Table, delete, func, literal,
+                        select, text)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+import models
+
+# --- Configuration ---
+
+# Whole months kept in the expenses table; older months are archived
+ARCHIVE_AFTER_MONTHS = int(os.environ.get("ARCHIVE_AFTER_MONTHS", "12"))
+# The forecasts read daily_rollups for this month and the last
+# analysis_service.SEASONALITY_WEEKS (8) weeks; at least 3 whole months keep those hot
+MIN_ARCHIVE_AFTER_MONTHS = 3
+
+COLUMNS = [column.name for column in models.Expense.__table__.columns]
+
+_metadata = MetaData()
+
+
+def _month_start(day) -> date:
+    return date(day.year, day.month, 1)
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _midnight(day: date) -> datetime:
+    return datetime.combine(day, datetime.min.time())
+
+
+def table_name(month: date) -> str:
+    return f"expenses_archive_{month.year:04d}_{month.month:02d}"
+
+
+def archive_table(month: date) -> Table:
+    """The archive table of `month` (any day in it)."""
+    name = table_name(month)
+    if name not in _metadata.tables:
+        Table(
+            name, _metadata,
+            Column("id", Integer, primary_key=True),
+            Column("user_id", String, nullable=False),
+            Column("amount", Float, nullable=False),
+            Column("category_id", Integer, nullable=False),
+            Column("item_name", String, nullable=False),
+            Column("transaction_date", DateTime),
+            Column("created_at", DateTime),
+            Index(f"ix_{name}_user_id_transaction_date", "user_id", "transaction_date"),
+        )
+    return _metadata.tables[name]
+
+
+def archived_months(db: Session) -> list:
+    return list(db.scalars(select(models.ArchivedMonth.month).order_by(models.ArchivedMonth.month)))
+
+
+def archived_before(db: Session):
+    """
+    Start of the first month that was never archived, as a datetime: every archived expense is
+    older. None when nothing is archived, so callers can skip the archive entirely.
+    """
+    last = db.scalar(select(func.max(models.ArchivedMonth.month)))
+    if last is None:
+        return None
+    return _midnight(_add_months(last, 1))
+
+
+def _refresh_views(db: Session) -> None:
+    db.execute(text("DROP VIEW IF EXISTS expenses_history"))
+    db.execute(text("DROP VIEW IF EXISTS expenses_archive"))
+    tables = [table_name(month) for month in archived_months(db)]
+    if not tables:
+        return
+    columns = ", ".join(COLUMNS)
+    # Both views list the tables directly, so SQLite pushes the WHERE terms into every branch
+    # and each one is an index lookup
+    db.execute(text("CREATE VIEW expenses_archive AS " + " UNION ALL ".join(
+        f"SELECT {columns} FROM {name}" for name in tables
+    )))
+    db.execute(text("CREATE VIEW expenses_history AS " + " UNION ALL ".join(
+        f"SELECT {columns} FROM {name}" for name in ["expenses"] + tables
+    )))
+
+
+def _apply_summary_deltas(db: Session, source) -> None:
+    # source: a SELECT of (user_id, month, category_id, total, count) rows, or a list of those
+    # rows as dicts; upserted like crud._apply_rollup_deltas
+    if isinstance(source, list):
+        if not source:
+            return
+        stmt, parameters = sqlite_insert(models.MonthlySummary), source
+    else:
+        stmt, parameters = sqlite_insert(models.MonthlySummary).from_select(
+            ["user_id", "month", "category_id", "total", "count"], source
+        ), None
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "month", "category_id"],
+        set_={
+            "total": models.MonthlySummary.total + stmt.excluded.total,
+            "count": models.MonthlySummary.count + stmt.excluded.count,
+        },
+    )
+    db.execute(stmt, parameters)
+
+
+def archive_expenses(db: Session, months: int = ARCHIVE_AFTER_MONTHS, today: date = None) -> dict:
+    """
+    Moves every expense older than the last `months` whole months (and the current one) into
+    its month's archive table.
+
+    Returns:
+        dict: Archive table name -> rows moved.
+
+    Raises:
+        ValueError: If `months` is below MIN_ARCHIVE_AFTER_MONTHS.
+    """
+    if months < MIN_ARCHIVE_AFTER_MONTHS:
+        raise ValueError(f"Keep at least {MIN_ARCHIVE_AFTER_MONTHS} months in the expenses table")
+    cutoff = _add_months(_month_start(today or date.today()), -months)
+    expense = models.Expense.__table__
+    month_key = func.substr(expense.c.transaction_date, 1, 7)
+    pending = db.scalars(
+        select(month_key).where(expense.c.transaction_date < _midnight(cutoff)).distinct().order_by(month_key)
+    ).all()
+
+    moved = {}
+    for key in pending:
+        month = date(int(key[:4]), int(key[5:7]), 1)
+        next_month = _add_months(month, 1)
+        in_month = (expense.c.transaction_date >= _midnight(month), expense.c.transaction_date < _midnight(next_month))
+        table = archive_table(month)
+        table.create(bind=db.connection(), checkfirst=True)
+
+        db.execute(table.insert().from_select(COLUMNS, select(*(expense.c[name] for name in COLUMNS)).where(*in_month)))
+        _apply_summary_deltas(db, select(
+            expense.c.user_id, literal(month), expense.c.category_id, func.sum(expense.c.amount), func.count(),
+        ).where(*in_month).group_by(expense.c.user_id, expense.c.category_id))
+        # Every expense of these days is archived now, so are all of their rollups
+        db.execute(delete(models.DailyRollup).where(models.DailyRollup.day >= month, models.DailyRollup.day < next_month))
+        count = db.execute(delete(expense).where(*in_month)).rowcount
+
+        archived = sqlite_insert(models.ArchivedMonth).values(month=month, rows=count)
+        db.execute(archived.on_conflict_do_update(
+            index_elements=["month"], set_={"rows": models.ArchivedMonth.rows + archived.excluded.rows},
+        ))
+        _refresh_views(db)
+        db.commit()
+        moved[table.name] = count
+    return moved
+
+
+def delete_archived(db: Session, user_id: str, expense_id: int = None, day_start: datetime = None,
+                    day_end: datetime = None) -> int:
+    """
+    Deletes the user's archived expense `expense_id`, or their archived expenses in
+    [day_start, day_end) (within one month), and takes them out of monthly_summaries.
+    Runs inside the caller's transaction (see crud.delete_expenses). Returns the rows deleted.
+    """
+    boundary = archived_before(db)
+    if boundary is None or (day_start is not None and day_start >= boundary):
+        return 0
+    if expense_id:
+        found = db.scalar(select(models.ArchivedExpense.transaction_date).where(
+            models.ArchivedExpense.id == expense_id, models.ArchivedExpense.user_id == user_id
+        ))
+        if found is None:
+            return 0
+        month = _month_start(found)
+    else:
+        month = _month_start(day_start)
+        if month not in archived_months(db):
+            return 0
+
+    table = archive_table(month)
+    conditions = [table.c.user_id == user_id]
+    if expense_id:
+        conditions.append(table.c.id == expense_id)
+    else:
+        conditions += [table.c.transaction_date >= day_start, table.c.transaction_date < day_end]
+    # Delete first, as crud.delete_expenses does, so the summary deltas come from the rows
+    # actually deleted inside the write transaction
+    deleted = db.execute(delete(table).where(*conditions).returning(table.c.category_id, table.c.amount)).all()
+    removed = {}
+    for row in deleted:
+        total, count = removed.get(row.category_id, (0.0, 0))
+        removed[row.category_id] = (total + row.amount, count + 1)
+    _apply_summary_deltas(db, [
+        {"user_id": user_id, "month": month, "category_id": category_id, "total": -total, "count": -count}
+        for category_id, (total, count) in removed.items()
+    ])
+    db.execute(delete(models.MonthlySummary).where(
+        models.MonthlySummary.user_id == user_id, models.MonthlySummary.count <= 0
+    ))
+    count = len(deleted)
+    db.execute(
+        models.ArchivedMonth.__table__.update().where(models.ArchivedMonth.month == month)
+        .values(rows=models.ArchivedMonth.rows - count)
+    )
+    return count
@@ -0,0 +1,87 @@
+"""
+Micro-benchmarks for the query and analysis hot paths (pytest-benchmark).
+
+Files are named bench_*.py so the regular test run does not collect them. Run
+from the money-management directory:
+
+    python -m pytest benchmarks/bench_crud.py
+    BENCH_USERS=200 BENCH_ROWS_PER_USER=20000 python -m pytest benchmarks/bench_crud.py --benchmark-save=baseline
+    python -m pytest benchmarks/bench_crud.py --benchmark-compare=0001_baseline
+"""
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import datagen
+import crud
+import analysis_service
+
+BENCH_USERS = int(os.environ.get("BENCH_USERS", "20"))
+BENCH_ROWS_PER_USER = int(os.environ.get("BENCH_ROWS_PER_USER", "2000"))
+BENCH_DAYS = int(os.environ.get("BENCH_DAYS", "365"))
+BENCH_SKEW = float(os.environ.get("BENCH_SKEW", "1.0"))
+
+USER = datagen.user_name(0)
+
+
+@pytest.fixture(scope="module")
+def db(tmp_path_factory):
+    engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('bench') / 'bench.db'}")
+    datagen.populate(engine, BENCH_USERS, BENCH_ROWS_PER_USER, BENCH_DAYS, BENCH_SKEW)
+    with sessionmaker(bind=engine)() as session:
+        yield session
+    engine.dispose()
+
+
+def _as_dicts(expenses) -> list:
+    return [
+        {"date": e.transaction_date, "amount": e.amount, "category": e.category, "item": e.item_name}
+        for e in expenses
+    ]
+
+
+def test_get_expenses_by_date(benchmark, db):
+    target = datetime.now() - timedelta(days=1)
+    benchmark(crud.get_expenses, db, user_id=USER, target_date=target)
+
+
+def test_get_expenses_first_page(benchmark, db):
+    rows, _ = benchmark(crud.get_expenses_page, db, user_id=USER, limit=50)
+    assert len(rows) == min(50, BENCH_ROWS_PER_USER)
+
+
+def test_get_default_window_from_database(benchmark, db):
+    benchmark(crud.get_expense_dicts_page, db, user_id=USER)
+
+
+def test_get_default_window_from_hot_store(benchmark, db):
+    # Loaded on the first round, then answered from memory
+    rows, _ = benchmark(crud.get_recent_expenses_page, db, user_id=USER)
+    assert rows == crud.get_expense_dicts_page(db, user_id=USER)[0]
+
+
+def test_get_weekly_report(benchmark, db):
+    assert benchmark(crud.get_weekly_report, db, user_id=USER)
+
+
+def test_generate_visual_report(benchmark, db):
+    # Same input as the API: the last 7 days of one user
+    start = datetime.now() - timedelta(days=7)
+    expenses = _as_dicts(e for e in crud.get_expenses(db, user_id=USER) if e.transaction_date >= start)
+    benchmark(analysis_service.generate_visual_report, expenses)
+
+
+def test_toxic_prediction(benchmark, db):
+    expenses = _as_dicts(crud.get_expenses(db, user_id=USER))
+    benchmark(analysis_service.toxic_prediction, expenses)
+
+
+def test_toxic_prediction_from_daily_totals(benchmark, db):
+    # What the endpoint does: month-to-date sums from SQL, then the forecast
+    def run():
+        return analysis_service.toxic_prediction_from_daily_totals(crud.get_month_daily_totals(db, user_id=USER))
+
+    benchmark(run)
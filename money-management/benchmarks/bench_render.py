@@ -0,0 +1,60 @@
+"""
+Per-render cost of the visual report (pytest-benchmark): a figure built from scratch
+for every report against the per-worker template that only swaps the data artists.
+
+    python -m pytest benchmarks/bench_render.py
+"""
+import io
+import logging
+from datetime import date, timedelta
+
+import pytest
+
+import analysis_service
+
+# Missing CJK glyph warnings are noise here
+logging.getLogger("matplotlib").setLevel(logging.ERROR)
+
+CATEGORIES = ["餐饮", "交通", "购物", "娱乐", "学习", "日用"]
+
+
+def _report_data(seed: int) -> dict:
+    start = date(2025, 1, 1) + timedelta(days=seed)
+    rows = [
+        {"date": start + timedelta(days=day), "category": CATEGORIES[(day + seed) % len(CATEGORIES)],
+         "amount": 20.0 + (day * 7 + seed * 13) % 90}
+        for day in range(7)
+    ]
+    return analysis_service.report_data_from_rollups(rows)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def report_style():
+    # What a render worker process does once at start-up
+    analysis_service.apply_report_style()
+
+
+@pytest.fixture
+def reports():
+    # Alternate between users so the template really swaps data on every call
+    data = [_report_data(seed) for seed in range(4)]
+    state = {"next": 0}
+
+    def next_report():
+        state["next"] += 1
+        return data[state["next"] % len(data)]
+
+    return next_report
+
+
+def test_render_fresh_figure(benchmark, reports):
+    # The previous draw_visual_report: a new Figure per report
+    def run():
+        analysis_service._save_png(analysis_service.build_report_figure(reports()), io.BytesIO())
+
+    benchmark(run)
+
+
+def test_render_template(benchmark, reports):
+    analysis_service.draw_visual_report(reports())  # build the template outside the measurement
+    benchmark(lambda: analysis_service.draw_visual_report(reports()))
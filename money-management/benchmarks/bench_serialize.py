@@ -0,0 +1,52 @@
+"""
+Cost of one full /expenses/query page, from query to JSON bytes (pytest-benchmark): ORM rows
+validated through schemas.Expense (what FastAPI does with response_model) against the
+EXPENSE_QUERY_FAST_JSON path of plain column tuples encoded with orjson.
+
+    python -m pytest benchmarks/bench_serialize.py
+    BENCH_PAGE_SIZE=200 python -m pytest benchmarks/bench_serialize.py
+"""
+import json
+import os
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import datagen
+import crud
+import schemas
+
+BENCH_PAGE_SIZE = int(os.environ.get("BENCH_PAGE_SIZE", str(crud.EXPENSE_PAGE_MAX)))
+
+USER = datagen.user_name(0)
+
+
+@pytest.fixture(scope="module")
+def db(tmp_path_factory):
+    engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('bench') / 'bench.db'}")
+    datagen.populate(engine, users=2, rows_per_user=max(BENCH_PAGE_SIZE, 1) * 2, days=365, skew=1.0)
+    with sessionmaker(bind=engine)() as session:
+        yield session
+    engine.dispose()
+
+
+def _validated_page(db) -> bytes:
+    expenses, next_cursor = crud.get_expenses_page(db, user_id=USER, limit=BENCH_PAGE_SIZE)
+    # FastAPI: validate against response_model, dump to JSON types, then JSONResponse.render
+    body = schemas.ExpenseResponse.model_validate({"expenses": expenses, "next_cursor": next_cursor})
+    return json.dumps(body.model_dump(mode="json"), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _fast_page(db) -> bytes:
+    expenses, next_cursor = crud.get_expense_dicts_page(db, user_id=USER, limit=BENCH_PAGE_SIZE)
+    return schemas.expense_page_json(expenses, next_cursor)
+
+
+def test_query_page_validated(benchmark, db):
+    assert benchmark(_validated_page, db)
+
+
+def test_query_page_fast_json(benchmark, db):
+    body = benchmark(_fast_page, db)
+    assert json.loads(body) == json.loads(_validated_page(db))
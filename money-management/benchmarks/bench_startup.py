@@ -0,0 +1,73 @@
+"""
+Cold-start benchmark: how long a fresh interpreter takes to `import main`.
+
+Every run is a new process, so nothing is shared between samples (module cache,
+matplotlib font cache lookups, ...). Run from the money-management directory:
+
+    python benchmarks/bench_startup.py              # 10 cold imports, median / min / max
+    python benchmarks/bench_startup.py --runs 20 --importtime   # plus the slowest modules
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("pandas", "numpy", "matplotlib", "seaborn")
+
+# Prints which heavy modules the import pulled in, so a regression is visible next to the timing
+PROBE = (
+    "import sys, main; "
+    f"print('loaded:' + ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+)
+
+
+def time_cold_import(runs: int) -> tuple:
+    samples = []
+    loaded = ""
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE], cwd=APP_DIR, capture_output=True, text=True, check=True
+        )
+        samples.append(time.perf_counter() - start)
+        loaded = result.stdout.rsplit("loaded:", 1)[-1].strip()
+    return samples, loaded
+
+
+def slowest_imports(limit: int) -> list:
+    """Runs one import under `-X importtime` and returns the `limit` slowest modules (cumulative us)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"], cwd=APP_DIR, capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the cold import time of the API")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--importtime", action="store_true", help="Also list the slowest imports")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    samples, loaded = time_cold_import(args.runs)
+    print(f"import main x{args.runs}: median {statistics.median(samples) * 1000:.0f} ms, "
+          f"min {min(samples) * 1000:.0f} ms, max {max(samples) * 1000:.0f} ms")
+    print(f"Heavy modules loaded at import: {loaded or 'none'}")
+
+    if args.importtime:
+        print("\nSlowest imports (cumulative):")
+        for cumulative, name in slowest_imports(args.top):
+            print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Synthetic expense data for benchmarks.
+
+Generates `users` x `rows_per_user` expenses spread over the last `days` days, with a
+Zipf-like category distribution (`skew`: 0 is uniform, higher values concentrate
+spending on the first categories), then rebuilds the daily rollups. Deterministic for
+a given seed. Writes straight through SQLAlchemy Core in chunks, so millions of rows
+are fine.
+
+    python benchmarks/datagen.py --db sql_app.db --users 1000 --rows-per-user 2000 --days 730
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+import models, crud, migrations, categories
+
+CATEGORIES = ["餐饮", "交通", "购物", "娱乐", "学习", "日用", "医疗", "其他"]
+# Typical amount per category (median of a log-normal)
+TYPICAL_AMOUNT = {"餐饮": 25, "交通": 15, "购物": 120, "娱乐": 80, "学习": 60, "日用": 30, "医疗": 100, "其他": 40}
+ITEMS = {
+    "餐饮": ["早餐", "午饭", "晚饭", "奶茶", "Starbucks Coffee", "水果"],
+    "交通": ["地铁", "公交", "Taxi", "共享单车"],
+    "购物": ["衣服", "鞋子", "耳机", "数码配件"],
+    "娱乐": ["电影", "Game", "KTV", "演唱会"],
+    "学习": ["Books", "打印", "网课", "文具"],
+    "日用": ["洗发水", "纸巾", "洗衣液"],
+    "医疗": ["药品", "体检"],
+    "其他": ["红包", "快递", "话费"],
+}
+CHUNK_ROWS = 10000
+
+
+def user_name(index: int) -> str:
+    return f"bench_user_{index:05d}"
+
+
+def _category_weights(skew: float) -> list:
+    return [1.0 / (rank ** skew) for rank in range(1, len(CATEGORIES) + 1)]
+
+
+def iter_rows(users: int, rows_per_user: int, days: int, skew: float, seed: int = 42, now: datetime = None):
+    rng = random.Random(seed)
+    now = now or datetime.now()
+    start = now - timedelta(days=days)
+    span = days * 86400
+    weights = _category_weights(skew)
+    for index in range(users):
+        user_id = user_name(index)
+        categories = rng.choices(CATEGORIES, weights=weights, k=rows_per_user)
+        for category in categories:
+            yield {
+                "user_id": user_id,
+                "amount": round(rng.lognormvariate(0, 0.6) * TYPICAL_AMOUNT[category], 2),
+                "category": category,
+                "item_name": rng.choice(ITEMS[category]),
+                "transaction_date": start + timedelta(seconds=rng.randrange(span)),
+            }
+
+
+def populate(engine, users: int = 20, rows_per_user: int = 2000, days: int = 365, skew: float = 1.0,
+             seed: int = 42) -> int:
+    """Creates the schema on `engine`, inserts the synthetic expenses and rebuilds the rollups."""
+    models.Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        migrations.run_migrations(db)
+        category_ids = {name: categories.category_id(db, name) for name in CATEGORIES}
+        db.commit()
+        total = 0
+        chunk = []
+        for row in iter_rows(users, rows_per_user, days, skew, seed):
+            row["category_id"] = category_ids[row.pop("category")]
+            chunk.append(row)
+            if len(chunk) >= CHUNK_ROWS:
+                db.execute(insert(models.Expense), chunk)
+                db.commit()
+                total += len(chunk)
+                chunk = []
+        if chunk:
+            db.execute(insert(models.Expense), chunk)
+            db.commit()
+            total += len(chunk)
+        crud.rebuild_daily_rollups(db)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic expenses for benchmarks")
+    parser.add_argument("--db", default="sql_app.db", help="SQLite file to fill (created if missing)")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--rows-per-user", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=365, help="Date span, ending now")
+    parser.add_argument("--skew", type=float, default=1.0, help="Category skew (0 = uniform)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    engine = create_engine(f"sqlite:///{args.db}")
+    started = time.perf_counter()
+    total = populate(engine, args.users, args.rows_per_user, args.days, args.skew, args.seed)
+    print(f"Inserted {total} expenses for {args.users} users into {args.db} "
+          f"in {time.perf_counter() - started:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
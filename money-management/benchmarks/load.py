@@ -0,0 +1,132 @@
+"""
+Concurrent HTTP load driver for the API.
+
+Runs one phase per endpoint: `--concurrency` clients send `--requests` requests in
+total, each for a random user from the datagen.py population, and the phase reports
+latency percentiles (p50/p95/p99) and requests per second.
+
+Against a running server:
+
+    uvicorn main:app --port 9090 --workers 4
+    python benchmarks/load.py --url http://127.0.0.1:9090 --users 100
+
+Without --url the app is driven in-process through httpx's ASGI transport, using
+./sql_app.db of the current directory (no network or server overhead included).
+
+Note that /report/weekly, /analysis/toxic_prediction and /analysis/report_data are served from the response
+cache after the first request per user; use more --users than --requests to measure misses.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import datagen
+
+ENDPOINTS = {
+    "query": ("GET", "/expenses/query?user_id={user}&limit=50"),
+    "weekly": ("GET", "/report/weekly?user_id={user}"),
+    "toxic": ("GET", "/analysis/toxic_prediction?user_id={user}&budget=2000"),
+    "report_data": ("GET", "/analysis/report_data?user_id={user}"),
+    "visual": ("GET", "/analysis/visual_report?user_id={user}"),
+    "visual_png": ("GET", "/analysis/visual_report.png?user_id={user}"),
+    "add": ("POST", "/expenses/add"),
+}
+DEFAULT_ENDPOINTS = ["query", "weekly", "toxic", "visual"]
+
+
+def _request_args(name: str, user: str) -> dict:
+    method, path = ENDPOINTS[name]
+    if name == "add":
+        return {"method": method, "url": path, "json": {
+            "user_id": user, "amount": 12.5, "category": "餐饮", "item_name": "load test",
+            "transaction_date": f"{date.today().isoformat()}T12:00:00",
+        }}
+    return {"method": method, "url": path.format(user=user)}
+
+
+async def run_phase(client: httpx.AsyncClient, name: str, users: list, requests: int, concurrency: int) -> dict:
+    latencies = []
+    errors = 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            args = _request_args(name, random.choice(users))
+            started = time.perf_counter()
+            try:
+                response = await client.request(**args)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        "endpoint": name,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50": cuts[49] * 1000,
+        "p95": cuts[94] * 1000,
+        "p99": cuts[98] * 1000,
+    }
+
+
+async def main_async(args) -> list:
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout,
+                                   limits=httpx.Limits(max_connections=args.concurrency))
+    else:
+        from main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                   timeout=args.timeout)
+
+    # httpx logs every request at INFO once the app has configured logging
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    users = [datagen.user_name(i) for i in range(args.users)]
+    results = []
+    async with client:
+        for name in args.endpoints:
+            if args.warmup:
+                await run_phase(client, name, users, args.warmup, args.concurrency)
+            results.append(await run_phase(client, name, users, args.requests, args.concurrency))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load test of the API endpoints")
+    parser.add_argument("--url", help="Base URL of a running server; in-process ASGI app if omitted")
+    parser.add_argument("--endpoints", nargs="+", default=DEFAULT_ENDPOINTS, choices=sorted(ENDPOINTS))
+    parser.add_argument("--users", type=int, default=100, help="Pick users among the first N datagen users")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests per endpoint first")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+    print(f"{'endpoint':<12}{'requests':>10}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for r in results:
+        print(f"{r['endpoint']:<12}{r['requests']:>10}{r['errors']:>8}{r['rps']:>10.1f}"
+              f"{r['p50']:>10.1f}{r['p95']:>10.1f}{r['p99']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Parsers for /expenses/bulk_add request bodies.
+
+Supported formats (chosen by Content-Type):
+    application/json        a JSON array of expense objects
+    application/x-ndjson    one JSON object per line (also application/jsonl)
+    text/csv                a header row, then one expense per row
+
+NDJSON and CSV bodies are parsed while they stream in, so a large bank export
+never has to be held in memory at once. Every parser yields
+`(row_number, record_or_None, error_or_None)` with 1-based row numbers
+(data rows only, the CSV header does not count).
+"""
+import csv
+import json
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/x-jsonlines")
+
+
+async def _iter_lines(stream):
+    """Splits an async byte stream into decoded text lines."""
+    pending = b""
+    async for chunk in stream:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8-sig").rstrip("\r")
+    if pending:
+        yield pending.decode("utf-8-sig").rstrip("\r")
+
+
+async def iter_json_array(body: bytes):
+    try:
+        records = json.loads(body)
+    except ValueError as e:
+        yield 1, None, f"Invalid JSON: {e}"
+        return
+    if not isinstance(records, list):
+        yield 1, None, "Expected a JSON array of expenses"
+        return
+    for number, record in enumerate(records, start=1):
+        yield number, record, None
+
+
+async def iter_ndjson(stream):
+    number = 0
+    async for line in _iter_lines(stream):
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            yield number, json.loads(line), None
+        except ValueError as e:
+            yield number, None, f"Invalid JSON: {e}"
+
+
+async def iter_csv(stream):
+    header = None
+    number = 0
+    record = ""
+    async for line in _iter_lines(stream):
+        # A quoted field may contain newlines: keep joining lines until the quotes balance
+        record = f"{record}\n{line}" if record else line
+        if record.count('"') % 2:
+            continue
+        text, record = record, ""
+        if not text.strip():
+            continue
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        number += 1
+        if len(values) != len(header):
+            yield number, None, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        yield number, dict(zip(header, values)), None
+    if record:
+        yield number + 1, None, "Unterminated quoted field"
+
+
+def iter_records(content_type: str, request):
+    """Returns the async record iterator matching the request's Content-Type, or None if unsupported."""
+    media_type = (content_type or "application/json").split(";")[0].strip().lower()
+    if media_type in NDJSON_TYPES:
+        return iter_ndjson(request.stream())
+    if media_type in ("text/csv", "application/csv"):
+        return iter_csv(request.stream())
+    if media_type == "application/json":
+        return _iter_json_body(request)
+    return None
+
+
+async def _iter_json_body(request):
+    async for item in iter_json_array(await request.body()):
+        yield item
@@ -0,0 +1,142 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# --- Configuration ---
+
+REPORT_CACHE_SIZE = int(os.environ.get("REPORT_CACHE_SIZE", "256"))
+REPORT_CACHE_TTL = float(os.environ.get("REPORT_CACHE_TTL", "600"))
+# JSON report responses (/report/weekly, /analysis/toxic_prediction). TTL 0 disables the cache.
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "300"))
+
+
+class TTLCache:
+    """
+    A small thread-safe LRU cache whose entries also expire after `ttl` seconds.
+
+    Used to memoize expensive results (rendered reports) inside one worker process.
+    """
+
+    def __init__(self, max_size: int = 256, ttl: float = 600.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return default if entry is None else entry[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def fingerprint_expenses(expense_list: list) -> str:
+    """
+    Returns a stable hash of the fields a visual report is drawn from
+    (date, amount, category). Two lists with the same fingerprint render the same image.
+    """
+    digest = hashlib.sha1()
+    for e in expense_list:
+        date = e.get("date")
+        date_str = date.isoformat() if hasattr(date, "isoformat") else str(date)
+        digest.update(f"{date_str}|{e.get('amount')!r}|{e.get('category')}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class LocalCacheBackend:
+    """
+    In-process key-value backend for ResponseCache, bounded by TTLCache.
+
+    It only offers get/set/delete, the surface of a shared store such as Redis or
+    memcached, so a client for one can be passed to ResponseCache instead when the
+    API runs several worker processes. On its own, each process sees only the writes
+    it made itself; RESPONSE_CACHE_TTL bounds how stale another process can be.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 300.0):
+        self._cache = TTLCache(max_size=max_size, ttl=ttl)
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value) -> None:
+        self._cache.set(key, value)
+
+    def delete(self, key) -> None:
+        self._cache.pop(key)
+
+
+class ResponseCache:
+    """
+    Caches serialized responses per user, keyed by (endpoint, user_id, params, data version).
+
+    A user's data version is a random token replaced whenever their expenses change
+    (see crud._mark_users_changed), so entries are never invalidated one by one: a write
+    makes every cached response of that user unreachable. A version that was evicted is
+    simply replaced by a new token, which can only cause a miss, never a stale hit.
+    The key doubles as the response's ETag.
+    """
+
+    _ALL = "*"
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def _version(self, user_id: str) -> str:
+        version = self.backend.get(("version", user_id))
+        if version is None:
+            version = uuid.uuid4().hex
+            self.backend.set(("version", user_id), version)
+        return version
+
+    def bump(self, user_ids=None) -> None:
+        """Starts a new data version for `user_ids`, or for every user when None."""
+        for user_id in ([self._ALL] if user_ids is None else user_ids):
+            self.backend.set(("version", user_id), uuid.uuid4().hex)
+
+    def key(self, endpoint: str, user_id: str, params: dict = None) -> str:
+        params = "&".join(f"{name}={value}" for name, value in sorted((params or {}).items()))
+        raw = f"{endpoint}|{user_id}|{params}|{self._version(self._ALL)}|{self._version(user_id)}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        return self.backend.get(("response", key))
+
+    def set(self, key, value) -> None:
+        self.backend.set(("response", key), value)
+
+
+# Rendered visual reports: (user_id, fingerprint) -> static filename
+visual_report_cache = TTLCache(max_size=REPORT_CACHE_SIZE, ttl=REPORT_CACHE_TTL)
+
+# Report responses and per-user data versions
+response_cache = ResponseCache(LocalCacheBackend(max_size=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL))
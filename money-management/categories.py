@@ -0,0 +1,115 @@
+"""
+Category names <-> small integer ids.
+
+Expenses and daily rollups store `category_id`; each name is stored once in the
+`categories` table. The API (schemas.py) stays string-based: crud.py translates names
+to ids on the way in and ids to names on the way out, through an in-process cache.
+
+An id never changes or gets reused once committed, so the cache never needs
+invalidation; an unknown id or name is simply looked up in the database. Every
+database has its own ids (with SQLITE_SHARDS, every shard), so there is one cache per
+engine. Ids created in a transaction are only cached after it commits: a rolled-back
+id may be handed to a different name later.
+"""
+import threading
+import weakref
+
+from sqlalchemy import event, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+import models
+
+
+class CategoryCache:
+    """Committed id <-> name pairs of one database."""
+
+    def __init__(self):
+        self.ids = {}  # name -> id
+        self.names = {}  # id -> name
+        self._lock = threading.Lock()
+
+    def remember(self, pairs) -> None:
+        with self._lock:
+            for category_id, name in pairs:
+                self.ids[name] = category_id
+                self.names[category_id] = name
+
+
+_caches = weakref.WeakKeyDictionary()  # Engine -> CategoryCache
+_caches_lock = threading.Lock()
+
+
+def _cache(db: Session) -> CategoryCache:
+    engine = db.get_bind().engine
+    with _caches_lock:
+        cache = _caches.get(engine)
+        if cache is None:
+            cache = _caches[engine] = CategoryCache()
+    return cache
+
+
+def _pending(db: Session, cache: CategoryCache) -> dict:
+    # Ids this session created and has not committed yet: name -> id
+    return {name: category_id for owner, category_id, name in db.info.get("new_categories", ()) if owner is cache}
+
+
+def category_id(db: Session, name: str, create: bool = True):
+    """
+    Returns the id of category `name`; if it does not exist yet, creates it in the current
+    transaction (or returns None when `create` is False).
+    """
+    cache = _cache(db)
+    found = cache.ids.get(name)
+    if found is not None:
+        return found
+    found = _pending(db, cache).get(name)
+    if found is not None:
+        return found
+
+    found = db.scalar(select(models.Category.id).where(models.Category.name == name))
+    if found is not None:
+        # Not created by this session, so it is committed
+        cache.remember([(found, name)])
+        return found
+    if not create:
+        return None
+    db.execute(sqlite_insert(models.Category).values(name=name).on_conflict_do_nothing(index_elements=["name"]))
+    found = db.scalar(select(models.Category.id).where(models.Category.name == name))
+    db.info.setdefault("new_categories", []).append((cache, found, name))
+    return found
+
+
+def category_names(db: Session, category_ids) -> dict:
+    """Returns {id: name} for `category_ids`, looking up the ids the cache does not know in one query."""
+    cache = _cache(db)
+    missing = {i for i in category_ids if i not in cache.names}
+    if not missing:
+        return {i: cache.names[i] for i in category_ids}
+
+    pending = {category_id: name for name, category_id in _pending(db, cache).items()}
+    lookup = missing - pending.keys()
+    if lookup:
+        cache.remember(db.execute(
+            select(models.Category.id, models.Category.name).where(models.Category.id.in_(lookup))
+        ).all())
+    return {i: cache.names.get(i, pending.get(i)) for i in category_ids}
+
+
+def fill_names(db: Session, rows: list) -> list:
+    """Sets `category` (the name) on Expense / DailyRollup rows from their category_id, for the API."""
+    names = category_names(db, {row.category_id for row in rows})
+    for row in rows:
+        row.category = names[row.category_id]
+    return rows
+
+
+@event.listens_for(Session, "after_commit")
+def _cache_new_categories(session):
+    for cache, category_id, name in session.info.pop("new_categories", ()):
+        cache.remember([(category_id, name)])
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_new_categories(session):
+    session.info.pop("new_categories", None)
@@ -0,0 +1,73 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+import models, migrations, database, group_commit, hot_store, metrics
+from cache import response_cache, visual_report_cache
+
+# Loaded here, before any test starts render threads: pytest rewrites anyio (a plugin) on import,
+# and FileResponse would otherwise import this lazily while those threads run (racy ast.parse).
+from anyio import open_file  # noqa: F401
+
+
+@pytest.fixture
+def memory_engine():
+    """Empty in-memory SQLite engine, disposed after the test."""
+    engine = create_engine("sqlite://")
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(memory_engine):
+    """Session on a new in-memory database with the current schema, for tests below the API."""
+    models.Base.metadata.create_all(bind=memory_engine)
+    with sessionmaker(bind=memory_engine)() as session:
+        yield session
+
+
+@pytest.fixture
+def api_sessions(tmp_path, monkeypatch):
+    """
+    Sessionmaker of a new database in tmp_path that every API request (and the group commit
+    writer) is routed to, with the in-process caches emptied. The test runs in tmp_path, so
+    rendered reports land in its own ./static: API tests never touch ./sql_app.db or ./static.
+    """
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("static")
+    path = str(tmp_path / "sql_app.db")
+    engine = database.make_engine(path)
+    async_engine = database.make_async_engine(path)
+    metrics.instrument_engine(engine)
+    metrics.instrument_engine(async_engine.sync_engine)
+    models.Base.metadata.create_all(bind=engine)
+    sessions = sessionmaker(bind=engine, autoflush=False)
+    with sessions() as db:
+        migrations.run_migrations(db)
+
+    async_sessions = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    writer_sessions = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    monkeypatch.setattr(database, "session_factory", lambda user_id: sessions)
+    monkeypatch.setattr(database, "async_session_factory", lambda user_id: async_sessions)
+    writer = group_commit.GroupCommitWriter(session_factory=lambda user_id: writer_sessions)
+    monkeypatch.setattr(group_commit, "writer", writer)
+
+    # Same user ids as earlier tests, different data: start every user on a new data version
+    response_cache.bump()
+    hot_store.store.clear()
+    visual_report_cache.clear()
+
+    yield sessions
+    writer.stop()
+    engine.dispose()
+
+
+@pytest.fixture
+def api(api_sessions):
+    """TestClient for main.app on the api_sessions database."""
+    import main
+    return TestClient(main.app)
@@ -1,55 +1,418 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select, insert, delete, or_, and_, event, table, column, false
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 import models, schemas
-from datetime import datetime, timedelta
+import archive
+import categories
+import hot_store
+from cache import response_cache
+from datetime import datetime, date, timedelta
+import base64
 
-def create_user_expense(db: Session, expense: schemas.ExpenseCreate):
+def _apply_rollup_deltas(db: Session, deltas: list):
+    """
+    Upserts (user_id, day, category_id, total, count) deltas into daily_rollups in one executemany.
+    Runs inside the caller's transaction.
+    """
+    if not deltas:
+        return
+    stmt = sqlite_insert(models.DailyRollup)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "day", "category_id"],
+        set_={
+            "total": models.DailyRollup.total + stmt.excluded.total,
+            "count": models.DailyRollup.count + stmt.excluded.count,
+        },
+    )
+    db.execute(stmt, deltas)
+
+def _invalidate_forecasts(db: Session, user_ids):
+    # A precomputed forecast is only valid for the data it was computed from
+    db.execute(delete(models.Forecast).where(models.Forecast.user_id.in_(list(user_ids))))
+    _mark_users_changed(db, user_ids)
+
+def _mark_users_changed(db: Session, user_ids=None):
+    """
+    Records that the users' data changed in this transaction (None: all users).
+    Their cached responses are dropped once it commits, see _bump_data_versions.
+    """
+    changed = db.info.setdefault("changed_users", set())
+    changed.update(["*"] if user_ids is None else user_ids)
+
+@event.listens_for(Session, "after_commit")
+def _bump_data_versions(session):
+    # After, not before, the commit: a reader must not cache pre-commit data under the new version
+    changed = session.info.pop("changed_users", None)
+    if changed:
+        response_cache.bump(None if "*" in changed else changed)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_users(session):
+    session.info.pop("changed_users", None)
+
+def add_user_expense(db: Session, expense: schemas.ExpenseCreate):
+    """Stages one expense and its rollup update in the current transaction, without committing."""
+    category_id = categories.category_id(db, expense.category)
     db_expense = models.Expense(
         user_id=expense.user_id,
         amount=expense.amount,
+        category_id=category_id,
         category=expense.category,
         item_name=expense.item_name,
         transaction_date=expense.transaction_date or datetime.now()
     )
     db.add(db_expense)
+    _apply_rollup_deltas(db, [{
+        "user_id": expense.user_id,
+        "day": db_expense.transaction_date.date(),
+        "category_id": category_id,
+        "total": expense.amount,
+        "count": 1,
+    }])
+    _invalidate_forecasts(db, [expense.user_id])
+    hot_store.record_insert(db, db_expense)
+    return db_expense
+
+def create_user_expense(db: Session, expense: schemas.ExpenseCreate):
+    db_expense = add_user_expense(db, expense)
     db.commit()
     db.refresh(db_expense)
     return db_expense
 
-def get_expenses(db: Session, user_id: str, category: str = None, target_date: datetime = None, limit: int = None):
-    query = db.query(models.Expense).filter(models.Expense.user_id == user_id)
+def bulk_create_expenses(db: Session, expenses: list) -> int:
+    """
+    Inserts many validated schemas.ExpenseCreate rows with one executemany and a single commit.
+    Rollups are aggregated in Python first, so each (user, day, category) is upserted once.
+    """
+    now = datetime.now()
+    rows = []
+    deltas = {}
+    category_ids = {}
+    for expense in expenses:
+        transaction_date = expense.transaction_date or now
+        category_id = category_ids.get(expense.category)
+        if category_id is None:
+            category_id = category_ids[expense.category] = categories.category_id(db, expense.category)
+        rows.append({
+            "user_id": expense.user_id,
+            "amount": expense.amount,
+            "category_id": category_id,
+            "item_name": expense.item_name,
+            "transaction_date": transaction_date,
+        })
+        key = (expense.user_id, transaction_date.date(), category_id)
+        total, count = deltas.get(key, (0.0, 0))
+        deltas[key] = (total + expense.amount, count + 1)
+
+    if not rows:
+        return 0
+    db.execute(insert(models.Expense), rows)
+    _apply_rollup_deltas(db, [
+        {"user_id": user_id, "day": day, "category_id": category_id, "total": total, "count": count}
+        for (user_id, day, category_id), (total, count) in deltas.items()
+    ])
+    _invalidate_forecasts(db, {user_id for user_id, _, _ in deltas})
+    hot_store.record_reset(db, {user_id for user_id, _, _ in deltas})
+    db.commit()
+    return len(rows)
+
+def _day_range(target_date: datetime):
+    # Half-open [day start, next day start): compares the raw column, so the (user_id, transaction_date) index applies
+    day_start = datetime.combine(target_date.date(), datetime.min.time())
+    return day_start, day_start + timedelta(days=1)
+
+# Days returned when neither a date nor a limit is given
+DEFAULT_WINDOW_DAYS = 7
+
+def _range_start(target_date: datetime = None, limit: int = None):
+    # Oldest transaction_date a listing can return; None when only the limit bounds it
+    if target_date:
+        return _day_range(target_date)[0]
+    if not limit:
+        return datetime.now() - timedelta(days=DEFAULT_WINDOW_DAYS)
+    return None
+
+def _expenses_query(db: Session, user_id: str, category: str = None, target_date: datetime = None, limit: int = None,
+                    entity=models.Expense, columns: bool = False):
+    # entity: models.Expense, or models.ExpenseHistory to include archived months (see _from_history).
+    # columns: select plain column tuples (_expense_columns) instead of ORM objects.
+    query = db.query(*(_expense_columns(entity) if columns else [entity])).filter(entity.user_id == user_id)
     
     if category:
-        query = query.filter(models.Expense.category == category)
+        category_id = categories.category_id(db, category, create=False)
+        # A name that was never used cannot match anything
+        query = query.filter(entity.category_id == category_id if category_id is not None else false())
         
     if target_date:
         # Filter by specific date (ignoring time)
-        query = query.filter(func.date(models.Expense.transaction_date) == target_date.date())
+        day_start, day_end = _day_range(target_date)
+        query = query.filter(
+            entity.transaction_date >= day_start, entity.transaction_date < day_end
+        )
     elif not limit:
         # Default: Last 7 days (Only if no specific date AND no limit provided)
-        seven_days_ago = datetime.now() - timedelta(days=7)
-        query = query.filter(models.Expense.transaction_date >= seven_days_ago)
-    
-    if limit:
-        # Sort by latest time and limit results
-        query = query.order_by(models.Expense.transaction_date.desc()).limit(limit)
-        
-    return query.all()
+        seven_days_ago = datetime.now() - timedelta(days=DEFAULT_WINDOW_DAYS)
+        query = query.filter(entity.transaction_date >= seven_days_ago)
+    return query
+
+def _from_history(db: Session, start: datetime, wanted: int, run):
+    """
+    Returns run(entity) for models.Expense, or for models.ExpenseHistory (expenses plus the monthly
+    archive tables, see archive.py) when rows from `start` on may have been archived.
+
+    Without a start (newest rows up to a limit), expenses is asked first: every archived row
+    predates archive.archived_before, so if the `wanted` newest rows do not reach back that far,
+    the archive cannot change the answer.
+    """
+    boundary = archive.archived_before(db)
+    if boundary is None or (start is not None and start >= boundary):
+        return run(models.Expense)
+    if start is None:
+        rows = run(models.Expense)
+        if len(rows) >= wanted and rows[wanted - 1].transaction_date is not None \
+                and rows[wanted - 1].transaction_date >= boundary:
+            return rows
+    return run(models.ExpenseHistory)
+
+def get_expenses(db: Session, user_id: str, category: str = None, target_date: datetime = None, limit: int = None):
+    def run(entity):
+        query = _expenses_query(db, user_id, category=category, target_date=target_date, limit=limit, entity=entity)
+        if limit:
+            # Sort by latest time and limit results
+            query = query.order_by(entity.transaction_date.desc()).limit(limit)
+        return query.all()
+
+    return categories.fill_names(db, _from_history(db, _range_start(target_date, limit), limit, run))
+
+# Largest page /expenses/query returns; clients follow next_cursor for the rest
+EXPENSE_PAGE_MAX = 1000
+
+def encode_cursor(transaction_date: datetime, expense_id: int) -> str:
+    """Opaque keyset cursor pointing just past the expense at (transaction_date, id)."""
+    raw = f"{transaction_date.isoformat()}|{expense_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str):
+    """Returns (transaction_date, id). Raises ValueError for a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        transaction_date, expense_id = raw.split("|")
+        return datetime.fromisoformat(transaction_date), int(expense_id)
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def _page(db: Session, user_id: str, category: str = None, target_date: datetime = None, limit: int = None,
+          cursor: tuple = None, columns: bool = False):
+    """Keyset-paginated listing shared by get_expenses_page and get_expense_dicts_page: (rows, next_cursor)."""
+    page_size = min(limit or EXPENSE_PAGE_MAX, EXPENSE_PAGE_MAX)
+
+    def run(entity):
+        query = _expenses_query(db, user_id, category=category, target_date=target_date, limit=limit,
+                                entity=entity, columns=columns)
+        if cursor:
+            after_date, after_id = cursor
+            query = query.filter(or_(
+                entity.transaction_date < after_date,
+                and_(entity.transaction_date == after_date, entity.id < after_id),
+            ))
+        # One extra row tells whether another page exists
+        return query.order_by(entity.transaction_date.desc(), entity.id.desc()).limit(page_size + 1).all()
+
+    rows = _from_history(db, _range_start(target_date, limit), page_size + 1, run)
+    last = rows[page_size - 1] if len(rows) > page_size else None
+    return rows[:page_size], encode_cursor(last.transaction_date, last.id) if last else None
+
+def get_expenses_page(db: Session, user_id: str, category: str = None, target_date: datetime = None,
+                      limit: int = None, cursor: tuple = None):
+    """
+    Returns one page of expenses, newest first, as (rows, next_cursor).
+
+    Pages are keyed on (transaction_date, id) rather than OFFSET, so every page is an index
+    seek on (user_id, transaction_date) no matter how deep the client has paged.
+    `limit` is the page size (capped at EXPENSE_PAGE_MAX); next_cursor is None on the last page.
+    """
+    rows, next_cursor = _page(db, user_id, category=category, target_date=target_date, limit=limit, cursor=cursor)
+    return categories.fill_names(db, rows), next_cursor
+
+def _expense_columns(entity=models.Expense) -> tuple:
+    # Columns of get_expense_dicts_page, read as plain tuples instead of ORM objects
+    return (
+        entity.id,
+        entity.user_id,
+        entity.amount,
+        entity.category_id,
+        entity.item_name,
+        entity.transaction_date,
+        entity.created_at,
+    )
+
+def get_expense_dicts_page(db: Session, user_id: str, category: str = None, target_date: datetime = None,
+                           limit: int = None, cursor: tuple = None):
+    """
+    Same page as get_expenses_page, as plain dicts in the field order of schemas.Expense.
+
+    For the fast /expenses/query path (schemas.expense_page_json): no ORM objects are built, and
+    the values are taken as the database typed them instead of being validated row by row.
+    """
+    rows, next_cursor = _page(db, user_id, category=category, target_date=target_date, limit=limit, cursor=cursor,
+                              columns=True)
+    return _expense_dicts(db, rows), next_cursor
+
+def _expense_dicts(db: Session, rows: list) -> list:
+    names = categories.category_names(db, {row.category_id for row in rows})
+    return [
+        {
+            "user_id": row.user_id,
+            "amount": row.amount,
+            "category": names[row.category_id],
+            "item_name": row.item_name,
+            "transaction_date": row.transaction_date,
+            "id": row.id,
+            "created_at": row.created_at,
+        }
+        for row in rows
+    ]
+
+def _recent_window_start() -> datetime:
+    return datetime.now() - timedelta(days=DEFAULT_WINDOW_DAYS)
+
+def _cut_page(rows: list):
+    # rows holds up to one row more than a page, which tells whether another page exists
+    last = rows[EXPENSE_PAGE_MAX - 1] if len(rows) > EXPENSE_PAGE_MAX else None
+    return rows[:EXPENSE_PAGE_MAX], encode_cursor(last["transaction_date"], last["id"]) if last else None
+
+def get_cached_recent_expenses_page(user_id: str, category: str = None, cursor: tuple = None):
+    """get_recent_expenses_page if the user's window is in memory, else None; never queries."""
+    rows = hot_store.store.page(user_id, _recent_window_start(), category=category, cursor=cursor,
+                                size=EXPENSE_PAGE_MAX + 1)
+    return None if rows is None else _cut_page(rows)
+
+def get_recent_expenses_page(db: Session, user_id: str, category: str = None, cursor: tuple = None):
+    """
+    The default /expenses/query page (no date, no limit: the last DEFAULT_WINDOW_DAYS days), as
+    get_expense_dicts_page returns it, served from the user's hot_store window. Only a user whose
+    window is not in memory yet costs a query, which loads the whole window.
+    """
+    page = get_cached_recent_expenses_page(user_id, category=category, cursor=cursor)
+    if page is not None:
+        return page
+
+    token = hot_store.store.begin_load(user_id)
+    since = hot_store.store.window_start()
+    loaded = db.query(*_expense_columns()).filter(
+        models.Expense.user_id == user_id, models.Expense.transaction_date >= since
+    ).order_by(models.Expense.transaction_date, models.Expense.id).all()
+    window = hot_store.store.install(user_id, token, since, _expense_dicts(db, loaded))
+    return _cut_page(window.page(_recent_window_start(), category=category, cursor=cursor, size=EXPENSE_PAGE_MAX + 1))
+
+# FTS5 index over expenses.item_name, created by migrations._add_item_name_search_index.
+# A lightweight table clause, not a model: create_all must not create it as a plain table.
+_expenses_fts = table("expenses_fts", column("rowid"), column("item_name"))
+
+# The trigram index only answers terms of at least this many characters
+SEARCH_MIN_TERM_LENGTH = 3
+
+def _search_conditions(user_id: str, query: str, start: datetime = None, end: datetime = None,
+                       entity=models.Expense) -> list:
+    # entity: models.Expense, or models.ArchivedExpense, which has no FTS index (LIKE only)
+    conditions = [entity.user_id == user_id]
+    if start:
+        conditions.append(entity.transaction_date >= start)
+    if end:
+        conditions.append(entity.transaction_date < end)
+
+    terms = query.split()
+    indexed = [term for term in terms if len(term) >= SEARCH_MIN_TERM_LENGTH and entity is models.Expense]
+    if indexed:
+        # Every term as a quoted FTS5 string: matched as a substring, operators in user input stay literal
+        match = " AND ".join('"' + term.replace('"', '""') + '"' for term in indexed)
+        conditions.append(models.Expense.id.in_(
+            select(_expenses_fts.c.rowid).where(_expenses_fts.c.item_name.match(match))
+        ))
+    for term in terms:
+        if term not in indexed:
+            # Too short for trigrams (e.g. "奶茶"), or archived: LIKE over this user's rows in the date range only
+            escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            conditions.append(entity.item_name.like(f"%{escaped}%", escape="\\"))
+    return conditions
+
+def search_expenses(db: Session, user_id: str, query: str, start: datetime = None, end: datetime = None,
+                    limit: int = 50):
+    """
+    Finds the user's expenses whose item_name contains every whitespace-separated term of `query`
+    (case-insensitive), optionally within [start, end).
+
+    Returns:
+        tuple: (count, total amount, the `limit` newest matches). The totals cover all matches
+               and are aggregated in SQL; the base table is only read through the FTS index and
+               the (user_id, transaction_date) index, never scanned.
+    """
+    count, total, rows = 0, 0.0, []
+    sources = [models.Expense]
+    boundary = archive.archived_before(db)
+    if boundary is not None and (start is None or start < boundary):
+        # The range reaches archived months, which are searched without the FTS index
+        sources.append(models.ArchivedExpense)
+    for entity in sources:
+        conditions = _search_conditions(user_id, query, start, end, entity=entity)
+        found, amount = db.execute(
+            select(func.count(), func.coalesce(func.sum(entity.amount), 0.0)).where(*conditions)
+        ).one()
+        count, total = count + found, total + amount
+        rows += db.scalars(
+            select(entity).where(*conditions).order_by(entity.transaction_date.desc(), entity.id.desc()).limit(limit)
+        ).all()
+    if len(sources) > 1:
+        rows = sorted(rows, key=lambda row: (row.transaction_date, row.id), reverse=True)[:limit]
+    return count, total, categories.fill_names(db, rows)
 
 def delete_expenses(db: Session, user_id: str, target_date: datetime = None, expense_id: int = None):
-    query = db.query(models.Expense).filter(models.Expense.user_id == user_id)
+    conditions = [models.Expense.user_id == user_id]
     
     if expense_id:
         # Delete single record by ID
-        query = query.filter(models.Expense.id == expense_id)
+        conditions.append(models.Expense.id == expense_id)
     elif target_date:
         # Delete all records for the date
-        query = query.filter(func.date(models.Expense.transaction_date) == target_date.date())
+        day_start, day_end = _day_range(target_date)
+        conditions += [models.Expense.transaction_date >= day_start, models.Expense.transaction_date < day_end]
     else:
         # Safety guard: Do not allow deleting everything without specific criteria
         return 0
     
-    count = query.delete(synchronize_session=False)
+    # Delete first and take the returned rows back out of the rollups in the same transaction.
+    # The DELETE opens the write transaction; aggregating with a SELECT beforehand would run
+    # outside it, and a row committed in between would be deleted but stay in the rollups.
+    deleted = db.execute(delete(models.Expense).where(*conditions).returning(
+        models.Expense.transaction_date, models.Expense.category_id, models.Expense.amount
+    )).all()
+    removed = {}
+    for row in deleted:
+        key = (row.transaction_date.date(), row.category_id)
+        total, count = removed.get(key, (0.0, 0))
+        removed[key] = (total + row.amount, count + 1)
+    _apply_rollup_deltas(db, [
+        {"user_id": user_id, "day": day, "category_id": category_id, "total": -total, "count": -count}
+        for (day, category_id), (total, count) in removed.items()
+    ])
+    if removed:
+        db.query(models.DailyRollup).filter(
+            models.DailyRollup.user_id == user_id, models.DailyRollup.count <= 0
+        ).delete(synchronize_session=False)
+
+    count = len(deleted)
+    if count:
+        if expense_id:
+            hot_store.record_delete(db, user_id, expense_id=expense_id)
+        else:
+            hot_store.record_delete(db, user_id, day_start=day_start, day_end=day_end)
+    if expense_id and not count:
+        count = archive.delete_archived(db, user_id, expense_id=expense_id)
+    elif not expense_id:
+        count += archive.delete_archived(db, user_id, day_start=day_start, day_end=day_end)
+    if count:
+        _invalidate_forecasts(db, [user_id])
     db.commit()
     return count
 
@@ -57,14 +420,231 @@ def get_weekly_report(db: Session, user_id: str):
     # In a real world scenario, we would filter by the current week's date range here.
     # For this demo, we just aggregate all data for the user as "weekly report" logic was not strictly defined with date logic in the prompt details other than "weekly report".
     # However, to be more robust, let's assume it means "report for the user".
+    # Reads the daily rollups, so the cost follows days x categories rather than the number of expenses.
+    # Grouped on the integer category_id; names are attached afterwards from the categories cache.
     
     result = db.query(
-        models.Expense.category, 
-        func.sum(models.Expense.amount).label("total")
+        models.DailyRollup.category_id, 
+        func.sum(models.DailyRollup.total).label("total")
     ).filter(
-        models.Expense.user_id == user_id
+        models.DailyRollup.user_id == user_id
     ).group_by(
-        models.Expense.category
+        models.DailyRollup.category_id
     ).all()
     
-    return [{"category": row.category, "total": row.total} for row in result]
+    totals = {row.category_id: row.total for row in result}
+    if archive.archived_before(db) is not None:
+        # Archived months only have their monthly summaries left
+        for row in db.query(
+            models.MonthlySummary.category_id,
+            func.sum(models.MonthlySummary.total).label("total")
+        ).filter(
+            models.MonthlySummary.user_id == user_id
+        ).group_by(
+            models.MonthlySummary.category_id
+        ):
+            totals[row.category_id] = totals.get(row.category_id, 0.0) + row.total
+
+    names = categories.category_names(db, totals)
+    return [{"category": names[category_id], "total": total} for category_id, total in totals.items()]
+
+def get_daily_rollups(db: Session, user_id: str, start_day: date = None, end_day: date = None):
+    """Returns (day, category, total, count) rows for the user, oldest first."""
+    query = db.query(models.DailyRollup).filter(models.DailyRollup.user_id == user_id)
+    if start_day:
+        query = query.filter(models.DailyRollup.day >= start_day)
+    if end_day:
+        query = query.filter(models.DailyRollup.day <= end_day)
+    rows = query.order_by(models.DailyRollup.day, models.DailyRollup.category_id).all()
+
+    boundary = archive.archived_before(db)
+    if boundary is not None and (start_day is None or start_day < boundary.date()):
+        # Archived days have no rollups any more: aggregate them from the archive tables
+        rows = _add_archived_days(db, user_id, rows, start_day, end_day)
+    return categories.fill_names(db, rows)
+
+def _add_archived_days(db: Session, user_id: str, rows: list, start_day: date = None, end_day: date = None) -> list:
+    day = func.date(models.ArchivedExpense.transaction_date).label("day")
+    query = db.query(
+        day, models.ArchivedExpense.category_id, func.sum(models.ArchivedExpense.amount).label("total"),
+        func.count().label("count"),
+    ).filter(models.ArchivedExpense.user_id == user_id)
+    if start_day:
+        query = query.filter(models.ArchivedExpense.transaction_date >= datetime.combine(start_day, datetime.min.time()))
+    if end_day:
+        query = query.filter(models.ArchivedExpense.transaction_date < datetime.combine(end_day + timedelta(days=1), datetime.min.time()))
+
+    merged = {(row.day, row.category_id): row for row in rows}
+    for found in query.group_by(day, models.ArchivedExpense.category_id):
+        key = (date.fromisoformat(found.day), found.category_id)
+        total, count = found.total, found.count
+        if key in merged:
+            # Expenses added with an old date after their month was archived. The rollup row is
+            # still attached to the session: sum into a new object, or the next commit saves it
+            total += merged[key].total
+            count += merged[key].count
+        merged[key] = models.DailyRollup(user_id=user_id, day=key[0], category_id=found.category_id,
+                                         total=total, count=count)
+    return [merged[key] for key in sorted(merged)]
+
+def get_month_daily_totals(db: Session, user_id: str, today: date = None):
+    """
+    Month-to-date per-day sums for the forecast, as one aggregate query over daily_rollups.
+    Returns [(day, total), ...] from the 1st of today's month up to and including today.
+    """
+    today = today or date.today()
+    rows = db.query(
+        models.DailyRollup.day,
+        func.sum(models.DailyRollup.total).label("total")
+    ).filter(
+        models.DailyRollup.user_id == user_id,
+        models.DailyRollup.day >= today.replace(day=1),
+        models.DailyRollup.day <= today,
+    ).group_by(
+        models.DailyRollup.day
+    ).order_by(
+        models.DailyRollup.day
+    ).all()
+    return [(row.day, row.total) for row in rows]
+
+def get_daily_totals_for_all_users(db: Session, start_day: date, end_day: date):
+    """
+    Columnar input for analysis_service.batch_forecast: (user_id, day, total) for every user
+    and day in [start_day, end_day], in one query over daily_rollups.
+    """
+    return db.query(
+        models.DailyRollup.user_id,
+        models.DailyRollup.day,
+        func.sum(models.DailyRollup.total).label("total")
+    ).filter(
+        models.DailyRollup.day >= start_day,
+        models.DailyRollup.day <= end_day,
+    ).group_by(
+        models.DailyRollup.user_id, models.DailyRollup.day
+    ).all()
+
+def save_forecasts(db: Session, forecasts: list, computed_on: date, model: str = "flat") -> int:
+    """
+    Replaces the forecasts table with `forecasts` (dicts with user_id, current_total,
+    daily_average, predicted_total) in one transaction.
+    """
+    db.execute(delete(models.Forecast))
+    if forecasts:
+        db.execute(insert(models.Forecast), [
+            {**f, "computed_on": computed_on, "model": model} for f in forecasts
+        ])
+    _mark_users_changed(db)
+    db.commit()
+    return len(forecasts)
+
+def get_forecast(db: Session, user_id: str):
+    return db.query(models.Forecast).filter(models.Forecast.user_id == user_id).first()
+
+def rebuild_daily_rollups(db: Session, user_id: str = None) -> int:
+    """
+    Recomputes daily_rollups from the expenses table (all users, or one user).
+    Used to backfill existing databases and to repair drift. Returns the number of rollup rows.
+    """
+    clear = delete(models.DailyRollup)
+    source = select(
+        models.Expense.user_id,
+        func.date(models.Expense.transaction_date),
+        models.Expense.category_id,
+        func.sum(models.Expense.amount),
+        func.count(),
+    )
+    if user_id:
+        clear = clear.where(models.DailyRollup.user_id == user_id)
+        source = source.where(models.Expense.user_id == user_id)
+    source = source.group_by(
+        models.Expense.user_id, func.date(models.Expense.transaction_date), models.Expense.category_id
+    )
+
+    db.execute(clear)
+    result = db.execute(
+        insert(models.DailyRollup).from_select(["user_id", "day", "category_id", "total", "count"], source)
+    )
+    _mark_users_changed(db, [user_id] if user_id else None)
+    db.commit()
+    return result.rowcount
+
+
+# --- Async versions ---
+# Each wrapper runs the sync function above on the AsyncSession's connection via run_sync:
+# the queries themselves are awaited through aiosqlite, and the write paths (rollups etc.)
+# stay defined in one place.
+
+async def create_user_expense_async(db: AsyncSession, expense: schemas.ExpenseCreate):
+    return await db.run_sync(create_user_expense, expense)
+
+async def bulk_create_expenses_async(db: AsyncSession, expenses: list) -> int:
+    return await db.run_sync(bulk_create_expenses, expenses)
+
+async def get_expenses_async(db: AsyncSession, user_id: str, category: str = None, target_date: datetime = None, limit: int = None):
+    return await db.run_sync(get_expenses, user_id, category=category, target_date=target_date, limit=limit)
+
+async def get_expenses_page_async(db: AsyncSession, user_id: str, category: str = None, target_date: datetime = None,
+                                  limit: int = None, cursor: tuple = None):
+    return await db.run_sync(get_expenses_page, user_id, category=category, target_date=target_date,
+                             limit=limit, cursor=cursor)
+
+async def get_expense_dicts_page_async(db: AsyncSession, user_id: str, category: str = None,
+                                       target_date: datetime = None, limit: int = None, cursor: tuple = None):
+    return await db.run_sync(get_expense_dicts_page, user_id, category=category, target_date=target_date,
+                             limit=limit, cursor=cursor)
+
+async def get_recent_expenses_page_async(db: AsyncSession, user_id: str, category: str = None, cursor: tuple = None):
+    # Users whose window is in memory are answered right here, without a database round trip
+    page = get_cached_recent_expenses_page(user_id, category=category, cursor=cursor)
+    if page is not None:
+        return page
+    return await db.run_sync(get_recent_expenses_page, user_id, category=category, cursor=cursor)
+
+async def stream_expenses(db: AsyncSession, user_id: str, category: str = None,
+                          start: datetime = None, end: datetime = None, batch_size: int = 1000):
+    """
+    Yields the user's expenses oldest first as lists of plain row tuples, `batch_size` rows at a time.
+    Rows are fetched incrementally (yield_per), so memory stays flat however long the history is.
+    """
+    boundary = await db.run_sync(archive.archived_before)
+    # Includes the archived months when the range reaches them
+    entity = models.ExpenseHistory if boundary is not None and (start is None or start < boundary) else models.Expense
+    stmt = select(
+        entity.id,
+        entity.user_id,
+        entity.amount,
+        models.Category.name.label("category"),
+        entity.item_name,
+        entity.transaction_date,
+        entity.created_at,
+    ).join(models.Category, models.Category.id == entity.category_id).where(entity.user_id == user_id)
+    if category:
+        stmt = stmt.where(models.Category.name == category)
+    if start:
+        stmt = stmt.where(entity.transaction_date >= start)
+    if end:
+        stmt = stmt.where(entity.transaction_date < end)
+    stmt = stmt.order_by(entity.transaction_date, entity.id).execution_options(yield_per=batch_size)
+
+    result = await db.stream(stmt)
+    async for rows in result.partitions():
+        yield rows
+
+async def search_expenses_async(db: AsyncSession, user_id: str, query: str, start: datetime = None,
+                                end: datetime = None, limit: int = 50):
+    return await db.run_sync(search_expenses, user_id, query, start=start, end=end, limit=limit)
+
+async def delete_expenses_async(db: AsyncSession, user_id: str, target_date: datetime = None, expense_id: int = None):
+    return await db.run_sync(delete_expenses, user_id, target_date=target_date, expense_id=expense_id)
+
+async def get_weekly_report_async(db: AsyncSession, user_id: str):
+    return await db.run_sync(get_weekly_report, user_id)
+
+async def get_month_daily_totals_async(db: AsyncSession, user_id: str, today: date = None):
+    return await db.run_sync(get_month_daily_totals, user_id, today=today)
+
+async def get_forecast_async(db: AsyncSession, user_id: str):
+    return await db.run_sync(get_forecast, user_id)
+
+async def get_daily_rollups_async(db: AsyncSession, user_id: str, start_day: date = None, end_day: date = None):
+    return await db.run_sync(get_daily_rollups, user_id, start_day=start_day, end_day=end_day)
@@ -1,12 +1,111 @@
-from sqlalchemy import create_engine
+import os
+import zlib
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./sql_app.db"
 
+# --- Storage mode ---
+# "wal" (default): write-ahead log, readers never block the writer and vice versa, plus the
+#                  pragmas below applied on every new connection.
+# "legacy":        SQLite defaults (rollback journal, synchronous=FULL), nothing is changed.
+SQLITE_STORAGE_MODE = os.environ.get("SQLITE_STORAGE_MODE", "wal")
+# Durability: FULL (default, as before) fsyncs on every commit. With WAL, NORMAL is faster and
+# never corrupts the database, but a power loss (not an app crash) can drop the last committed
+# transactions; operators opt into it explicitly.
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "FULL")
+# Page cache per connection in KiB (64 MiB) and memory-mapped I/O size in bytes (256 MiB)
+SQLITE_CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+# How long a writer waits for the lock before failing with "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    if SQLITE_STORAGE_MODE != "wal":
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+# --- Sharding ---
+# 0 (default): every user in sql_app.db. N > 0: users are spread by a stable hash of user_id
+# over N files SQLITE_SHARD_DIR/shard_00.db ... Each file has its own write lock, so writes of
+# users on different shards no longer wait for each other. Changing N moves users to other
+# files: copy the data first with `python manage.py shard` (see sharding.py).
+SQLITE_SHARDS = int(os.environ.get("SQLITE_SHARDS", "0"))
+SQLITE_SHARD_DIR = os.environ.get("SQLITE_SHARD_DIR", "./shards")
+
+
+def shard_for(user_id: str, shards: int = SQLITE_SHARDS) -> int:
+    """Index of the shard holding `user_id` (crc32, so it is the same in every process and run)."""
+    return zlib.crc32(user_id.encode("utf-8")) % shards
+
+
+def shard_path(index: int, directory: str = SQLITE_SHARD_DIR) -> str:
+    return os.path.join(directory, f"shard_{index:02d}.db")
+
+
+def make_engine(path: str):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+
+def make_async_engine(path: str):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
+event.listen(engine, "connect", _set_sqlite_pragmas)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for the API (same database file, driven by aiosqlite).
+# The sync engine above stays for migrations, maintenance commands and scripts.
+ASYNC_SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./sql_app.db"
+
+async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL)
+event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+# expire_on_commit=False: returned objects stay readable after commit without a lazy (sync) reload
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# Every database the service uses: the shards, or just sql_app.db when not sharded.
+# Startup, maintenance commands and metrics iterate over these.
+if SQLITE_SHARDS:
+    os.makedirs(SQLITE_SHARD_DIR, exist_ok=True)
+    shard_engines = [make_engine(shard_path(i)) for i in range(SQLITE_SHARDS)]
+    async_shard_engines = [make_async_engine(shard_path(i)) for i in range(SQLITE_SHARDS)]
+    shard_sessions = [sessionmaker(autocommit=False, autoflush=False, bind=e) for e in shard_engines]
+    async_shard_sessions = [async_sessionmaker(e, autoflush=False, expire_on_commit=False)
+                            for e in async_shard_engines]
+else:
+    shard_engines = [engine]
+    async_shard_engines = [async_engine]
+    shard_sessions = [SessionLocal]
+    async_shard_sessions = [AsyncSessionLocal]
+
+
+def session_factory(user_id: str):
+    """Sync sessionmaker for the database holding `user_id` (SessionLocal when not sharded)."""
+    return shard_sessions[shard_for(user_id)] if SQLITE_SHARDS else SessionLocal
+
+
+def async_session_factory(user_id: str):
+    """Async sessionmaker for the database holding `user_id` (AsyncSessionLocal when not sharded)."""
+    return async_shard_sessions[shard_for(user_id)] if SQLITE_SHARDS else AsyncSessionLocal
+
+
 Base = declarative_base()
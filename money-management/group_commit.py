@@ -0,0 +1,153 @@
+"""
+Group-commit writer for /expenses/add.
+
+Instead of one transaction (and one fsync) per request, inserts that arrive within
+GROUP_COMMIT_WINDOW_MS of each other are written by a single background thread in
+one transaction. Every caller still gets its own saved row back.
+
+Durability: a request is only answered after the transaction holding its row has
+committed, so group commit never acknowledges a write that could be lost by an app
+crash. It trades up to GROUP_COMMIT_WINDOW_MS of extra latency for fewer commits.
+Protection against power loss is governed separately by SQLITE_SYNCHRONOUS in
+database.py (FULL: every commit is fsynced; NORMAL in WAL mode: the last commits
+can be lost on power failure, never corrupted).
+
+Disabled by default (GROUP_COMMIT_WINDOW_MS=0).
+"""
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from sqlalchemy.orm import sessionmaker
+
+import crud
+import database
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+
+# How long the writer waits for more inserts after the first one arrives. 0 disables group commit.
+GROUP_COMMIT_WINDOW_MS = float(os.environ.get("GROUP_COMMIT_WINDOW_MS", "0"))
+# Upper bound of rows committed in one transaction.
+GROUP_COMMIT_MAX_BATCH = int(os.environ.get("GROUP_COMMIT_MAX_BATCH", "256"))
+
+# Rows must stay readable after commit, outside the writer thread; one per database (see SQLITE_SHARDS)
+_writer_sessions = [sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+                    for engine in database.shard_engines]
+
+
+def writer_session(user_id: str):
+    """Sessionmaker for the database holding `user_id`."""
+    return _writer_sessions[database.shard_for(user_id)] if database.SQLITE_SHARDS else _writer_sessions[0]
+
+
+_STOP = object()
+
+
+class GroupCommitWriter:
+    def __init__(self, session_factory=writer_session, window_ms: float = GROUP_COMMIT_WINDOW_MS,
+                 max_batch: int = GROUP_COMMIT_MAX_BATCH):
+        self.session_factory = session_factory
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="group-commit-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, expense):
+        """Queues one schemas.ExpenseCreate; returns a Future resolving to the committed models.Expense."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((expense, future))
+        return future
+
+    async def add(self, expense):
+        return await asyncio.wrap_future(self.submit(expense))
+
+    def _collect(self, first) -> list:
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            self._write(self._collect(first))
+
+    def _write(self, batch: list) -> None:
+        # Users on different shards cannot share a transaction; commit once per database
+        by_database = {}
+        for item in batch:
+            by_database.setdefault(self.session_factory(item[0].user_id), []).append(item)
+        for session_factory, items in by_database.items():
+            self._write_batch(session_factory, items)
+
+    def _write_batch(self, session_factory, batch: list) -> None:
+        with session_factory() as db:
+            try:
+                rows = [crud.add_user_expense(db, expense) for expense, _ in batch]
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"Group commit of {len(batch)} rows failed, retrying one by one: {e}")
+            else:
+                for row, (_, future) in zip(rows, batch):
+                    future.set_result(row)
+                return
+
+            # Isolate the failing row(s) so the rest of the batch is still saved
+            for expense, future in batch:
+                try:
+                    row = crud.add_user_expense(db, expense)
+                    db.commit()
+                    # Committed: keep a later row's rollback from expiring it
+                    db.expunge(row)
+                    future.set_result(row)
+                except Exception as e:
+                    db.rollback()
+                    future.set_exception(e)
+
+    def stop(self) -> None:
+        """Writes what is already queued, then stops the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+            # Anything queued after the stop marker is rejected, leaving the queue clean for a restart
+            while not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is not _STOP:
+                    item[1].set_exception(RuntimeError("Group commit writer stopped"))
+
+
+writer = GroupCommitWriter()
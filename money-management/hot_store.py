@@ -0,0 +1,285 @@
+"""
+In-process hot window: each active user's most recent expenses, kept in memory.
+
+/expenses/query without a date or limit returns the last crud.DEFAULT_WINDOW_DAYS days, which is
+what clients ask for most. `crud.get_recent_expenses_page` answers those requests from here: a
+user's last HOT_STORE_DAYS days are loaded with one query on first access, after which pages are
+cut from memory without touching the database.
+
+Writes go through: crud records what it changed in the session (inserted rows, deleted ids or
+days, users whose rows were bulk-written) and the change is applied here once the transaction
+commits, like the response cache versions and the categories cache; a rollback discards it.
+Windows are evicted least recently used once their estimated size passes HOT_STORE_MAX_BYTES.
+
+Like cache.LocalCacheBackend, every process only sees the writes it made itself; with several
+workers, HOT_STORE_TTL bounds how long a window can miss another process's writes.
+"""
+import bisect
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+
+# Days of history kept per user; needs to cover crud.DEFAULT_WINDOW_DAYS to serve the default window
+HOT_STORE_DAYS = int(os.environ.get("HOT_STORE_DAYS", "7"))
+# Estimated memory budget of all windows together. 0 disables the hot store.
+HOT_STORE_MAX_BYTES = int(os.environ.get("HOT_STORE_MAX_BYTES", str(64 * 1024 * 1024)))
+# A window is reloaded from the database after this many seconds
+HOT_STORE_TTL = float(os.environ.get("HOT_STORE_TTL", "300"))
+
+# Row fields, in the order of schemas.Expense
+FIELDS = ("user_id", "amount", "category", "item_name", "transaction_date", "id", "created_at")
+
+
+def _as_stored(value):
+    # DateTime columns on SQLite keep the wall-clock time and drop the UTC offset; rows taken
+    # from a commit must look like the naive ones a reload returns
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.replace(tzinfo=None)
+    return value
+
+
+def _row_size(row: dict) -> int:
+    # Rough but consistent: the dict plus its values (strings, floats, datetimes)
+    return sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row.values())
+
+
+class _Window:
+    """One user's rows with transaction_date >= since, in ascending (transaction_date, id) order."""
+
+    def __init__(self, since: datetime, rows: list):
+        self.since = since
+        self.loaded_at = time.monotonic()
+        self.keys = [(row["transaction_date"], row["id"]) for row in rows]
+        self.rows = list(rows)
+        self.size = sum(_row_size(row) for row in rows)
+
+    def insert(self, row: dict) -> int:
+        key = (row["transaction_date"], row["id"])
+        index = bisect.bisect_left(self.keys, key)
+        if index < len(self.keys) and self.keys[index] == key:
+            # Already loaded: the window was read after this row had committed
+            return 0
+        self.keys.insert(index, key)
+        self.rows.insert(index, row)
+        size = _row_size(row)
+        self.size += size
+        return size
+
+    def remove(self, match) -> int:
+        kept_keys, kept_rows, freed = [], [], 0
+        for key, row in zip(self.keys, self.rows):
+            if match(row):
+                freed += _row_size(row)
+            else:
+                kept_keys.append(key)
+                kept_rows.append(row)
+        self.keys, self.rows = kept_keys, kept_rows
+        self.size -= freed
+        return freed
+
+    def trim(self, since: datetime) -> int:
+        """Drops rows that have aged out of the window."""
+        index = bisect.bisect_left(self.keys, (since,))
+        freed = sum(_row_size(row) for row in self.rows[:index])
+        del self.keys[:index], self.rows[:index]
+        self.since = since
+        self.size -= freed
+        return freed
+
+    def page(self, start: datetime, category: str = None, cursor: tuple = None, size: int = 1000) -> list:
+        """Up to `size` rows newest first, with transaction_date >= start and before `cursor`."""
+        stop = bisect.bisect_left(self.keys, cursor) if cursor else len(self.keys)
+        first = bisect.bisect_left(self.keys, (start,))
+        page = []
+        for index in range(stop - 1, first - 1, -1):
+            row = self.rows[index]
+            if category is None or row["category"] == category:
+                page.append(row)
+                if len(page) == size:
+                    break
+        return page
+
+
+class HotStore:
+    """Per-user windows, least recently used first, bounded by an estimated byte budget."""
+
+    def __init__(self, days: int = HOT_STORE_DAYS, max_bytes: int = HOT_STORE_MAX_BYTES, ttl: float = HOT_STORE_TTL):
+        self.days = days
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._windows = OrderedDict()  # user_id -> _Window
+        self._loading = {}  # user_id -> token of the load in progress
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 and self.days > 0
+
+    def covers(self, days: int) -> bool:
+        return self.enabled and self.days >= days
+
+    def window_start(self, now: datetime = None) -> datetime:
+        return (now or datetime.now()) - timedelta(days=self.days)
+
+    def page(self, user_id: str, start: datetime, category: str = None, cursor: tuple = None, size: int = 1000):
+        """
+        Returns the rows of a default-window page (see _Window.page), or None if the user's
+        window is not loaded and the caller has to load it (begin_load / install).
+        """
+        with self._lock:
+            window = self._windows.get(user_id)
+            if window is None:
+                return None
+            if time.monotonic() - window.loaded_at > self.ttl:
+                self._drop(user_id)
+                return None
+            self._windows.move_to_end(user_id)
+            # Slide the window forward once a day's worth of rows has aged out
+            since = self.window_start()
+            if since - window.since > timedelta(days=1):
+                self._bytes -= window.trim(since)
+            return window.page(start, category, cursor, size)
+
+    def begin_load(self, user_id: str) -> object:
+        """Call before reading the user's window from the database; pass the token to install."""
+        token = object()
+        with self._lock:
+            self._loading[user_id] = token
+        return token
+
+    def install(self, user_id: str, token: object, since: datetime, rows: list) -> _Window:
+        """
+        Stores the rows read since begin_load, unless a write for the user committed meanwhile
+        (the rows may predate it) or the window alone exceeds the budget. Returns the window
+        either way, so the caller can answer from it.
+        """
+        window = _Window(since, rows)
+        with self._lock:
+            if self._loading.get(user_id) is not token:
+                return window
+            del self._loading[user_id]
+            if window.size > self.max_bytes:
+                return window
+            self._drop(user_id)
+            self._windows[user_id] = window
+            self._bytes += window.size
+            self._evict()
+        return window
+
+    def _drop(self, user_id: str) -> None:
+        window = self._windows.pop(user_id, None)
+        if window is not None:
+            self._bytes -= window.size
+
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes and self._windows:
+            _, window = self._windows.popitem(last=False)
+            self._bytes -= window.size
+
+    def apply(self, changes: list) -> None:
+        """
+        Applies committed changes, see record_insert / record_delete / record_reset. A change
+        that cannot be applied drops the user's window instead of raising: the rows are
+        committed already, and the next request reloads them.
+        """
+        with self._lock:
+            for kind, user_id, value in changes:
+                # A load that started before this commit may have missed it
+                self._loading.pop(user_id, None)
+                window = self._windows.get(user_id)
+                if window is None:
+                    continue
+                try:
+                    if kind == "insert":
+                        if value["transaction_date"] is not None and value["transaction_date"] >= window.since:
+                            self._bytes += window.insert(value)
+                    elif kind == "delete":
+                        self._bytes -= window.remove(value)
+                    else:
+                        self._drop(user_id)
+                except Exception:
+                    logger.exception(f"Could not apply a {kind} to the hot window of {user_id}, dropping it")
+                    self._drop(user_id)
+            self._evict()
+
+    def drop(self, user_ids) -> None:
+        """Forgets the users' windows (and any load in progress); the next request reloads them."""
+        with self._lock:
+            for user_id in user_ids:
+                self._loading.pop(user_id, None)
+                self._drop(user_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._windows.clear()
+            self._loading.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"users": len(self._windows), "bytes": self._bytes,
+                    "rows": sum(len(window.rows) for window in self._windows.values())}
+
+
+store = HotStore()
+
+
+def _record(db: Session, change: tuple) -> None:
+    if store.enabled:
+        db.info.setdefault("hot_store_changes", []).append(change)
+
+
+def record_insert(db: Session, expense) -> None:
+    """Records a models.Expense added in this transaction; read once it has committed (and has its id)."""
+    _record(db, ("insert", expense.user_id, expense))
+
+
+def record_delete(db: Session, user_id: str, expense_id: int = None, day_start: datetime = None,
+                  day_end: datetime = None) -> None:
+    """Records a delete by id, or of every row in [day_start, day_end)."""
+    if expense_id:
+        match = lambda row: row["id"] == expense_id
+    else:
+        match = lambda row: row["transaction_date"] is not None and day_start <= row["transaction_date"] < day_end
+    _record(db, ("delete", user_id, match))
+
+
+def record_reset(db: Session, user_ids) -> None:
+    """Records writes that are not tracked row by row (bulk inserts): the users' windows are dropped."""
+    for user_id in user_ids:
+        _record(db, ("reset", user_id, None))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_changes(session):
+    changes = session.info.pop("hot_store_changes", None)
+    if not changes:
+        return
+    try:
+        changes = [
+            (kind, user_id, {field: _as_stored(getattr(value, field)) for field in FIELDS} if kind == "insert" else value)
+            for kind, user_id, value in changes
+        ]
+    except Exception:
+        # Runs after the commit: failing here would fail a request whose write succeeded
+        logger.exception("Could not read committed rows for the hot store, dropping the windows")
+        store.drop({user_id for _, user_id, _ in changes})
+        return
+    store.apply(changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changes(session):
+    session.info.pop("hot_store_changes", None)
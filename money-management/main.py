@@ -1,28 +1,67 @@
 from fastapi import FastAPI, Depends, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from fastapi.responses import JSONResponse, FileResponse, Response, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from datetime import datetime, timedelta
+from contextlib import asynccontextmanager
+import asyncio
 import logging
 
-import models, schemas, crud
-from database import SessionLocal, engine
+import models, schemas, crud, migrations
+import bulk_import
+import database
 import analysis_service
+import render_engine
+import report_jobs
+import group_commit
+import hot_store
+import metrics
+from cache import visual_report_cache, fingerprint_expenses, response_cache
 
 from fastapi.staticfiles import StaticFiles
 import base64
+import csv
+import io
+import json
 import os
-import uuid
+from urllib.parse import quote
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-models.Base.metadata.create_all(bind=engine)
+# Query timings and row counts for /metrics, on the sync and async engines of every database
+for _engine, _async_engine in zip(database.shard_engines, database.async_shard_engines):
+    metrics.instrument_engine(_engine)
+    metrics.instrument_engine(_async_engine.sync_engine)
+metrics.instrument_sessions()
+
+# sql_app.db, or every shard when SQLITE_SHARDS is set
+for _engine, _session in zip(database.shard_engines, database.shard_sessions):
+    models.Base.metadata.create_all(bind=_engine)
+    with _session() as _db:
+        migrations.run_migrations(_db)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if render_engine.REPORT_WARMUP:
+        # Opt-in: pay the analysis stack's import and font cache cost now, not on the first report
+        await asyncio.to_thread(render_engine.engine.warm_up)
+    yield
+    # Stop chart render workers on shutdown (queued report jobs still need them)
+    await asyncio.to_thread(report_jobs.jobs.stop)
+    render_engine.engine.shutdown()
+    await asyncio.to_thread(group_commit.writer.stop)
+    for _async_engine in database.async_shard_engines:
+        await _async_engine.dispose()
 
 app = FastAPI(
+    lifespan=lifespan,
     title="智能校园记账助手",
     description="基于FastAPI构建的校园记账助手后端服务，支持多租户数据隔离，提供记账、查账、可视化周报生成及毒舌财运预测功能。",
     version="1.2.0"
@@ -46,6 +85,13 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+# Per-route latency histograms (outermost, so the time includes every other middleware)
+app.add_middleware(metrics.MetricsMiddleware)
+
+@app.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
+
 # Exception handler for 422 errors to log body
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -58,158 +104,532 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     )
 
 # Dependency
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db(request: Request):
+    # Resolved per request: with SQLITE_SHARDS the user_id query parameter picks the database.
+    # Endpoints taking user_id from the body open their session with database.async_session_factory.
+    async with database.async_session_factory(request.query_params.get("user_id", ""))() as db:
         yield db
-    finally:
-        db.close()
 
 @app.post("/expenses/add", response_model=schemas.Expense)
-def create_expense(expense: schemas.ExpenseCreate, db: Session = Depends(get_db)):
-    return crud.create_user_expense(db=db, expense=expense)
+async def create_expense(expense: schemas.ExpenseCreate):
+    if group_commit.writer.enabled:
+        # Coalesced with concurrent inserts into one transaction; answered once it has committed
+        return await group_commit.writer.add(expense)
+    async with database.async_session_factory(expense.user_id)() as db:
+        return await crud.create_user_expense_async(db=db, expense=expense)
+
+BULK_CHUNK_SIZE = 1000
+BULK_MAX_ERRORS = 1000
+
+def _insert_chunk(db: Session, chunk: list):
+    """
+    Inserts one validated chunk in a single transaction; if the chunk fails, retries row by row
+    so one bad row does not sink the rest. Returns (inserted, row_errors).
+    """
+    try:
+        return crud.bulk_create_expenses(db, [expense for _, expense in chunk]), []
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"Bulk insert chunk failed, retrying row by row: {e}")
+    inserted = 0
+    row_errors = []
+    for number, expense in chunk:
+        try:
+            inserted += crud.bulk_create_expenses(db, [expense])
+        except Exception as e:
+            db.rollback()
+            row_errors.append({"row": number, "error": str(e)})
+    return inserted, row_errors
+
+@app.post("/expenses/bulk_add")
+async def bulk_create_expenses(request: Request):
+    """
+    Imports many expenses at once. The body is a JSON array, NDJSON (application/x-ndjson)
+    or CSV (text/csv, header row required) with the same fields as /expenses/add.
+    Rows are validated and inserted in chunks; invalid rows are reported and skipped.
+    """
+    records = bulk_import.iter_records(request.headers.get("content-type"), request)
+    if records is None:
+        raise HTTPException(status_code=415, detail="Use application/json, application/x-ndjson or text/csv")
+
+    inserted = 0
+    row_errors = []
+    chunk = []
+
+    async def flush():
+        nonlocal inserted, chunk
+        # Rows can belong to users on different shards; each database gets its own transaction
+        by_database = {}
+        for number, expense in chunk:
+            by_database.setdefault(database.async_session_factory(expense.user_id), []).append((number, expense))
+        for session_factory, rows in by_database.items():
+            async with session_factory() as db:
+                chunk_inserted, chunk_errors = await db.run_sync(_insert_chunk, rows)
+            inserted += chunk_inserted
+            row_errors.extend(chunk_errors)
+        chunk = []
+
+    async for number, record, error in records:
+        if error is None:
+            try:
+                chunk.append((number, schemas.ExpenseCreate.model_validate(record)))
+            except ValidationError as e:
+                error = e.errors(include_url=False, include_context=False)
+        if error is not None:
+            row_errors.append({"row": number, "error": error})
+        if len(chunk) >= BULK_CHUNK_SIZE:
+            await flush()
+    if chunk:
+        await flush()
+
+    return {
+        "inserted": inserted,
+        "failed": len(row_errors),
+        # Only the first errors are echoed back to keep the response small
+        "errors": sorted(row_errors, key=lambda e: e["row"])[:BULK_MAX_ERRORS],
+    }
+
+def _parse_date(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Invalid date format. Use YYYY-MM-DD")
+
+# Serve /expenses/query from plain column tuples encoded with orjson (schemas.expense_page_json)
+# instead of validating every row through schemas.Expense; same JSON, much cheaper for large pages
+EXPENSE_QUERY_FAST_JSON = os.environ.get("EXPENSE_QUERY_FAST_JSON", "0") == "1"
 
 @app.get("/expenses/query", response_model=schemas.ExpenseResponse)
-def read_expenses(
+async def read_expenses(
     user_id: str = Query(..., description="The ID of the user to retrieve expenses for"),
     category: Optional[str] = Query(None, description="Filter by category (e.g. 餐饮, 交通)"),
     date: Optional[str] = Query(None, description="Filter by specific date (YYYY-MM-DD). If not provided, returns last 7 days."),
-    limit: Optional[int] = Query(None, description="Limit the number of results returned. If provided, results are sorted by latest time first."),
-    db: Session = Depends(get_db)
+    limit: Optional[int] = Query(None, ge=1, description="Page size (max 1000). Results are always sorted by latest time first."),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    db: AsyncSession = Depends(get_db)
 ):
-    target_date = None
-    if date:
+    target_date = _parse_date(date)
+    after = None
+    if cursor:
         try:
-            target_date = datetime.strptime(date, "%Y-%m-%d")
+            after = crud.decode_cursor(cursor)
         except ValueError:
-             raise HTTPException(status_code=422, detail="Invalid date format. Use YYYY-MM-DD")
+            raise HTTPException(status_code=422, detail="Invalid cursor")
 
-    expenses = crud.get_expenses(
+    if target_date is None and not limit and hot_store.store.covers(crud.DEFAULT_WINDOW_DAYS):
+        # The default window: from the user's in-memory hot window (hot_store.py)
+        expenses, next_cursor = await crud.get_recent_expenses_page_async(
+            db, user_id=user_id, category=category, cursor=after
+        )
+        if EXPENSE_QUERY_FAST_JSON:
+            return Response(content=schemas.expense_page_json(expenses, next_cursor), media_type="application/json")
+        return {"expenses": expenses, "next_cursor": next_cursor}
+
+    if EXPENSE_QUERY_FAST_JSON:
+        expenses, next_cursor = await crud.get_expense_dicts_page_async(
+            db, user_id=user_id, category=category, target_date=target_date, limit=limit, cursor=after
+        )
+        return Response(content=schemas.expense_page_json(expenses, next_cursor), media_type="application/json")
+
+    expenses, next_cursor = await crud.get_expenses_page_async(
         db, 
         user_id=user_id, 
         category=category,
         target_date=target_date,
-        limit=limit
+        limit=limit,
+        cursor=after
     )
-    # Debugging
-    if expenses:
-        print(f"DEBUG: First expense item_name: {expenses[0].item_name}")
-    print(f"DEBUG: Schema fields: {schemas.Expense.model_fields}")
-    
-    return {"expenses": expenses}
+    return {"expenses": expenses, "next_cursor": next_cursor}
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FIELDS = ["id", "user_id", "amount", "category", "item_name", "transaction_date", "created_at"]
+
+async def _export_rows(user_id: str, category: Optional[str], start: Optional[datetime],
+                       end: Optional[datetime], format: str):
+    # Own session: it has to live exactly as long as the streamed response
+    async with database.async_session_factory(user_id)() as db:
+        if format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_FIELDS)
+            yield buffer.getvalue()
+        async for rows in crud.stream_expenses(db, user_id, category=category, start=start, end=end,
+                                               batch_size=EXPORT_BATCH_SIZE):
+            if format == "csv":
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows(
+                    (r.id, r.user_id, r.amount, r.category, r.item_name,
+                     r.transaction_date.isoformat() if r.transaction_date else "",
+                     r.created_at.isoformat() if r.created_at else "")
+                    for r in rows
+                )
+                yield buffer.getvalue()
+            else:
+                yield "".join(
+                    json.dumps({
+                        "id": r.id, "user_id": r.user_id, "amount": r.amount, "category": r.category,
+                        "item_name": r.item_name,
+                        "transaction_date": r.transaction_date.isoformat() if r.transaction_date else None,
+                        "created_at": r.created_at.isoformat() if r.created_at else None,
+                    }, ensure_ascii=False) + "\n"
+                    for r in rows
+                )
+
+@app.get("/expenses/export")
+async def export_expenses(
+    user_id: str = Query(..., description="The ID of the user to export"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="ndjson (default) or csv"),
+    category: Optional[str] = Query(None, description="Filter by category"),
+    start: Optional[str] = Query(None, description="First day to include (YYYY-MM-DD)"),
+    end: Optional[str] = Query(None, description="Last day to include (YYYY-MM-DD)"),
+):
+    """
+    Streams the user's full (or date-ranged) history oldest first, without building it in memory.
+    """
+    start_date = _parse_date(start)
+    end_date = _parse_date(end)
+    if end_date:
+        end_date += timedelta(days=1)
+
+    media_type = "text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        _export_rows(user_id, category, start_date, end_date, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="expenses_{user_id}.{format}"'},
+    )
+
+EXPENSE_SEARCH_MAX = 500
+
+@app.get("/expenses/search", response_model=schemas.ExpenseSearchResponse)
+async def search_expenses(
+    user_id: str = Query(..., description="The ID of the user"),
+    q: str = Query(..., min_length=1, description="Text to find in item_name; several words must all match"),
+    start: Optional[str] = Query(None, description="First day to include (YYYY-MM-DD)"),
+    end: Optional[str] = Query(None, description="Last day to include (YYYY-MM-DD)"),
+    limit: int = Query(50, ge=1, le=EXPENSE_SEARCH_MAX, description="Matches to return, newest first (max 500)"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Full-text search over item_name (FTS5 trigram index: substrings, Chinese included), with
+    the count and total amount of all matches, e.g. "how much at Starbucks this year".
+    """
+    if not q.strip():
+        raise HTTPException(status_code=422, detail="Query must not be blank")
+    start_date = _parse_date(start)
+    end_date = _parse_date(end)
+    if end_date:
+        end_date += timedelta(days=1)
+
+    count, total, rows = await crud.search_expenses_async(
+        db, user_id=user_id, query=q, start=start_date, end=end_date, limit=limit
+    )
+    return {"query": q, "count": count, "total_amount": round(total, 2), "expenses": rows}
 
 @app.get("/expenses/delete")
-def delete_expenses(
+async def delete_expenses(
     user_id: str = Query(..., description="The ID of the user"),
     date: Optional[str] = Query(None, description="Delete all expenses on this date (YYYY-MM-DD)"),
     expense_id: Optional[int] = Query(None, description="Delete a specific expense by ID"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    target_date = None
-    if date:
-        try:
-            target_date = datetime.strptime(date, "%Y-%m-%d")
-        except ValueError:
-             raise HTTPException(status_code=422, detail="Invalid date format. Use YYYY-MM-DD")
+    target_date = _parse_date(date)
 
     if not target_date and not expense_id:
         raise HTTPException(status_code=400, detail="Must provide either 'date' or 'expense_id' to delete.")
         
-    count = crud.delete_expenses(db, user_id=user_id, target_date=target_date, expense_id=expense_id)
+    count = await crud.delete_expenses_async(db, user_id=user_id, target_date=target_date, expense_id=expense_id)
     
     if count == 0:
         return {"message": "No records found to delete."}
         
     return {"message": f"Deleted {count} expenses."}
 
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
+async def _cached_response(request: Request, endpoint: str, user_id: str, params: dict, compute) -> Response:
+    """
+    Serves a JSON report from the per-user response cache, with an ETag.
+
+    A client that sends the ETag back in If-None-Match gets 304 Not Modified while the
+    user's data is unchanged, without touching the database. `compute` is only awaited on a miss.
+    """
+    key = response_cache.key(endpoint, user_id, params)
+    headers = {"ETag": f'"{key}"', "Cache-Control": "private, no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    body = response_cache.get(key)
+    if body is None:
+        body = json.dumps(await compute(), ensure_ascii=False).encode("utf-8")
+        response_cache.set(key, body)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @app.get("/report/weekly")
-def read_weekly_report(
+async def read_weekly_report(
+    request: Request,
     user_id: str = Query(..., description="The ID of the user to retrieve report for"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    stats = crud.get_weekly_report(db, user_id=user_id)
-    total_expense = sum(item['total'] for item in stats)
-    return {
-        "user_id": user_id,
-        "summary": stats,
-        "total_expense": total_expense
-    }
+    async def compute():
+        stats = await crud.get_weekly_report_async(db, user_id=user_id)
+        total_expense = sum(item['total'] for item in stats)
+        return {
+            "user_id": user_id,
+            "summary": stats,
+            "total_expense": total_expense
+        }
+
+    return await _cached_response(request, "report/weekly", user_id, {}, compute)
+
+REPORT_WINDOW_DAYS = 7
+
+async def _load_report_inputs(db: AsyncSession, user_id: str):
+    """Fetches the data a visual report is drawn from, plus its render-cache fingerprint."""
+    # Last 7 days from the daily rollups: one row per day and category, not per expense
+    start_day = (datetime.now() - timedelta(days=REPORT_WINDOW_DAYS)).date()
+    rollups = await crud.get_daily_rollups_async(db, user_id=user_id, start_day=start_day)
+
+    # Convert to format expected by analysis_service
+    rollup_list = []
+    for r in rollups:
+        rollup_list.append({
+            "date": r.day,
+            "amount": r.total,
+            "category": r.category
+        })
+    with analysis_service.collect_stage_timings() as timings:
+        report_data = analysis_service.report_data_from_rollups(rollup_list)
+    metrics.observe_render_stages(timings)
+    return report_data, fingerprint_expenses(rollup_list)
+
+@app.get("/analysis/report_data")
+async def get_report_data(
+    request: Request,
+    user_id: str = Query(..., description="User ID"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Returns the series the visual report is drawn from as JSON, for clients that draw the
+    charts themselves. Computed from the daily rollups; nothing is rendered. The PNG stays
+    available on demand at png_url. 404 when the window holds no data, like the PNG.
+    """
+    today = datetime.now().date()
+
+    async def compute():
+        report_data, _ = await _load_report_inputs(db, user_id)
+        if not report_data:
+            raise HTTPException(status_code=404, detail="No data available to generate report.")
+        return {
+            "user_id": user_id,
+            "window_days": REPORT_WINDOW_DAYS,
+            **analysis_service.report_series(report_data),
+            "png_url": f"/analysis/visual_report.png?user_id={quote(user_id, safe='')}",
+        }
+
+    # The 7-day window moves with the date, so today is part of the key
+    return await _cached_response(request, "analysis/report_data", user_id, {"today": today}, compute)
+
+def _cached_report_path(user_id: str, fingerprint: str) -> Optional[str]:
+    """Render cache: same chart inputs -> same image, skip matplotlib entirely."""
+    filename = visual_report_cache.get((user_id, fingerprint))
+    if filename:
+        file_path = os.path.join("static", filename)
+        if os.path.exists(file_path):
+            return file_path
+    return None
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+def _write_file(path: str, data) -> None:
+    with open(path, "wb") as f:
+        f.write(data)
+
+def _report_file_path(user_id: str, fingerprint: str) -> str:
+    # The filename is derived from the data fingerprint, so an unchanged report maps to the same file
+    return os.path.join("static", f"report_{user_id}_{fingerprint[:16]}.png")
+
+async def _render_report(report_data: dict, path: Optional[str] = None):
+    """Renders in the chart worker pool; rejects instead of piling up when it is saturated."""
+    try:
+        if path:
+            return await render_engine.engine.render_to_file_async(report_data, path)
+        return await render_engine.engine.render_async(report_data)
+    except (render_engine.RendererBusy, asyncio.TimeoutError):
+        raise HTTPException(
+            status_code=503,
+            detail="Report renderer is busy, please retry later.",
+            headers={"Retry-After": "5"},
+        )
 
 @app.get("/analysis/visual_report")
-def get_visual_report(
+async def get_visual_report(
     request: Request,
     user_id: str = Query(..., description="User ID"),
-    db: Session = Depends(get_db)
+    format: str = Query("url", pattern="^(url|base64)$", description="url (default) or base64 (opt-in, larger payload)"),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Generates a visual report and returns a URL to the image.
     Optimized for AI Agents: Returns a URL instead of Base64 to save tokens.
     """
-    # Fetch all expenses for the user (or could be filtered by date)
-    expenses = crud.get_expenses(db, user_id=user_id)
-    
-    # Convert to format expected by analysis_service
-    expense_list = []
-    for e in expenses:
-        expense_list.append({
-            "date": e.transaction_date,
-            "item": e.item_name,
-            "amount": e.amount,
-            "category": e.category
-        })
-        
-    image_base64 = analysis_service.generate_visual_report(expense_list)
-    
-    if not image_base64:
+    report_data, fingerprint = await _load_report_inputs(db, user_id)
+    if not report_data:
+        if format == "base64":
+            return {"image_base64": "", "message": "No data available to generate report."}
         return {"image_url": "", "message": "No data available to generate report."}
 
-    # Save image to static directory
-    # Use a unique filename or overwrite based on user_id? 
-    # For agents, unique is better to avoid caching issues, but we'll use user_id + timestamp for simplicity
-    filename = f"report_{user_id}_{int(datetime.now().timestamp())}.png"
-    file_path = os.path.join("static", filename)
-    
+    if format == "base64":
+        file_path = _cached_report_path(user_id, fingerprint)
+        if file_path:
+            image_data = await run_in_threadpool(_read_file, file_path)
+        else:
+            image_data = await _render_report(report_data)
+        return {"image_base64": base64.b64encode(image_data).decode("utf-8")}
+
+    file_path = _cached_report_path(user_id, fingerprint)
+    if not file_path:
+        # Save image to static directory; the render worker writes the file itself
+        file_path = _report_file_path(user_id, fingerprint)
+        try:
+            await _render_report(report_data, path=file_path)
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to save image: {e}")
+            raise HTTPException(status_code=500, detail="Failed to generate image file")
+        visual_report_cache.set((user_id, fingerprint), os.path.basename(file_path))
+
+    # Construct full URL
+    # Note: In production (Cloud), this should be the public domain.
+    base_url = str(request.base_url).rstrip("/")
+    image_url = f"{base_url}/static/{os.path.basename(file_path)}"
+    return {
+        "image_url": image_url,
+        "tips": "Agent should render this as a Markdown image: ![](" + image_url + ")"
+    }
+
+def _job_response(request: Request, job: report_jobs.ReportJob) -> dict:
+    base_url = str(request.base_url).rstrip("/")
+    body = {
+        "job_id": job.id,
+        "status": job.status,
+        "poll_url": f"{base_url}/analysis/visual_report/jobs/{job.id}?user_id={quote(job.user_id, safe='')}",
+    }
+    if job.status == report_jobs.DONE:
+        body["image_url"] = f"{base_url}/static/{job.filename}"
+    elif job.status == report_jobs.FAILED:
+        body["error"] = job.error
+    return body
+
+@app.post("/analysis/visual_report/jobs", status_code=202)
+async def create_visual_report_job(
+    request: Request,
+    user_id: str = Query(..., description="User ID"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Queues a visual report and returns a job id right away; poll the job for the image URL.
+    Submitting again while the same report is still pending returns the pending job.
+    """
+    report_data, fingerprint = await _load_report_inputs(db, user_id)
+    if not report_data:
+        return JSONResponse(status_code=200, content={"status": "empty", "message": "No data available to generate report."})
+
+    file_path = _cached_report_path(user_id, fingerprint)
+    if file_path:
+        return _job_response(request, report_jobs.jobs.add_finished(user_id, fingerprint, file_path))
     try:
-        image_data = base64.b64decode(image_base64)
-        with open(file_path, "wb") as f:
-            f.write(image_data)
-            
-        # Construct full URL
-        # Note: In production (Cloud), this should be the public domain.
-        base_url = str(request.base_url).rstrip("/")
-        image_url = f"{base_url}/static/{filename}"
-        
-        return {
-            "image_url": image_url, 
-            "tips": "Agent should render this as a Markdown image: ![](" + image_url + ")"
-        }
-    except Exception as e:
+        job = report_jobs.jobs.submit(user_id, fingerprint, report_data, _report_file_path(user_id, fingerprint))
+    except report_jobs.QueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many report jobs pending, please retry later.",
+            headers={"Retry-After": "5"},
+        )
+    return _job_response(request, job)
+
+@app.get("/analysis/visual_report/jobs/{job_id}")
+async def get_visual_report_job(
+    request: Request,
+    job_id: str,
+    user_id: str = Query(..., description="User ID the job was submitted for")
+):
+    """Returns the job status (queued / running / done / failed) and, once done, the image URL."""
+    job = report_jobs.jobs.get(job_id)
+    if job is None and report_jobs.fingerprint_prefix(job_id):
+        # Accepted by another worker process: found once its image is rendered
+        job = report_jobs.finished_job(user_id, job_id, _report_file_path(user_id, report_jobs.fingerprint_prefix(job_id)))
+    if job is None or job.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return _job_response(request, job)
+
+@app.get("/analysis/visual_report.png", response_class=Response)
+async def get_visual_report_png(
+    user_id: str = Query(..., description="User ID"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Returns the visual report directly as an image/png body (no URL round trip, no Base64).
+    """
+    report_data, fingerprint = await _load_report_inputs(db, user_id)
+    if not report_data:
+        raise HTTPException(status_code=404, detail="No data available to generate report.")
+
+    file_path = _cached_report_path(user_id, fingerprint)
+    if file_path:
+        return FileResponse(file_path, media_type="image/png")
+
+    image_data = await _render_report(report_data)
+    # Keep the file for the URL mode and later cache hits; the same buffer backs the response
+    file_path = _report_file_path(user_id, fingerprint)
+    try:
+        await run_in_threadpool(_write_file, file_path, image_data)
+        visual_report_cache.set((user_id, fingerprint), os.path.basename(file_path))
+    except OSError as e:
         logger.error(f"Failed to save image: {e}")
-        raise HTTPException(status_code=500, detail="Failed to generate image file")
+    return Response(content=image_data, media_type="image/png")
 
 @app.get("/analysis/toxic_prediction")
-def get_toxic_prediction(
+async def get_toxic_prediction(
+    request: Request,
     user_id: str = Query(...),
     budget: float = Query(2000.0, description="Monthly budget target"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Generates a toxic prediction of month-end spending.
     """
-    # Fetch expenses (analysis service filters for current month internally)
-    expenses = crud.get_expenses(db, user_id=user_id)
-    
-    expense_list = []
-    for e in expenses:
-        expense_list.append({
-            "date": e.transaction_date,
-            "item": e.item_name,
-            "amount": e.amount,
-            "category": e.category
-        })
-        
-    report = analysis_service.toxic_prediction(expense_list, budget)
-    return {"report": report}
+    today = datetime.now().date()
+
+    async def compute():
+        # Served from the nightly batch when it is from today (writes delete the stored row)
+        forecast = await crud.get_forecast_async(db, user_id=user_id)
+        if forecast is not None and forecast.computed_on == today:
+            report = analysis_service.format_toxic_report(analysis_service.precomputed_forecast({
+                "current_total": forecast.current_total,
+                "daily_average": forecast.daily_average,
+                "predicted_total": forecast.predicted_total,
+            }, budget))
+            return {"report": report}
+
+        # Month-to-date per-day sums straight from SQL; cost does not depend on the number of expenses
+        daily_totals = await crud.get_month_daily_totals_async(db, user_id=user_id)
+        report = analysis_service.toxic_prediction_from_daily_totals(daily_totals, budget)
+        return {"report": report}
+
+    # The forecast depends on the date as well as the data, so today is part of the key
+    return await _cached_response(
+        request, "analysis/toxic_prediction", user_id, {"budget": budget, "today": today}, compute
+    )
 
 if __name__ == "__main__":
     import uvicorn
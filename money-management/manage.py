@@ -0,0 +1,153 @@
+"""
+Maintenance commands for the money-management service.
+
+Usage:
+    python manage.py migrate
+    python manage.py backfill-rollups [--user-id USER]
+    python manage.py forecast [--budget 2000] [--seasonality]
+    python manage.py snapshot [--user-id USER] [--dir DIR]
+    python manage.py shard --shards N [--source sql_app.db ...] [--dir DIR]
+    python manage.py archive [--months 12]
+
+With SQLITE_SHARDS set, every command runs against all shards (or the shard of --user-id).
+"""
+import argparse
+from datetime import date, timedelta
+
+import models, crud, migrations
+import analysis_service
+import archive
+import database
+import sharding
+import snapshot
+
+
+def _sessions(user_id: str = None) -> list:
+    # The database holding user_id, or every database (sql_app.db or all shards)
+    return [database.session_factory(user_id)] if user_id else database.shard_sessions
+
+
+def cmd_migrate(args) -> None:
+    count = 0
+    for engine, session in zip(database.shard_engines, database.shard_sessions):
+        models.Base.metadata.create_all(bind=engine)
+        with session() as db:
+            count += migrations.run_migrations(db)
+    print(f"Applied {count} migration(s).")
+
+
+def cmd_backfill_rollups(args) -> None:
+    for engine in database.shard_engines:
+        models.Base.metadata.create_all(bind=engine)
+    count = 0
+    for session in _sessions(args.user_id):
+        with session() as db:
+            count += crud.rebuild_daily_rollups(db, user_id=args.user_id)
+    target = f"user {args.user_id}" if args.user_id else "all users"
+    print(f"Rebuilt {count} daily rollup rows for {target}.")
+
+
+def cmd_forecast(args) -> None:
+    today = date.today()
+    start_day = today.replace(day=1)
+    if args.seasonality:
+        start_day = min(start_day, today - timedelta(weeks=analysis_service.SEASONALITY_WEEKS))
+
+    import pandas as pd
+
+    results = []
+    count = 0
+    for session in _sessions():
+        with session() as db:
+            # One columnar pull for all users (of this database), one vectorized pass, one write
+            rows = crud.get_daily_totals_for_all_users(db, start_day, today)
+            result = analysis_service.batch_forecast(rows, budget=args.budget, seasonality=args.seasonality)
+            records = result[["current_total", "daily_average", "predicted_total"]].reset_index().to_dict("records")
+            count += crud.save_forecasts(db, records, computed_on=today,
+                                         model="weekday" if args.seasonality else "flat")
+        results.append(result)
+
+    result = pd.concat(results)
+    over_budget = result[result["overrun"] > 0]
+    print(f"Forecast {count} users; {len(over_budget)} predicted over a budget of {args.budget:.2f}.")
+    for user_id, row in over_budget.sort_values("overrun", ascending=False).iterrows():
+        print(f"  {user_id}: predicted {row['predicted_total']:.2f} (over by {row['overrun']:.2f})")
+
+
+def cmd_snapshot(args) -> None:
+    written = {}
+    for session in _sessions(args.user_id):
+        with session() as db:
+            # With several shards, each export only sees its own users; prune once all are written
+            written.update(snapshot.export_snapshots(db, user_id=args.user_id, directory=args.dir, prune=False))
+    if not args.user_id:
+        snapshot.prune_snapshots(written, args.dir)
+    print(f"Exported {sum(written.values())} expenses for {len(written)} user(s) to {args.dir}.")
+
+
+def cmd_shard(args) -> None:
+    try:
+        copied = sharding.copy_into_shards(args.source, args.shards, args.dir)
+    except ValueError as e:
+        raise SystemExit(f"shard: {e}")
+    for table, rows in copied.items():
+        print(f"Copied {rows} {table} rows.")
+    print(f"Done. Start the service with SQLITE_SHARDS={args.shards} SQLITE_SHARD_DIR={args.dir}.")
+
+
+def cmd_archive(args) -> None:
+    moved = {}
+    for engine, session in zip(database.shard_engines, database.shard_sessions):
+        # Archiving relies on the AUTOINCREMENT ids of the latest schema
+        models.Base.metadata.create_all(bind=engine)
+        with session() as db:
+            migrations.run_migrations(db)
+            try:
+                for table, rows in archive.archive_expenses(db, months=args.months).items():
+                    moved[table] = moved.get(table, 0) + rows
+            except ValueError as e:
+                raise SystemExit(f"archive: {e}")
+    for table, rows in sorted(moved.items()):
+        print(f"  {table}: {rows} expenses")
+    print(f"Archived {sum(moved.values())} expenses older than {args.months} months into {len(moved)} month table(s).")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Money-management maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate = subparsers.add_parser("migrate", help="Apply pending schema migrations")
+    migrate.set_defaults(func=cmd_migrate)
+
+    backfill = subparsers.add_parser("backfill-rollups", help="Recompute daily_rollups from the expenses table")
+    backfill.add_argument("--user-id", help="Only rebuild this user's rollups")
+    backfill.set_defaults(func=cmd_backfill_rollups)
+
+    forecast = subparsers.add_parser("forecast", help="Precompute month-end forecasts for all users")
+    forecast.add_argument("--budget", type=float, default=2000.0, help="Budget used for the over-budget list")
+    forecast.add_argument("--seasonality", action="store_true", help="Use the weekday-seasonality model")
+    forecast.set_defaults(func=cmd_forecast)
+
+    snap = subparsers.add_parser("snapshot", help="Export expenses to per-user Arrow files for long-range analysis")
+    snap.add_argument("--user-id", help="Only export this user's expenses")
+    snap.add_argument("--dir", default=snapshot.SNAPSHOT_DIR, help="Snapshot directory")
+    snap.set_defaults(func=cmd_snapshot)
+
+    shard = subparsers.add_parser("shard", help="Copy the data into N shard databases (split or rebalance)")
+    shard.add_argument("--shards", type=int, required=True, help="Number of shards of the new layout")
+    shard.add_argument("--source", nargs="+", default=["sql_app.db"],
+                       help="Database file(s) to copy from: sql_app.db, or the shard files of the old layout")
+    shard.add_argument("--dir", default=database.SQLITE_SHARD_DIR, help="Directory of the new shard files (must be empty)")
+    shard.set_defaults(func=cmd_shard)
+
+    arch = subparsers.add_parser("archive", help="Move old expenses into monthly archive tables")
+    arch.add_argument("--months", type=int, default=archive.ARCHIVE_AFTER_MONTHS,
+                      help="Whole months (besides the current one) kept in the expenses table")
+    arch.set_defaults(func=cmd_archive)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
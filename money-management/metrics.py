@@ -0,0 +1,187 @@
+"""
+In-process metrics, exposed in Prometheus text format at /metrics.
+
+- http_request_duration_seconds: per route (path template, not raw URL), method and status,
+  recorded by MetricsMiddleware.
+- db_query_duration_seconds / db_query_rows: per statement type and table, recorded by the
+  SQLAlchemy hooks installed with instrument_engine / instrument_sessions. Queries slower
+  than SLOW_QUERY_MS are also logged.
+- report_render_stage_seconds: report stages (data, plot, savefig), see
+  analysis_service.collect_stage_timings. Renders in worker processes send their timings
+  back with the image, so they are recorded here too.
+
+Each API process keeps its own registry; with several uvicorn workers, every scrape sees
+the process that answered it.
+"""
+import bisect
+import logging
+import os
+import re
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+
+# Log queries slower than this many milliseconds. 0 disables the slow-query log.
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "0"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+
+class Histogram:
+    """A labelled histogram with cumulative buckets, rendered in Prometheus text format."""
+
+    def __init__(self, name: str, help_text: str, labels: tuple, buckets: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        for label_values, series in sorted(snapshot.items()):
+            labels = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.labels, label_values))
+            prefix = labels + "," if labels else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-2]}")
+            lines.append(f"{self.name}_count{{{labels}}} {series[-1]}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("method", "route", "status"), LATENCY_BUCKETS)
+db_query_duration = Histogram(
+    "db_query_duration_seconds", "SQL statement execution time.", ("operation", "table"), QUERY_BUCKETS)
+db_query_rows = Histogram(
+    "db_query_rows", "Rows returned by ORM/Session SELECTs.", ("table",), ROW_BUCKETS)
+render_stage_duration = Histogram(
+    "report_render_stage_seconds", "Visual report stage time.", ("stage",), LATENCY_BUCKETS)
+
+REGISTRY = [http_request_duration, db_query_duration, db_query_rows, render_stage_duration]
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- HTTP ---
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request, labelled with the matched route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route in the scope; raw paths would explode the label set
+            route = scope.get("route")
+            http_request_duration.observe(time.perf_counter() - started, scope["method"],
+                                          getattr(route, "path", "unmatched"), status)
+
+
+# --- Database ---
+
+_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE|JOIN)\s+\"?(\w+)", re.IGNORECASE)
+
+
+def _describe(statement: str) -> tuple:
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "?"
+    match = _TABLE.search(statement)
+    return operation, match.group(1) if match else ""
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    db_query_duration.observe(elapsed, *_describe(statement))
+    if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+        logger.warning(f"Slow query ({elapsed * 1000:.1f} ms): {' '.join(statement.split())}")
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute; drop its start time
+    started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+def instrument_engine(engine) -> None:
+    """Times every statement run on `engine` (pass async_engine.sync_engine for the async one)."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+def _count_rows(orm_execute_state):
+    if not orm_execute_state.is_select:
+        return None
+    options = orm_execute_state.execution_options
+    if options.get("yield_per") or options.get("stream_results"):
+        # Streamed results are consumed lazily; counting them would buffer the whole result
+        return None
+    frozen = orm_execute_state.invoke_statement().freeze()
+    table = orm_execute_state.bind_mapper.local_table.name if orm_execute_state.bind_mapper else ""
+    db_query_rows.observe(len(frozen.data), table)
+    return frozen()
+
+
+def instrument_sessions() -> None:
+    """Counts the rows returned by SELECTs run through any Session (sync, or async via run_sync)."""
+    event.listen(Session, "do_orm_execute", _count_rows)
+
+
+def observe_render_stages(timings: list) -> None:
+    for stage, seconds in timings:
+        render_stage_duration.observe(seconds, stage)
@@ -0,0 +1,142 @@
+"""
+Schema migrations for databases created by earlier versions of the service.
+
+`models.Base.metadata.create_all` only creates missing tables; it never changes
+existing ones. Changes to existing tables (indexes, backfills) are listed here and
+applied once per database, tracked in SQLite's `PRAGMA user_version`.
+Append new migrations to MIGRATIONS; never reorder or remove entries.
+"""
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+import crud
+import models
+
+logger = logging.getLogger(__name__)
+
+
+def _columns(db: Session, table: str) -> set:
+    return {row[1] for row in db.execute(text(f"PRAGMA table_info({table})"))}
+
+
+def _backfill_daily_rollups(db: Session) -> None:
+    # daily_rollups was added after the expenses table. Expenses still holding category names
+    # cannot be aggregated by the current code; _normalize_categories rebuilds the rollups then.
+    if "category" not in _columns(db, "expenses"):
+        crud.rebuild_daily_rollups(db)
+
+
+def _add_expense_user_date_index(db: Session) -> None:
+    # Composite index for per-user date-range queries; its user_id prefix replaces the old single-column index
+    db.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_expenses_user_id_transaction_date "
+        "ON expenses (user_id, transaction_date)"
+    ))
+    db.execute(text("DROP INDEX IF EXISTS ix_expenses_user_id"))
+    db.commit()
+
+
+_FTS_INSERT_TRIGGER = (
+    "CREATE TRIGGER IF NOT EXISTS expenses_fts_insert AFTER INSERT ON expenses BEGIN "
+    "INSERT INTO expenses_fts(rowid, item_name) VALUES (new.id, new.item_name); END"
+)
+_FTS_DELETE_TRIGGER = (
+    "CREATE TRIGGER IF NOT EXISTS expenses_fts_delete AFTER DELETE ON expenses BEGIN "
+    "INSERT INTO expenses_fts(expenses_fts, rowid, item_name) VALUES ('delete', old.id, old.item_name); END"
+)
+_FTS_UPDATE_TRIGGER = (
+    "CREATE TRIGGER IF NOT EXISTS expenses_fts_update AFTER UPDATE ON expenses BEGIN "
+    "INSERT INTO expenses_fts(expenses_fts, rowid, item_name) VALUES ('delete', old.id, old.item_name); "
+    "INSERT INTO expenses_fts(rowid, item_name) VALUES (new.id, new.item_name); END"
+)
+_FTS_TRIGGERS = [_FTS_INSERT_TRIGGER, _FTS_DELETE_TRIGGER, _FTS_UPDATE_TRIGGER]
+
+
+def _add_item_name_search_index(db: Session) -> None:
+    # FTS5 index over item_name for /expenses/search (see crud.search_expenses). External content:
+    # the text lives only in expenses, the index is kept in sync by the triggers below. The trigram
+    # tokenizer (SQLite >= 3.34) matches any substring of 3+ characters, so "Starbu" and "星巴克"
+    # match without word boundaries (there are none in Chinese), case-insensitively.
+    db.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS expenses_fts USING fts5("
+        "item_name, content='expenses', content_rowid='id', tokenize='trigram')"
+    ))
+    for trigger in _FTS_TRIGGERS:
+        db.execute(text(trigger))
+    # Index the rows that existed before the triggers
+    db.execute(text("INSERT INTO expenses_fts(expenses_fts) VALUES ('rebuild')"))
+    db.commit()
+
+
+def _normalize_categories(db: Session) -> None:
+    # Category names move to the categories lookup table; expenses and daily_rollups keep an
+    # integer category_id. Databases created by create_all already have the new layout.
+    converted = False
+    if "category" in _columns(db, "expenses"):
+        converted = True
+        db.execute(text("INSERT OR IGNORE INTO categories (name) SELECT DISTINCT category FROM expenses"))
+        if "category_id" not in _columns(db, "expenses"):
+            db.execute(text("ALTER TABLE expenses ADD COLUMN category_id INTEGER REFERENCES categories (id)"))
+        # Not an item_name change: keep the FTS update trigger from reindexing every row
+        db.execute(text("DROP TRIGGER IF EXISTS expenses_fts_update"))
+        db.execute(text(
+            "UPDATE expenses SET category_id = (SELECT id FROM categories WHERE name = expenses.category)"
+        ))
+        db.execute(text(_FTS_UPDATE_TRIGGER))
+        db.execute(text("ALTER TABLE expenses DROP COLUMN category"))
+    if "category" in _columns(db, "daily_rollups"):
+        converted = True
+        # Part of the primary key, so the table is recreated; the rebuild below refills it
+        db.execute(text("DROP TABLE daily_rollups"))
+        models.DailyRollup.__table__.create(bind=db.connection())
+    db.commit()
+    if converted:
+        crud.rebuild_daily_rollups(db)
+
+
+def _autoincrement_expense_ids(db: Session) -> None:
+    # archive.py moves old rows out of expenses. Without AUTOINCREMENT, SQLite hands out the
+    # highest ids again once their rows are gone, and ids would clash with archived rows.
+    # Tables created by create_all already have it; older ones are rebuilt with the same ids.
+    schema = db.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'expenses'")).scalar()
+    if "AUTOINCREMENT" in schema.upper():
+        return
+    # Renaming would rewrite the FTS triggers to follow the old table, and the indexes keep their
+    # names: drop both and create them again on the new table
+    for trigger in ("expenses_fts_insert", "expenses_fts_delete", "expenses_fts_update"):
+        db.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+    db.execute(text("ALTER TABLE expenses RENAME TO expenses_old"))
+    for row in db.execute(text("PRAGMA index_list('expenses_old')")).all():
+        if row[3] == "c":  # Created by CREATE INDEX, not by a constraint
+            db.execute(text(f"DROP INDEX {row[1]}"))
+    models.Expense.__table__.create(bind=db.connection())
+    columns = ", ".join(column.name for column in models.Expense.__table__.columns)
+    db.execute(text(f"INSERT INTO expenses ({columns}) SELECT {columns} FROM expenses_old"))
+    db.execute(text("DROP TABLE expenses_old"))
+    # Same rowids as before, so the FTS index itself stays valid
+    for trigger in _FTS_TRIGGERS:
+        db.execute(text(trigger))
+    db.commit()
+
+
+MIGRATIONS = [
+    _backfill_daily_rollups,
+    _add_expense_user_date_index,
+    _add_item_name_search_index,
+    _normalize_categories,
+    _autoincrement_expense_ids,
+]
+
+
+def run_migrations(db: Session) -> int:
+    """Applies pending migrations and returns how many ran."""
+    version = db.execute(text("PRAGMA user_version")).scalar()
+    pending = MIGRATIONS[version:]
+    for number, migration in enumerate(pending, start=version + 1):
+        logger.info(f"Applying migration {number}: {migration.__name__}")
+        migration(db)
+        db.execute(text(f"PRAGMA user_version = {number}"))
+        db.commit()
+    return len(pending)
@@ -1,14 +1,109 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime
+from sqlalchemy import Column, Integer, String, Float, DateTime, Date, Index, ForeignKey
+from sqlalchemy.orm import declarative_base
 from sqlalchemy.sql import func
 from database import Base
 
+# Mappings of the archive views (see archive.py). Kept apart from Base so create_all never
+# creates them as tables.
+ViewBase = declarative_base()
+
+class Category(Base):
+    """Category names, stored once; expenses and rollups reference them by id (see categories.py)."""
+    __tablename__ = "categories"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False, unique=True)
+
+
 class Expense(Base):
     __tablename__ = "expenses"
+    __table_args__ = (
+        # Serves per-user lookups as well as per-user date ranges (see migrations.py)
+        Index("ix_expenses_user_id_transaction_date", "user_id", "transaction_date"),
+        # Ids are never handed out twice, even once their rows have moved to an archive table
+        {"sqlite_autoincrement": True},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(String, index=True, nullable=False)
+    user_id = Column(String, nullable=False)
     amount = Column(Float, nullable=False)
-    category = Column(String, nullable=False)
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=False)
     item_name = Column(String, nullable=False)
     transaction_date = Column(DateTime, default=func.now())
     created_at = Column(DateTime, default=func.now())
+
+    # The category name the API returns (schemas.Expense). Not a column: crud.py fills it in
+    # from category_id via the categories cache.
+    category = None
+
+
+class DailyRollup(Base):
+    """Per-user, per-day, per-category totals, maintained by crud.py in the same transaction as the expense writes."""
+    __tablename__ = "daily_rollups"
+
+    user_id = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    category_id = Column(Integer, ForeignKey("categories.id"), primary_key=True)
+    total = Column(Float, nullable=False, default=0.0)
+    count = Column(Integer, nullable=False, default=0)
+
+    # Category name, filled in by crud.get_daily_rollups (see Expense.category)
+    category = None
+
+
+class MonthlySummary(Base):
+    """Per-user, per-month, per-category totals of archived expenses; replaces their daily_rollups rows (see archive.py)."""
+    __tablename__ = "monthly_summaries"
+
+    user_id = Column(String, primary_key=True)
+    month = Column(Date, primary_key=True)  # First day of the month
+    category_id = Column(Integer, ForeignKey("categories.id"), primary_key=True)
+    total = Column(Float, nullable=False, default=0.0)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class ArchivedMonth(Base):
+    """Months whose expenses live in an expenses_archive_YYYY_MM table (see archive.py)."""
+    __tablename__ = "archive_months"
+
+    month = Column(Date, primary_key=True)  # First day of the month
+    rows = Column(Integer, nullable=False, default=0)
+
+
+class _ExpenseViewColumns:
+    # The columns of expenses, as the archive views return them
+    id = Column(Integer, primary_key=True)
+    user_id = Column(String)
+    amount = Column(Float)
+    category_id = Column(Integer)
+    item_name = Column(String)
+    transaction_date = Column(DateTime)
+    created_at = Column(DateTime)
+
+    # See Expense.category
+    category = None
+
+
+class ArchivedExpense(_ExpenseViewColumns, ViewBase):
+    """View over every monthly archive table."""
+    __tablename__ = "expenses_archive"
+
+
+class ExpenseHistory(_ExpenseViewColumns, ViewBase):
+    """View over expenses and every monthly archive table: the full history."""
+    __tablename__ = "expenses_history"
+
+
+class Forecast(Base):
+    """
+    Month-end forecast per user, written by the nightly batch (manage.py forecast).
+    Rows are deleted by crud.py whenever the user's expenses change, so a present row is never stale.
+    """
+    __tablename__ = "forecasts"
+
+    user_id = Column(String, primary_key=True)
+    computed_on = Column(Date, nullable=False)
+    current_total = Column(Float, nullable=False)
+    daily_average = Column(Float, nullable=False)
+    predicted_total = Column(Float, nullable=False)
+    model = Column(String, nullable=False, default="flat")
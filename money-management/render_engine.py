@@ -0,0 +1,181 @@
+"""
+Chart rendering engine.
+
+Visual reports are rendered in a pool of persistent worker processes. Each worker
+applies the report style and fonts once at startup and then only builds figures
+through the object-oriented Figure/Axes API, so concurrent reports never share
+matplotlib state and throughput scales with the number of cores.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import analysis_service
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+
+# Number of worker processes. 0 renders in the calling process (no pool).
+REPORT_WORKERS = int(os.environ.get("REPORT_WORKERS", str(os.cpu_count() or 1)))
+# Maximum renders queued or running at once before new requests are rejected.
+REPORT_QUEUE_DEPTH = int(os.environ.get("REPORT_QUEUE_DEPTH", str(max(REPORT_WORKERS, 1) * 4)))
+# Seconds a caller waits for its render before giving up.
+REPORT_RENDER_TIMEOUT = float(os.environ.get("REPORT_RENDER_TIMEOUT", "30"))
+# "1": start and warm up the workers when the API starts instead of on the first report.
+REPORT_WARMUP = os.environ.get("REPORT_WARMUP", "0") == "1"
+
+
+class RendererBusy(Exception):
+    """Raised when the render queue is full. The API maps it to 503."""
+
+
+def _init_worker() -> None:
+    # Runs once per worker process: style and font lookup are paid here, not per report.
+    analysis_service.apply_report_style()
+
+
+def _render(data: dict):
+    # A memoryview cannot cross the process boundary; the pickled result is the only copy.
+    # Stage timings travel back with it, the worker has no metrics of its own.
+    with analysis_service.collect_stage_timings() as timings:
+        png = analysis_service.draw_visual_report(data).tobytes()
+    return png, timings
+
+
+def _render_to_file(data: dict, path: str):
+    with analysis_service.collect_stage_timings() as timings:
+        analysis_service.save_visual_report(data, path)
+    return None, timings
+
+
+def _render_local(data: dict, path: str = None):
+    with analysis_service.collect_stage_timings() as timings:
+        result = analysis_service.render_visual_report(data, path=path)
+    return result, timings
+
+
+def _recorded(outcome):
+    result, timings = outcome
+    metrics.observe_render_stages(timings)
+    return result
+
+
+class RenderEngine:
+    def __init__(self, workers: int = REPORT_WORKERS, max_pending: int = REPORT_QUEUE_DEPTH):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._pool = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: workers must not inherit the server's threads or matplotlib state
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return self._pool
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def submit(self, fn, *args):
+        """
+        Queues `fn(*args)` on a worker and returns its concurrent.futures.Future.
+
+        Raises:
+            RendererBusy: If `max_pending` renders are already queued or running.
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise RendererBusy(f"Render queue is full ({self.max_pending} pending)")
+            self._pending += 1
+            pool = self._get_pool()
+        try:
+            future = pool.submit(fn, *args)
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _run(self, fn, *args, timeout: float):
+        try:
+            return self.submit(fn, *args).result(timeout=timeout)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed): drop the pool so the next call starts a fresh one
+            logger.error("Render worker crashed, restarting pool")
+            self.shutdown(wait=False)
+            raise RendererBusy("Render worker crashed")
+
+    def render(self, data: dict, timeout: float = REPORT_RENDER_TIMEOUT):
+        """Renders report data to PNG bytes, blocking until a worker has finished it."""
+        if self.workers <= 0:
+            return _recorded(_render_local(data))
+        return _recorded(self._run(_render, data, timeout=timeout))
+
+    def render_to_file(self, data: dict, path: str, timeout: float = REPORT_RENDER_TIMEOUT) -> None:
+        """
+        Renders report data straight into `path`. The worker writes the file itself,
+        so the image never travels back through the pool.
+        """
+        path = os.path.abspath(path)
+        if self.workers <= 0:
+            _recorded(_render_local(data, path))
+            return
+        _recorded(self._run(_render_to_file, data, path, timeout=timeout))
+
+    async def _run_async(self, fn, *args, timeout: float):
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(self.submit(fn, *args)), timeout)
+        except BrokenProcessPool:
+            logger.error("Render worker crashed, restarting pool")
+            self.shutdown(wait=False)
+            raise RendererBusy("Render worker crashed")
+
+    async def render_async(self, data: dict, timeout: float = REPORT_RENDER_TIMEOUT):
+        """Like render(), but awaits the worker instead of blocking a thread."""
+        if self.workers <= 0:
+            return _recorded(await asyncio.to_thread(_render_local, data))
+        return _recorded(await self._run_async(_render, data, timeout=timeout))
+
+    async def render_to_file_async(self, data: dict, path: str, timeout: float = REPORT_RENDER_TIMEOUT) -> None:
+        """Like render_to_file(), but awaits the worker instead of blocking a thread."""
+        path = os.path.abspath(path)
+        if self.workers <= 0:
+            _recorded(await asyncio.to_thread(_render_local, data, path))
+            return
+        _recorded(await self._run_async(_render_to_file, data, path, timeout=timeout))
+
+    def warm_up(self) -> None:
+        """
+        Starts the workers and runs analysis_service.warm_up in them, so the first report
+        does not pay for process spawn, imports and the font cache. Blocks until done.
+        """
+        if self.workers <= 0:
+            analysis_service.warm_up()
+            return
+        with self._lock:
+            pool = self._get_pool()
+        # One task per worker: the pool spawns a new process for each task it cannot hand to an idle one
+        futures = [pool.submit(analysis_service.warm_up) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+
+engine = RenderEngine()
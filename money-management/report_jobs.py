@@ -0,0 +1,192 @@
+"""
+Background queue for visual report jobs.
+
+POST /analysis/visual_report/jobs only loads the (small) report data and queues it;
+a fixed number of job threads hand the renders to render_engine, and clients poll
+GET /analysis/visual_report/jobs/{job_id} for the result URL. This keeps HTTP
+requests short however long renders take under bursts.
+
+- Coalescing: while a job for the same user and the same data fingerprint is queued
+  or running, submitting again returns that job instead of queueing a duplicate.
+- Backpressure: at most REPORT_JOB_QUEUE_DEPTH jobs are queued or running; beyond
+  that submit() raises QueueFull, which the API maps to 503 with Retry-After.
+- Finished jobs are kept for REPORT_JOB_TTL seconds for polling.
+
+Jobs live in the memory of the process that accepted them. With several uvicorn workers a
+poll can reach another process: a finished job is still found there from its image file,
+whose name starts with the same fingerprint prefix as the job id (see finished_job). Queued,
+running and failed jobs are only known to their own process.
+"""
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import render_engine
+from cache import visual_report_cache
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+
+# Threads feeding renders to the render engine (each waits on one render at a time)
+REPORT_JOB_WORKERS = int(os.environ.get("REPORT_JOB_WORKERS", str(max(render_engine.REPORT_WORKERS, 1))))
+# Maximum jobs queued or running at once
+REPORT_JOB_QUEUE_DEPTH = int(os.environ.get("REPORT_JOB_QUEUE_DEPTH", "100"))
+# Seconds a finished job stays available for polling
+REPORT_JOB_TTL = float(os.environ.get("REPORT_JOB_TTL", "600"))
+# Attempts when the render pool is momentarily full
+REPORT_JOB_ATTEMPTS = 3
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+_STOP = object()
+
+
+class QueueFull(Exception):
+    """Raised when REPORT_JOB_QUEUE_DEPTH jobs are already pending. The API maps it to 503."""
+
+
+# Job ids: the first 16 characters of the data fingerprint (as in the image filename), then random
+JOB_ID = re.compile(r"[0-9a-f]{32}")
+
+
+class ReportJob:
+    def __init__(self, user_id: str, fingerprint: str, path: str = None, status: str = QUEUED, job_id: str = None):
+        self.id = job_id or fingerprint[:16] + uuid.uuid4().hex[:16]
+        self.user_id = user_id
+        self.fingerprint = fingerprint
+        self.path = path
+        self.status = status
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = time.time() if status in (DONE, FAILED) else None
+
+    @property
+    def filename(self):
+        return os.path.basename(self.path) if self.status == DONE else None
+
+
+def fingerprint_prefix(job_id: str):
+    """The fingerprint prefix a job id starts with, or None if `job_id` is malformed."""
+    return job_id[:16] if JOB_ID.fullmatch(job_id) else None
+
+
+def finished_job(user_id: str, job_id: str, path: str):
+    """
+    A done job rebuilt from its image at `path`, for a job accepted by another process.
+    None while the image does not exist (the job is pending there, failed or never existed).
+    """
+    if not os.path.exists(path):
+        return None
+    return ReportJob(user_id, fingerprint_prefix(job_id), path, status=DONE, job_id=job_id)
+
+
+class ReportJobQueue:
+    def __init__(self, workers: int = REPORT_JOB_WORKERS, max_depth: int = REPORT_JOB_QUEUE_DEPTH,
+                 ttl: float = REPORT_JOB_TTL):
+        self.workers = workers
+        self.max_depth = max_depth
+        self.ttl = ttl
+        self._queue = queue.Queue()
+        self._jobs = OrderedDict()  # job id -> ReportJob, oldest first
+        self._pending = {}  # (user_id, fingerprint) -> queued or running ReportJob
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> None:
+        # Called with self._lock held
+        if not self._threads:
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"report-job-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _prune(self) -> None:
+        # Called with self._lock held; jobs are in creation order, so stop at the first young one
+        cutoff = time.time() - self.ttl
+        for job_id, job in list(self._jobs.items()):
+            if job.created_at >= cutoff:
+                break
+            if job.finished_at is not None and job.finished_at < cutoff:
+                del self._jobs[job_id]
+
+    def submit(self, user_id: str, fingerprint: str, report_data: dict, path: str) -> ReportJob:
+        """
+        Queues a render of `report_data` into `path`, or returns the pending job for the same data.
+
+        Raises:
+            QueueFull: If `max_depth` jobs are already queued or running.
+        """
+        key = (user_id, fingerprint)
+        with self._lock:
+            self._prune()
+            job = self._pending.get(key)
+            if job is not None:
+                return job
+            if len(self._pending) >= self.max_depth:
+                raise QueueFull(f"Report job queue is full ({self.max_depth} pending)")
+            job = ReportJob(user_id, fingerprint, path)
+            self._jobs[job.id] = job
+            self._pending[key] = job
+            self._ensure_started()
+        self._queue.put((job, report_data))
+        return job
+
+    def add_finished(self, user_id: str, fingerprint: str, path: str) -> ReportJob:
+        """Records a job that needs no render (the image is already cached), so clients poll it like any other."""
+        job = ReportJob(user_id, fingerprint, path, status=DONE)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            self._execute(*item)
+
+    def _execute(self, job: ReportJob, report_data: dict) -> None:
+        job.status = RUNNING
+        try:
+            for attempt in range(1, REPORT_JOB_ATTEMPTS + 1):
+                try:
+                    render_engine.engine.render_to_file(report_data, job.path)
+                    break
+                except render_engine.RendererBusy:
+                    # Interactive requests share the render pool; wait for a slot instead of failing the job
+                    if attempt == REPORT_JOB_ATTEMPTS:
+                        raise
+                    time.sleep(attempt)
+            visual_report_cache.set((job.user_id, job.fingerprint), os.path.basename(job.path))
+            job.status = DONE
+        except Exception as e:
+            logger.error(f"Report job {job.id} failed: {e}")
+            job.error = str(e) or type(e).__name__
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._pending.pop((job.user_id, job.fingerprint), None)
+
+    def stop(self) -> None:
+        """Finishes the jobs already queued, then stops the job threads."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(_STOP)
+        for thread in threads:
+            thread.join()
+
+
+jobs = ReportJobQueue()
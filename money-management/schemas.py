@@ -1,6 +1,12 @@
 from pydantic import BaseModel, Field, field_validator
 from datetime import datetime, date
 from typing import Optional, Union
+import json
+
+try:
+    import orjson
+except ImportError:  # Optional: only speeds up expense_page_json
+    orjson = None
 
 print("LOADING SCHEMAS.PY - FINAL VERSION")
 
@@ -43,3 +49,23 @@ class Expense(ExpenseBase):
 
 class ExpenseResponse(BaseModel):
     expenses: list[Expense]
+    # Pass back as `cursor` to get the next page; None when there are no more results
+    next_cursor: Optional[str] = None
+
+def expense_page_json(expenses: list, next_cursor: Optional[str]) -> bytes:
+    """
+    Encodes an ExpenseResponse body straight from crud.get_expense_dicts_page rows, skipping the
+    per-row validation of Expense. Produces the same JSON as the validated path.
+    """
+    payload = {"expenses": expenses, "next_cursor": next_cursor}
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=datetime.isoformat).encode("utf-8")
+
+class ExpenseSearchResponse(BaseModel):
+    query: str
+    # Totals over every match (not just the returned page)
+    count: int
+    total_amount: float
+    # The newest matches, at most `limit`
+    expenses: list[Expense]
@@ -0,0 +1,149 @@
+"""
+Copies data into a sharded layout (python manage.py shard).
+
+Every per-user table (expenses, daily_rollups, forecasts) is read from one or more
+source databases and each row is written to the shard database.shard_for picks for its
+user_id. The sources can be the single sql_app.db, or the shard files of an earlier
+layout when rebalancing to a different shard count. Rollups and forecasts are copied
+as they are, so nothing has to be rebuilt. Category ids differ between databases, so
+every shard gets the same, complete categories table and category_id values are
+translated on the way.
+
+Sources are only read. The target directory must not hold data yet. Stop the service
+(or at least writes) while copying, then point SQLITE_SHARDS / SQLITE_SHARD_DIR at the
+new layout and restart.
+
+Expense ids are kept when copying from a single database. When several shards are
+merged into a new layout their ids overlap, so expenses get new ids instead.
+
+Archived months (archive.py) are copied back into the expenses table of the new shards,
+whose daily rollups are then rebuilt; run `python manage.py archive` on the new layout
+to archive them again.
+"""
+import os
+
+from sqlalchemy import func, inspect, insert, select
+from sqlalchemy.orm import Session
+
+import crud
+import database
+import migrations
+import models
+
+TABLES = [models.Expense.__table__, models.DailyRollup.__table__, models.Forecast.__table__]
+COPY_BATCH_ROWS = 10000
+
+
+def _count(engine, table) -> int:
+    with engine.connect() as conn:
+        if not inspect(conn).has_table(table.name):
+            return 0
+        return conn.scalar(select(func.count()).select_from(table))
+
+
+def _source_categories(source) -> dict:
+    """Returns {category_id: name} of a source database."""
+    with source.connect() as conn:
+        expense_columns = {column["name"] for column in inspect(conn).get_columns("expenses")}
+        if "category_id" not in expense_columns:
+            raise ValueError(f"{source.url.database} predates the categories table; "
+                             "run `python manage.py migrate` against it first")
+        return dict(conn.execute(select(models.Category.id, models.Category.name)).all())
+
+
+def _has_archive(source) -> bool:
+    return _count(source, models.ArchivedMonth.__table__) > 0
+
+
+def _copy_table(source, targets: list, table, keep_ids: bool, batch_rows: int, category_ids: dict,
+                target_table=None) -> int:
+    # target_table: where the rows go, when not into the same table (archived expenses)
+    target_table = table if target_table is None else target_table
+    columns = [column for column in table.columns if keep_ids or column.name != "id"]
+    translate = "category_id" in table.c
+    copied = 0
+    with source.connect() as conn:
+        if target_table is table and not inspect(conn).has_table(table.name):
+            # Databases from older versions may not have every table yet
+            return 0
+        result = conn.execution_options(yield_per=batch_rows).execute(select(*columns))
+        for rows in result.partitions():
+            buckets = [[] for _ in targets]
+            for row in rows:
+                values = row._asdict()
+                if translate:
+                    values["category_id"] = category_ids[values["category_id"]]
+                buckets[database.shard_for(values["user_id"], len(targets))].append(values)
+            for target, bucket in zip(targets, buckets):
+                if bucket:
+                    with target.begin() as target_conn:
+                        target_conn.execute(insert(target_table), bucket)
+            copied += len(rows)
+    return copied
+
+
+def copy_into_shards(sources: list, shards: int, directory: str, batch_rows: int = COPY_BATCH_ROWS) -> dict:
+    """
+    Copies the per-user tables of the `sources` database files into `shards` files in `directory`.
+
+    Returns:
+        dict: Table name -> rows copied (categories: names written to every shard).
+
+    Raises:
+        ValueError: If a target shard already holds data or is one of the sources, or if the
+                    row counts of the new shards do not add up to the sources' afterwards.
+    """
+    if shards < 1:
+        raise ValueError("The shard count must be at least 1")
+    os.makedirs(directory, exist_ok=True)
+    target_paths = [database.shard_path(i, directory) for i in range(shards)]
+    overlap = {os.path.abspath(p) for p in sources} & {os.path.abspath(p) for p in target_paths}
+    if overlap:
+        raise ValueError(f"{sorted(overlap)[0]} is both a source and a target; pick another directory")
+
+    source_engines = [database.make_engine(path) for path in sources]
+    targets = [database.make_engine(path) for path in target_paths]
+    try:
+        for target in targets:
+            models.Base.metadata.create_all(bind=target)
+            with Session(target) as db:
+                migrations.run_migrations(db)
+            if any(_count(target, table) for table in TABLES + [models.Category.__table__]):
+                raise ValueError(f"{target.url.database} already holds data; use an empty directory")
+
+        # One id per category name across all sources, the same in every shard
+        source_categories = [_source_categories(source) for source in source_engines]
+        names = list(dict.fromkeys(name for found in source_categories for name in found.values()))
+        new_ids = {name: category_id for category_id, name in enumerate(names, start=1)}
+        if names:
+            for target in targets:
+                with target.begin() as conn:
+                    conn.execute(insert(models.Category), [{"id": new_ids[name], "name": name} for name in names])
+        translations = [{old_id: new_ids[name] for old_id, name in found.items()} for found in source_categories]
+
+        keep_ids = len(sources) == 1
+        copied = {"categories": len(names)}
+        for table in TABLES:
+            copied[table.name] = sum(
+                _copy_table(source, targets, table, keep_ids, batch_rows, category_ids)
+                for source, category_ids in zip(source_engines, translations)
+            )
+            if table is models.Expense.__table__:
+                copied[table.name] += sum(
+                    _copy_table(source, targets, models.ArchivedExpense.__table__, keep_ids, batch_rows, category_ids,
+                                target_table=table)
+                    for source, category_ids in zip(source_engines, translations) if _has_archive(source)
+                )
+            written = sum(_count(target, table) for target in targets)
+            if written != copied[table.name]:
+                raise ValueError(f"{table.name}: copied {copied[table.name]} rows but the shards hold {written}")
+
+        if any(_has_archive(source) for source in source_engines):
+            # The archived months had monthly summaries instead of daily rollups
+            for target in targets:
+                with Session(target) as db:
+                    crud.rebuild_daily_rollups(db)
+        return copied
+    finally:
+        for engine in source_engines + targets:
+            engine.dispose()
@@ -0,0 +1,228 @@
+"""
+Columnar snapshots of the expenses table for long-range analysis.
+
+`export_snapshots` writes each user's full history to an Arrow IPC file
+(SNAPSHOT_DIR/expenses/<user>.arrow), ordered by transaction date. The files are
+uncompressed so `load_expenses` can memory-map them: only the columns (and date
+range) a report asks for are touched, with no ORM objects, dicts or row-by-row
+conversion in between. analysis_service.build_report_data and batch_forecast
+accept the resulting pyarrow Tables directly.
+
+Snapshots are as fresh as the last export (see `python manage.py snapshot`); the
+live endpoints keep reading the database. pyarrow is an optional dependency, only
+needed here.
+"""
+import os
+from datetime import datetime
+from urllib.parse import quote, unquote
+
+from sqlalchemy.orm import Session
+
+import archive
+
+# --- Configuration ---
+
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", "snapshots")
+# Rows fetched from SQLite and written per record batch
+SNAPSHOT_BATCH_ROWS = int(os.environ.get("SNAPSHOT_BATCH_ROWS", "50000"))
+
+COLUMNS = ["id", "transaction_date", "amount", "category", "item_name"]
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+    except ImportError as e:
+        raise RuntimeError("Snapshots need pyarrow: pip install pyarrow") from e
+    return pyarrow
+
+
+def _schema(pa):
+    return pa.schema([
+        ("id", pa.int64()),
+        ("transaction_date", pa.timestamp("us")),
+        ("amount", pa.float64()),
+        ("category", pa.string()),
+        ("item_name", pa.string()),
+    ])
+
+
+def snapshot_path(user_id: str, directory: str = SNAPSHOT_DIR) -> str:
+    # user_id is free text; quote it so it is always a single, safe file name
+    return os.path.join(directory, "expenses", quote(user_id, safe="") + ".arrow")
+
+
+def _to_batch(pa, schema, rows: list):
+    ids, dates, amounts, categories, items = zip(*rows)
+    return pa.record_batch([
+        pa.array(ids, pa.int64()),
+        # SQLite stores DateTime as ISO text; Arrow parses the whole column at once
+        pa.array(dates, pa.string()).cast(pa.timestamp("us")),
+        pa.array(amounts, pa.float64()),
+        pa.array(categories, pa.string()),
+        pa.array(items, pa.string()),
+    ], schema=schema)
+
+
+class _UserFile:
+    """Arrow IPC file being written for one user; becomes visible on close (atomic rename)."""
+
+    def __init__(self, pa, schema, path: str):
+        self.path = path
+        self.tmp_path = f"{path}.{os.getpid()}.tmp"
+        self.rows = 0
+        self._writer = pa.ipc.new_file(self.tmp_path, schema)
+
+    def write(self, batch) -> None:
+        self._writer.write_batch(batch)
+        self.rows += batch.num_rows
+
+    def close(self) -> None:
+        self._writer.close()
+        os.replace(self.tmp_path, self.path)
+
+
+def export_snapshots(db: Session, user_id: str = None, directory: str = SNAPSHOT_DIR, prune: bool = True) -> dict:
+    """
+    Exports the expenses of all users (or one user) to per-user Arrow files in one ordered scan.
+
+    A full export also removes the files of users that no longer have expenses, unless
+    `prune` is False (exporting shard by shard: call prune_snapshots once at the end).
+
+    Returns:
+        dict: user_id -> number of rows written.
+    """
+    pa = _pyarrow()
+    schema = _schema(pa).with_metadata({"exported_at": datetime.now().isoformat()})
+    os.makedirs(os.path.join(directory, "expenses"), exist_ok=True)
+
+    # Category names come from the (small) categories table, one primary-key lookup per row.
+    # The full history includes the archived months (see archive.py).
+    source = "expenses_history" if archive.archived_before(db) is not None else "expenses"
+    sql = ("SELECT e.user_id, e.id, e.transaction_date, e.amount, c.name, e.item_name "
+           f"FROM {source} e JOIN categories c ON c.id = e.category_id")
+    params = ()
+    if user_id:
+        sql += " WHERE e.user_id = ?"
+        params = (user_id,)
+    # (user_id, transaction_date) is the composite index: the scan comes back grouped and ordered
+    sql += " ORDER BY e.user_id, e.transaction_date, e.id"
+
+    written = {}
+    current = None
+    current_user = None
+    pending = []
+    cursor = db.connection().exec_driver_sql(sql, params)
+
+    def flush():
+        if pending:
+            current.write(_to_batch(pa, schema, pending))
+            pending.clear()
+
+    while True:
+        chunk = cursor.fetchmany(SNAPSHOT_BATCH_ROWS)
+        if not chunk:
+            break
+        for row in chunk:
+            if row[0] != current_user:
+                if current is not None:
+                    flush()
+                    current.close()
+                    written[current_user] = current.rows
+                current_user = row[0]
+                current = _UserFile(pa, schema, snapshot_path(current_user, directory))
+            pending.append(row[1:])
+        flush()
+    if current is not None:
+        current.close()
+        written[current_user] = current.rows
+
+    if user_id and user_id not in written and os.path.exists(snapshot_path(user_id, directory)):
+        os.remove(snapshot_path(user_id, directory))
+    if not user_id and prune:
+        prune_snapshots(written, directory)
+    return written
+
+
+def prune_snapshots(users, directory: str = SNAPSHOT_DIR) -> None:
+    """Removes the snapshot files of every user not in `users`."""
+    for name in os.listdir(os.path.join(directory, "expenses")):
+        if name.endswith(".arrow") and unquote(name[:-len(".arrow")]) not in users:
+            os.remove(os.path.join(directory, "expenses", name))
+
+
+def load_expenses(user_id: str, columns: list = None, start: datetime = None, end: datetime = None,
+                  directory: str = SNAPSHOT_DIR):
+    """
+    Memory-maps a user's snapshot and returns it as a pyarrow Table.
+
+    Args:
+        columns (list): Subset of COLUMNS to return; the others are never read.
+        start, end (datetime): Optional half-open [start, end) range on transaction_date.
+
+    Returns:
+        pyarrow.Table, or None if the user has no snapshot.
+    """
+    pa = _pyarrow()
+    import pyarrow.compute as pc
+
+    path = snapshot_path(user_id, directory)
+    if not os.path.exists(path):
+        return None
+    # The table's buffers point into the mapping, which stays alive as long as they do
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+
+    filtered = start is not None or end is not None
+    if columns:
+        # Narrow first, so the filter below only copies the columns that are returned
+        table = table.select(list(columns) + (["transaction_date"] if filtered and "transaction_date" not in columns else []))
+    if filtered:
+        dates = table["transaction_date"]
+        mask = None
+        if start is not None:
+            mask = pc.greater_equal(dates, pa.scalar(start, pa.timestamp("us")))
+        if end is not None:
+            upper = pc.less(dates, pa.scalar(end, pa.timestamp("us")))
+            mask = upper if mask is None else pc.and_(mask, upper)
+        table = table.filter(mask)
+    return table.select(columns) if columns else table
+
+
+def load_daily_totals(start: datetime = None, end: datetime = None, directory: str = SNAPSHOT_DIR):
+    """
+    Per-user, per-day sums over every snapshot, as a pyarrow Table with the user_id, date,
+    amount columns analysis_service.batch_forecast takes. Aggregated in Arrow, file by file.
+    """
+    pa = _pyarrow()
+    import pyarrow.compute as pc
+
+    folder = os.path.join(directory, "expenses")
+    tables = []
+    for name in sorted(os.listdir(folder)) if os.path.isdir(folder) else []:
+        if not name.endswith(".arrow"):
+            continue
+        user_id = unquote(name[:-len(".arrow")])
+        table = load_expenses(user_id, columns=["transaction_date", "amount"], start=start, end=end, directory=directory)
+        if table is None or table.num_rows == 0:
+            continue
+        days = pc.floor_temporal(table["transaction_date"], unit="day")
+        daily = pa.table({"date": days, "amount": table["amount"]}).group_by("date").aggregate([("amount", "sum")])
+        tables.append(pa.table({
+            "user_id": pa.array([user_id] * daily.num_rows, pa.string()),
+            "date": daily["date"],
+            "amount": daily["amount_sum"],
+        }))
+    if not tables:
+        return pa.table({"user_id": pa.array([], pa.string()), "date": pa.array([], pa.timestamp("us")),
+                         "amount": pa.array([], pa.float64())})
+    return pa.concat_tables(tables)
+
+
+def report_data(user_id: str, start: datetime = None, end: datetime = None, directory: str = SNAPSHOT_DIR) -> dict:
+    """Visual report data over any date range of the snapshot (see analysis_service.build_report_data)."""
+    import analysis_service
+
+    table = load_expenses(user_id, columns=["transaction_date", "amount", "category"],
+                          start=start, end=end, directory=directory)
+    return analysis_service.build_report_data(table) if table is not None else {}
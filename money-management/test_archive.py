@@ -0,0 +1,164 @@
+from datetime import date, datetime
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session, sessionmaker
+
+import models, crud, schemas, migrations, archive, database, sharding
+
+TODAY = date(2026, 6, 15)  # Archiving 3 months keeps March 2026 onwards
+
+EXPENSES = [
+    ("u1", 10.0, "餐饮", "Starbucks Coffee", datetime(2025, 12, 1, 8)),
+    ("u1", 5.0, "交通", "Bus", datetime(2025, 12, 1, 18)),
+    ("u1", 7.0, "餐饮", "Starbucks Latte", datetime(2026, 1, 20, 12)),
+    ("u1", 4.0, "学习", "Pen", datetime(2026, 2, 28, 23)),
+    ("u1", 9.0, "餐饮", "Starbucks Coffee", datetime(2026, 3, 1, 9)),
+    ("u1", 2.0, "交通", "Metro", datetime(2026, 5, 30, 8)),
+    ("u2", 3.0, "学习", "Book", datetime(2026, 1, 5, 12)),
+]
+
+
+def _seed(db):
+    migrations.run_migrations(db)
+    crud.bulk_create_expenses(db, [
+        schemas.ExpenseCreate(user_id=user_id, amount=amount, category=category, item_name=item, transaction_date=when)
+        for user_id, amount, category, item, when in EXPENSES
+    ])
+
+
+def _reads(db) -> dict:
+    # Everything the query and report paths return for u1, to compare before and after archiving
+    def rows(expenses):
+        return [(e.id, e.amount, e.category, e.item_name, e.transaction_date) for e in expenses]
+
+    pages, cursor = [], None
+    while True:
+        page, cursor = crud.get_expenses_page(db, "u1", limit=2, cursor=cursor and crud.decode_cursor(cursor))
+        pages.append(rows(page))
+        if cursor is None:
+            break
+    return {
+        "weekly": sorted((r["category"], r["total"]) for r in crud.get_weekly_report(db, "u1")),
+        "on_day": rows(crud.get_expenses(db, "u1", target_date=datetime(2026, 1, 20))),
+        "newest": rows(crud.get_expenses(db, "u1", limit=10)),
+        "pages": pages,
+        "rollups": [(r.day, r.category, r.total, r.count) for r in crud.get_daily_rollups(db, "u1")],
+        "search": crud.search_expenses(db, "u1", "starbucks")[:2],
+    }
+
+
+def test_archived_history_reads_the_same(db):
+    _seed(db)
+    before = _reads(db)
+
+    moved = archive.archive_expenses(db, months=3, today=TODAY)
+    assert moved == {"expenses_archive_2025_12": 2, "expenses_archive_2026_01": 2, "expenses_archive_2026_02": 1}
+    assert db.execute(text("SELECT count(*) FROM expenses")).scalar() == 2
+    assert db.execute(text("SELECT min(day) FROM daily_rollups")).scalar() == "2026-03-01"
+    assert db.execute(text("SELECT sum(total) FROM monthly_summaries WHERE user_id = 'u1'")).scalar() == 26.0
+
+    assert _reads(db) == before
+    # Running again finds nothing left to move
+    assert archive.archive_expenses(db, months=3, today=TODAY) == {}
+
+
+def test_recent_ranges_never_touch_the_archive(db):
+    _seed(db)
+    archive.archive_expenses(db, months=3, today=TODAY)
+    statements = []
+    event.listen(db.get_bind(), "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+
+    crud.get_expenses(db, "u1", target_date=datetime(2026, 5, 30))
+    crud.get_expenses(db, "u1", limit=1)
+    crud.get_daily_rollups(db, "u1", start_day=date(2026, 5, 1))
+    assert not any("expenses_archive" in s or "expenses_history" in s for s in statements)
+
+
+def test_deletes_and_new_rows_after_archiving(db):
+    _seed(db)
+    archive.archive_expenses(db, months=3, today=TODAY)
+    archived_ids = {row[0] for row in db.execute(text("SELECT id FROM expenses_archive"))}
+
+    # New rows never reuse an archived id, even once the newest rows are archived too
+    added = crud.create_user_expense(db, schemas.ExpenseCreate(
+        user_id="u1", amount=1.0, category="餐饮", item_name="Old receipt", transaction_date=datetime(2025, 12, 2)))
+    assert added.id not in archived_ids
+    # An old-dated row added later is read together with its archived month
+    assert [e.item_name for e in crud.get_expenses(db, "u1", target_date=datetime(2025, 12, 2))] == ["Old receipt"]
+    assert dict((r["category"], r["total"]) for r in crud.get_weekly_report(db, "u1"))["餐饮"] == 27.0
+
+    pen = next(e for e in crud.get_expenses(db, "u1", target_date=datetime(2026, 2, 28)))
+    assert crud.delete_expenses(db, "u1", expense_id=pen.id) == 1
+    assert crud.delete_expenses(db, "u1", target_date=datetime(2025, 12, 1)) == 2
+    weekly = dict((r["category"], r["total"]) for r in crud.get_weekly_report(db, "u1"))
+    assert weekly == {"餐饮": 17.0, "交通": 2.0}
+    assert db.execute(text("SELECT count(*) FROM monthly_summaries WHERE month = '2025-12-01'")).scalar() == 0
+
+
+def test_reading_merged_days_does_not_write_them_back(db):
+    _seed(db)
+    archive.archive_expenses(db, months=3, today=TODAY)
+    crud.create_user_expense(db, schemas.ExpenseCreate(
+        user_id="u1", amount=5.0, category="交通", item_name="Taxi", transaction_date=datetime(2025, 12, 1, 20)))
+
+    merged = [(r.day, r.category, r.total, r.count) for r in crud.get_daily_rollups(db, "u1", end_day=date(2025, 12, 1))]
+    assert merged == [(date(2025, 12, 1), "餐饮", 10.0, 1), (date(2025, 12, 1), "交通", 10.0, 2)]
+    # Any later commit on the same session must leave the stored rollups alone
+    crud.create_user_expense(db, schemas.ExpenseCreate(user_id="u1", amount=1.0, category="学习", item_name="Pen"))
+    assert db.execute(text("SELECT total FROM daily_rollups WHERE day = '2025-12-01'")).scalars().all() == [5.0]
+    assert dict((r["category"], r["total"]) for r in crud.get_weekly_report(db, "u1"))["交通"] == 12.0
+
+
+def test_migration_makes_expense_ids_autoincrement(memory_engine):
+    models.Base.metadata.create_all(bind=memory_engine)
+    with memory_engine.begin() as conn:
+        # Layout before the migration: a plain INTEGER PRIMARY KEY
+        conn.exec_driver_sql("DROP TABLE expenses")
+        conn.exec_driver_sql(
+            "CREATE TABLE expenses (id INTEGER PRIMARY KEY, user_id VARCHAR NOT NULL, amount FLOAT NOT NULL, "
+            "category_id INTEGER NOT NULL REFERENCES categories (id), item_name VARCHAR NOT NULL, "
+            "transaction_date DATETIME, created_at DATETIME)"
+        )
+        conn.exec_driver_sql("CREATE INDEX ix_expenses_user_id_transaction_date ON expenses (user_id, transaction_date)")
+        conn.exec_driver_sql("INSERT INTO categories (id, name) VALUES (1, '餐饮')")
+        conn.exec_driver_sql(
+            "INSERT INTO expenses (id, user_id, amount, category_id, item_name, transaction_date) VALUES "
+            "(3, 'u1', 1.0, 1, 'Starbucks', '2025-12-01 08:00:00.000000'), (8, 'u1', 2.0, 1, 'Tea', '2025-12-02 08:00:00.000000')"
+        )
+
+    with sessionmaker(bind=memory_engine)() as db:
+        migrations.run_migrations(db)
+        schema = db.execute(text("SELECT sql FROM sqlite_master WHERE name = 'expenses'")).scalar()
+        assert "AUTOINCREMENT" in schema
+        assert db.execute(text("SELECT id FROM expenses ORDER BY id")).scalars().all() == [3, 8]
+        assert crud.search_expenses(db, "u1", "starbucks")[:2] == (1, 1.0)
+
+        crud.delete_expenses(db, "u1", expense_id=8)
+        added = crud.create_user_expense(db, schemas.ExpenseCreate(user_id="u1", amount=1.0, category="餐饮", item_name="x"))
+        assert added.id == 9
+        assert crud.search_expenses(db, "u1", "Tea")[:2] == (0, 0.0)
+
+
+def test_sharding_copies_archived_months_back(tmp_path):
+    source = tmp_path / "sql_app.db"
+    engine = database.make_engine(str(source))
+    models.Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        migrations.run_migrations(db)
+        crud.bulk_create_expenses(db, [
+            schemas.ExpenseCreate(user_id=user_id, amount=amount, category=category, item_name=item, transaction_date=when)
+            for user_id, amount, category, item, when in EXPENSES
+        ])
+        archive.archive_expenses(db, months=3, today=TODAY)
+    engine.dispose()
+
+    copied = sharding.copy_into_shards([str(source)], 2, str(tmp_path / "shards"))
+    assert copied["expenses"] == len(EXPENSES)
+    total = 0.0
+    for index in range(2):
+        shard = database.make_engine(database.shard_path(index, str(tmp_path / "shards")))
+        with Session(shard) as db:
+            total += sum(r["total"] for user_id in ("u1", "u2") for r in crud.get_weekly_report(db, user_id))
+        shard.dispose()
+    assert total == sum(amount for _, amount, _, _, _ in EXPENSES)
@@ -0,0 +1,108 @@
+import asyncio
+import json
+
+from sqlalchemy import select
+
+import models, crud, bulk_import
+
+
+def _post(api, body, content_type):
+    response = api.post("/expenses/bulk_add", content=body.encode("utf-8"), headers={"Content-Type": content_type})
+    assert response.status_code == 200
+    return response.json()
+
+
+def _items(api_sessions):
+    with api_sessions() as db:
+        return db.scalars(select(models.Expense.item_name).order_by(models.Expense.id)).all()
+
+
+def test_json_array(api, api_sessions):
+    rows = [
+        {"user_id": "u1", "amount": 12.5, "category": "餐饮", "item_name": "Noodles"},
+        {"user_id": "u1", "category": "餐饮", "item_name": "No amount"},
+        {"user_id": "u2", "amount": "3", "category": "交通", "item_name": "Bus", "transaction_date": "2026-03-02"},
+    ]
+    result = _post(api, json.dumps(rows), "application/json")
+    assert (result["inserted"], result["failed"]) == (2, 1)
+    assert result["errors"][0]["row"] == 2
+    assert result["errors"][0]["error"][0]["loc"] == ["amount"]
+    assert _items(api_sessions) == ["Noodles", "Bus"]
+
+    assert _post(api, '{"user_id": "u1"}', "application/json")["errors"] == [
+        {"row": 1, "error": "Expected a JSON array of expenses"}
+    ]
+    assert _post(api, "[{", "application/json")["failed"] == 1
+
+
+def test_ndjson(api, api_sessions):
+    body = "\n".join([
+        '{"user_id": "u1", "amount": 12.5, "category": "餐饮", "item_name": "Noodles"}',
+        "",
+        '{"user_id": "u1", "amount": "oops", "category": "餐饮", "item_name": "Bad amount"}',
+        "{not json",
+        '{"user_id": "u1", "amount": 1, "category": "餐饮", "item_name": "Last, no newline"}',
+    ])
+    result = _post(api, body, "application/x-ndjson; charset=utf-8")
+    assert (result["inserted"], result["failed"]) == (2, 2)
+    # Blank lines are not counted as rows
+    assert [error["row"] for error in result["errors"]] == [2, 3]
+    assert result["errors"][1]["error"].startswith("Invalid JSON")
+    assert _items(api_sessions) == ["Noodles", "Last, no newline"]
+
+
+def test_csv(api, api_sessions):
+    body = "\r\n".join([
+        "user_id, amount, category, item_name, transaction_date",
+        'u1,12.5,餐饮,"Noodles, large",2026-03-02T12:00:00',
+        'u1,8,餐饮,"Receipt line one\r\nline two ""quoted""",',
+        "u1,9,餐饮",
+        "u1,abc,餐饮,Bad amount,",
+        "u1,1,交通,Bus,",
+    ])
+    result = _post(api, body, "text/csv")
+    assert (result["inserted"], result["failed"]) == (3, 2)
+    assert [error["row"] for error in result["errors"]] == [3, 4]
+    assert result["errors"][0]["error"] == "Expected 5 columns, got 3"
+    assert _items(api_sessions) == ["Noodles, large", 'Receipt line one\nline two "quoted"', "Bus"]
+
+    result = _post(api, 'user_id,amount,category,item_name\nu1,1,餐饮,"never closed', "text/csv")
+    assert result["errors"] == [{"row": 1, "error": "Unterminated quoted field"}]
+
+
+def test_csv_quoted_newline_split_across_chunks():
+    async def chunks():
+        for chunk in (b"user_id,amount,category,item_name\nu1,1,\xe9\xa4", b'\x90\xe9\xa5\xae,"two\n', b'lines"\n'):
+            yield chunk
+
+    async def parse():
+        return [item async for item in bulk_import.iter_csv(chunks())]
+
+    assert asyncio.run(parse()) == [
+        (1, {"user_id": "u1", "amount": "1", "category": "餐饮", "item_name": "two\nlines"}, None)
+    ]
+
+
+def test_unsupported_content_type(api):
+    response = api.post("/expenses/bulk_add", content=b"<xml/>", headers={"Content-Type": "application/xml"})
+    assert response.status_code == 415
+
+
+def test_failed_chunk_is_retried_row_by_row(api, api_sessions, monkeypatch):
+    import main
+    original = crud.bulk_create_expenses
+
+    def fail_on_boom(db, expenses):
+        if any(expense.item_name == "boom" for expense in expenses):
+            raise RuntimeError("constraint failed")
+        return original(db, expenses)
+
+    monkeypatch.setattr(crud, "bulk_create_expenses", fail_on_boom)
+    monkeypatch.setattr(main, "BULK_CHUNK_SIZE", 2)
+    rows = [{"user_id": "u1", "amount": 1.0, "category": "餐饮", "item_name": name}
+            for name in ("a", "b", "c", "boom", "e")]
+    result = _post(api, json.dumps(rows), "application/json")
+
+    assert (result["inserted"], result["failed"]) == (4, 1)
+    assert result["errors"] == [{"row": 4, "error": "constraint failed"}]
+    assert _items(api_sessions) == ["a", "b", "c", "e"]
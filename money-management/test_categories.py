@@ -0,0 +1,36 @@
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+import models, crud, migrations, schemas
+
+
+def test_migration_moves_category_names_to_lookup_table(memory_engine):
+    with memory_engine.begin() as conn:
+        # Pre-categories layout: names repeated on every expense and rollup row
+        conn.exec_driver_sql(
+            "CREATE TABLE expenses (id INTEGER PRIMARY KEY, user_id VARCHAR NOT NULL, amount FLOAT NOT NULL, "
+            "category VARCHAR NOT NULL, item_name VARCHAR NOT NULL, transaction_date DATETIME, created_at DATETIME)"
+        )
+        conn.exec_driver_sql(
+            "CREATE TABLE daily_rollups (user_id VARCHAR, day DATE, category VARCHAR, total FLOAT NOT NULL, "
+            "count INTEGER NOT NULL, PRIMARY KEY (user_id, day, category))"
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO expenses (user_id, amount, category, item_name, transaction_date) VALUES "
+            "('u1', 10.0, '餐饮', 'Lunch', '2025-12-01 12:00:00'), ('u1', 5.0, '交通', 'Bus', '2025-12-01 18:00:00'), "
+            "('u1', 7.0, '餐饮', 'Dinner', '2025-12-02 19:00:00')"
+        )
+    models.Base.metadata.create_all(bind=memory_engine)
+
+    with sessionmaker(bind=memory_engine)() as db:
+        migrations.run_migrations(db)
+        columns = {row[1] for row in db.execute(text("PRAGMA table_info('expenses')"))}
+        assert "category" not in columns and "category_id" in columns
+        assert db.execute(text("SELECT count(*) FROM categories")).scalar() == 2
+
+        assert sorted((r["category"], r["total"]) for r in crud.get_weekly_report(db, "u1")) == [("交通", 5.0), ("餐饮", 17.0)]
+        assert [e.item_name for e in crud.get_expenses(db, "u1", category="餐饮", limit=10)] == ["Dinner", "Lunch"]
+        # New names get an id; the API still sees strings
+        crud.create_user_expense(db, schemas.ExpenseCreate(user_id="u1", amount=3.0, category="学习", item_name="Pen"))
+        assert crud.get_expenses(db, "u1", limit=1)[0].category == "学习"
+        assert {r.category for r in crud.get_daily_rollups(db, "u1")} == {"餐饮", "交通", "学习"}
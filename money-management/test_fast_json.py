@@ -0,0 +1,22 @@
+from datetime import datetime
+
+import crud, schemas
+
+
+def test_fast_expense_page_matches_validated_page(db, monkeypatch):
+    crud.bulk_create_expenses(db, [
+        schemas.ExpenseCreate(user_id="u1", amount=1.5 + day, category=["餐饮", "交通"][day % 2],
+                              item_name=f"Item {day}", transaction_date=datetime(2025, 12, day + 1))
+        for day in range(5)
+    ])
+
+    for kwargs in [{"limit": 2}, {"limit": 2, "category": "交通"}, {"target_date": datetime(2025, 12, 3)}]:
+        expenses, next_cursor = crud.get_expenses_page(db, "u1", **kwargs)
+        expected = schemas.ExpenseResponse(expenses=expenses, next_cursor=next_cursor).model_dump_json().encode()
+        rows, fast_cursor = crud.get_expense_dicts_page(db, "u1", **kwargs)
+        assert fast_cursor == next_cursor
+        assert schemas.expense_page_json(rows, fast_cursor) == expected
+        # Same bytes without orjson
+        monkeypatch.setattr(schemas, "orjson", None)
+        assert schemas.expense_page_json(rows, fast_cursor) == expected
+        monkeypatch.undo()
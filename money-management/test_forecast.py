@@ -0,0 +1,106 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import crud, schemas, analysis_service
+
+
+def _seed(db, expenses):
+    crud.bulk_create_expenses(db, [
+        schemas.ExpenseCreate(user_id=user_id, amount=amount, category="餐饮", item_name="item", transaction_date=when)
+        for user_id, amount, when in expenses
+    ])
+
+
+def test_forecast_early_in_the_month(db):
+    _seed(db, [
+        ("u1", 40.0, datetime(2026, 3, 1, 9)),
+        ("u1", 60.0, datetime(2026, 3, 5, 20)),
+        ("u1", 999.0, datetime(2026, 2, 28, 12)),  # Last month
+        ("u1", 999.0, datetime(2026, 3, 6, 8)),  # After today
+    ])
+    now = datetime(2026, 3, 5, 21)
+    totals = crud.get_month_daily_totals(db, "u1", today=now.date())
+    assert totals == [(date(2026, 3, 1), 40.0), (date(2026, 3, 5), 60.0)]
+
+    forecast = analysis_service.forecast_month_end(sum(total for _, total in totals), budget=500.0, now=now)
+    assert forecast == {
+        "current_total": 100.0, "days_passed": 5, "days_in_month": 31,
+        "daily_average": 20.0, "predicted_total": 620.0, "overrun": 120.0,
+    }
+    report = analysis_service.toxic_prediction_from_daily_totals(totals, budget=500.0, now=now)
+    assert "5/31 天" in report and "620.00" in report and "轻微超支" in report
+
+
+def test_forecast_later_in_the_month_counts_the_whole_month(db):
+    # Past the first week, expenses older than 7 days still belong to the month-to-date total
+    _seed(db, [
+        ("u1", 100.0, datetime(2026, 2, 1, 9)),
+        ("u1", 150.0, datetime(2026, 2, 9, 9)),
+        ("u1", 50.0, datetime(2026, 2, 20, 9)),
+        ("u2", 500.0, datetime(2026, 2, 20, 9)),
+    ])
+    now = datetime(2026, 2, 20, 12)
+    totals = crud.get_month_daily_totals(db, "u1", today=now.date())
+    assert sum(total for _, total in totals) == 300.0
+
+    forecast = analysis_service.forecast_month_end(300.0, budget=2000.0, now=now)
+    assert (forecast["days_passed"], forecast["days_in_month"]) == (20, 28)
+    assert forecast["daily_average"] == pytest.approx(15.0)
+    assert forecast["predicted_total"] == pytest.approx(420.0)
+    assert "表现尚可" in analysis_service.toxic_prediction_from_daily_totals(totals, budget=2000.0, now=now)
+
+    # December rolls over into the next year
+    assert analysis_service.forecast_month_end(310.0, now=datetime(2026, 12, 31))["days_in_month"] == 31
+    assert analysis_service.toxic_prediction_from_daily_totals([], now=now) == analysis_service.NO_EXPENSES_MESSAGE
+
+
+def test_batch_forecast_seasonality_falls_back_to_flat_without_history():
+    now = datetime(2026, 3, 10, 12)  # A Tuesday; 21 days left, 3 of them Mondays
+    # Every Monday of the last 8 weeks (Jan 19 .. Mar 9), plus one just before that window
+    mondays = [("u1", date(2026, 1, 19) + timedelta(weeks=week), 80.0) for week in range(7)]
+    daily_totals = mondays + [
+        ("u1", date(2026, 3, 9), 100.0),
+        ("u1", date(2026, 1, 12), 999.0),
+        ("u2", date(2026, 3, 10), 50.0),  # Nothing before today: no weekday history
+    ]
+
+    flat = analysis_service.batch_forecast(daily_totals, budget=1000.0, now=now)
+    assert flat.loc["u1", "current_total"] == 180.0
+    assert flat.loc["u1", "predicted_total"] == pytest.approx(180.0 + 18.0 * 21)
+    assert flat.loc["u2", "predicted_total"] == pytest.approx(50.0 + 5.0 * 21)
+
+    weekday = analysis_service.batch_forecast(daily_totals, budget=1000.0, now=now, seasonality=True)
+    # Mean Monday spend over SEASONALITY_WEEKS weeks, times the Mondays left
+    assert weekday.loc["u1", "predicted_total"] == pytest.approx(180.0 + (7 * 80.0 + 100.0) / 8 * 3)
+    assert weekday.loc["u2", "predicted_total"] == pytest.approx(flat.loc["u2", "predicted_total"])
+    assert weekday.loc["u2", "overrun"] == pytest.approx(flat.loc["u2", "predicted_total"] - 1000.0)
+
+
+def test_stored_forecast_is_served_until_the_user_writes(api, api_sessions):
+    user = {"user_id": "u1", "amount": 30.0, "category": "餐饮", "item_name": "Lunch"}
+    api.post("/expenses/add", json=user)
+    with api_sessions() as db:
+        crud.save_forecasts(db, [
+            {"user_id": "u1", "current_total": 30.0, "daily_average": 77.0, "predicted_total": 4321.0},
+            {"user_id": "u2", "current_total": 1.0, "daily_average": 1.0, "predicted_total": 31.0},
+        ], computed_on=date.today(), model="weekday")
+
+    report = api.get("/analysis/toxic_prediction", params={"user_id": "u1", "budget": 2000}).json()["report"]
+    assert "4321.00" in report and "77.00" in report and "严重超支" in report
+
+    api.post("/expenses/add", json={**user, "item_name": "Dinner"})
+    with api_sessions() as db:
+        assert crud.get_forecast(db, "u1") is None
+        assert crud.get_forecast(db, "u2") is not None
+    report = api.get("/analysis/toxic_prediction", params={"user_id": "u1", "budget": 2000}).json()["report"]
+    assert "4321.00" not in report and "60.00" in report
+
+
+def test_stored_forecast_from_another_day_is_ignored(api, api_sessions):
+    api.post("/expenses/add", json={"user_id": "u1", "amount": 30.0, "category": "餐饮", "item_name": "Lunch"})
+    with api_sessions() as db:
+        crud.save_forecasts(db, [{"user_id": "u1", "current_total": 30.0, "daily_average": 77.0,
+                                  "predicted_total": 4321.0}], computed_on=date(2020, 1, 1))
+    report = api.get("/analysis/toxic_prediction", params={"user_id": "u1"}).json()["report"]
+    assert "4321.00" not in report and "30.00" in report
@@ -0,0 +1,70 @@
+from concurrent.futures import wait
+
+import pytest
+from sqlalchemy import event, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+import models, schemas, database, group_commit
+
+
+@pytest.fixture
+def sessions(tmp_path):
+    engine = database.make_engine(str(tmp_path / "sql_app.db"))
+    models.Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    factory.commits = []
+    event.listen(factory, "after_commit", lambda session: factory.commits.append(session))
+    yield factory
+    engine.dispose()
+
+
+def _expense(item, amount=10.0):
+    return schemas.ExpenseCreate(user_id="u1", amount=amount, category="餐饮", item_name=item)
+
+
+def _run(writer, expenses):
+    futures = [writer.submit(expense) for expense in expenses]
+    wait(futures, timeout=10)
+    writer.stop()
+    return futures
+
+
+def test_concurrent_inserts_share_one_commit(sessions):
+    writer = group_commit.GroupCommitWriter(session_factory=lambda user_id: sessions, window_ms=200, max_batch=10)
+    futures = _run(writer, [_expense(f"item {i}", amount=i) for i in range(5)])
+
+    rows = [future.result() for future in futures]
+    assert [(row.item_name, row.amount) for row in rows] == [(f"item {i}", i) for i in range(5)]
+    assert len({row.id for row in rows}) == 5
+    assert len(sessions.commits) == 1
+
+
+def test_max_batch_splits_transactions(sessions):
+    writer = group_commit.GroupCommitWriter(session_factory=lambda user_id: sessions, window_ms=200, max_batch=2)
+    futures = _run(writer, [_expense(f"item {i}") for i in range(5)])
+    assert all(future.exception() is None for future in futures)
+    assert len(sessions.commits) == 3
+
+
+def test_failed_batch_is_retried_one_by_one(sessions):
+    writer = group_commit.GroupCommitWriter(session_factory=lambda user_id: sessions, window_ms=200, max_batch=10)
+    # Skips validation: amount NULL violates the NOT NULL constraint at commit
+    bad = schemas.ExpenseCreate.model_construct(user_id="u1", amount=None, category="餐饮", item_name="bad",
+                                                transaction_date=None)
+    futures = _run(writer, [_expense("a"), bad, _expense("c")])
+
+    assert futures[0].result().item_name == "a"
+    assert isinstance(futures[1].exception(), IntegrityError)
+    assert futures[2].result().item_name == "c"
+    with sessions() as db:
+        assert db.scalars(select(models.Expense.item_name).order_by(models.Expense.id)).all() == ["a", "c"]
+        rollup = db.scalars(select(models.DailyRollup)).one()
+        assert (rollup.total, rollup.count) == (20.0, 2)
+
+
+def test_new_connections_use_wal_and_keep_full_sync(sessions):
+    with sessions() as db:
+        assert db.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        # 2 = FULL: every commit is fsynced unless SQLITE_SYNCHRONOUS lowers it
+        assert db.execute(text("PRAGMA synchronous")).scalar() == 2
@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+import crud, schemas, hot_store
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = hot_store.HotStore(days=7, max_bytes=1 << 20, ttl=300)
+    monkeypatch.setattr(hot_store, "store", store)
+    return store
+
+
+@pytest.fixture
+def db(db, memory_engine):
+    """The shared `db` session, with the SQL it sends collected in db.info["statements"]."""
+    statements = []
+
+    @event.listens_for(memory_engine, "before_cursor_execute")
+    def log(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    db.info["statements"] = statements
+    return db
+
+
+def _add(db, user_id, days_ago, item, category="餐饮"):
+    return crud.create_user_expense(db, schemas.ExpenseCreate(
+        user_id=user_id, amount=10.0, category=category, item_name=item,
+        transaction_date=datetime.now() - timedelta(days=days_ago),
+    ))
+
+
+def _items(page):
+    rows, _ = page
+    return [row["item_name"] for row in rows]
+
+
+def test_default_window_is_served_from_memory_after_first_load(store, db):
+    for days_ago, item in [(0, "today"), (3, "three days"), (10, "too old")]:
+        _add(db, "u1", days_ago, item)
+    statements = db.info["statements"]
+
+    assert _items(crud.get_recent_expenses_page(db, "u1")) == ["today", "three days"]
+    statements.clear()
+    assert _items(crud.get_recent_expenses_page(db, "u1")) == ["today", "three days"]
+    assert _items(crud.get_recent_expenses_page(db, "u1", category="交通")) == []
+    assert statements == []
+
+    # Same rows, same order as the database path
+    expected, _ = crud.get_expense_dicts_page(db, "u1")
+    assert crud.get_recent_expenses_page(db, "u1")[0] == expected
+
+
+def test_writes_go_through_after_commit(store, db):
+    _add(db, "u1", 1, "yesterday")
+    crud.get_recent_expenses_page(db, "u1")
+
+    added = _add(db, "u1", 0, "new")
+    assert _items(crud.get_cached_recent_expenses_page("u1")) == ["new", "yesterday"]
+    crud.delete_expenses(db, "u1", expense_id=added.id)
+    assert _items(crud.get_cached_recent_expenses_page("u1")) == ["yesterday"]
+    crud.delete_expenses(db, "u1", target_date=datetime.now() - timedelta(days=1))
+    assert _items(crud.get_cached_recent_expenses_page("u1")) == []
+
+    # Rolled back: never reaches the window
+    crud.add_user_expense(db, schemas.ExpenseCreate(user_id="u1", amount=1.0, category="餐饮", item_name="x"))
+    db.rollback()
+    assert _items(crud.get_cached_recent_expenses_page("u1")) == []
+
+    # Bulk inserts drop the window; the next request reloads it
+    crud.bulk_create_expenses(db, [schemas.ExpenseCreate(user_id="u1", amount=1.0, category="餐饮", item_name="bulk")])
+    assert crud.get_cached_recent_expenses_page("u1") is None
+    assert _items(crud.get_recent_expenses_page(db, "u1")) == ["bulk"]
+
+
+def test_write_during_load_is_not_lost(store, db):
+    token = store.begin_load("u1")
+    since = store.window_start()
+    # Committed after the window was read, but before it is installed
+    _add(db, "u1", 0, "racing")
+    store.install("u1", token, since, [])
+    assert crud.get_cached_recent_expenses_page("u1") is None
+    assert _items(crud.get_recent_expenses_page(db, "u1")) == ["racing"]
+
+
+def test_least_recently_used_windows_are_evicted_over_budget(store, db):
+    for user_id in ["u1", "u2", "u3"]:
+        for i in range(5):
+            _add(db, user_id, 0, f"{user_id} item {i}")
+    crud.get_recent_expenses_page(db, "u1")
+    store.max_bytes = store.stats()["bytes"] * 2
+
+    crud.get_recent_expenses_page(db, "u2")
+    crud.get_recent_expenses_page(db, "u1")
+    crud.get_recent_expenses_page(db, "u3")
+    assert crud.get_cached_recent_expenses_page("u2") is None
+    assert crud.get_cached_recent_expenses_page("u1") is not None
+    assert crud.get_cached_recent_expenses_page("u3") is not None
+    assert store.stats()["bytes"] <= store.max_bytes
+
+
+def test_dates_with_an_offset_are_kept_as_stored(store, db):
+    _add(db, "u1", 1, "yesterday")
+    crud.get_recent_expenses_page(db, "u1")
+
+    # Like the API's sessions (expire_on_commit=False): the committed object keeps its offset
+    api_db = sessionmaker(bind=db.get_bind(), expire_on_commit=False)()
+    crud.create_user_expense(api_db, schemas.ExpenseCreate(
+        user_id="u1", amount=1.0, category="餐饮", item_name="utc",
+        transaction_date=datetime.now(timezone.utc) - timedelta(hours=1),
+    ))
+    cached, _ = crud.get_cached_recent_expenses_page("u1")
+    assert cached == crud.get_expense_dicts_page(db, "u1")[0]
+    assert "utc" in [row["item_name"] for row in cached]
+
+
+def test_change_that_cannot_be_applied_drops_the_window(store, db):
+    _add(db, "u1", 1, "yesterday")
+    crud.get_recent_expenses_page(db, "u1")
+    store.apply([("insert", "u1", {"transaction_date": "not a datetime"})])
+    assert crud.get_cached_recent_expenses_page("u1") is None
+    assert _items(crud.get_recent_expenses_page(db, "u1")) == ["yesterday"]
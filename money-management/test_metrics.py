@@ -0,0 +1,53 @@
+import re
+
+import metrics
+
+
+def _series(text: str, name: str) -> dict:
+    # {label string: value} of one sample name, e.g. name="http_request_duration_seconds_count"
+    return {labels: float(value) for labels, value in re.findall(rf"^{name}\{{(.*)\}} (\S+)$", text, re.MULTILINE)}
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = metrics.Histogram("demo_seconds", "Demo.", ("route",), (0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value, "/a")
+    assert histogram.render() == [
+        "# HELP demo_seconds Demo.",
+        "# TYPE demo_seconds histogram",
+        'demo_seconds_bucket{route="/a",le="0.1"} 1',
+        'demo_seconds_bucket{route="/a",le="1.0"} 3',
+        'demo_seconds_bucket{route="/a",le="+Inf"} 4',
+        'demo_seconds_sum{route="/a"} 6.05',
+        'demo_seconds_count{route="/a"} 4',
+    ]
+
+
+def test_metrics_endpoint_exposes_routes_queries_and_render_stages(api):
+    api.post("/expenses/add", json={"user_id": "u1", "amount": 8.0, "category": "餐饮", "item_name": "Tea"})
+    api.get("/report/weekly", params={"user_id": "u1"})
+    api.get("/analysis/report_data", params={"user_id": "u1"})
+    api.get("/analysis/visual_report/jobs/0123", params={"user_id": "u1"})
+    api.get("/no/such/route")
+
+    response = api.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    for name in ("http_request_duration_seconds", "db_query_duration_seconds", "db_query_rows",
+                 "report_render_stage_seconds"):
+        assert f"# TYPE {name} histogram" in text
+
+    requests = _series(text, "http_request_duration_seconds_count")
+    assert requests['method="POST",route="/expenses/add",status="200"'] >= 1
+    assert requests['method="GET",route="/report/weekly",status="200"'] >= 1
+    # Labelled with the route template, not the raw path
+    assert requests['method="GET",route="/analysis/visual_report/jobs/{job_id}",status="404"'] >= 1
+    assert requests['method="GET",route="unmatched",status="404"'] >= 1
+    assert not any("0123" in labels or "/no/such/route" in labels for labels in requests)
+
+    queries = _series(text, "db_query_duration_seconds_count")
+    assert queries['operation="INSERT",table="expenses"'] >= 1
+    assert queries['operation="SELECT",table="daily_rollups"'] >= 1
+    assert _series(text, "db_query_rows_count")['table="daily_rollups"'] >= 1
+    assert _series(text, "report_render_stage_seconds_count")['stage="data"'] >= 1
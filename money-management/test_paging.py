@@ -0,0 +1,86 @@
+import base64
+import csv
+import io
+import json
+from datetime import datetime
+
+import crud, schemas
+
+USER = "u1"
+SAME_TIME = datetime(2026, 3, 2, 12)
+
+
+def _seed(api_sessions):
+    # Five expenses share one transaction_date: only the id orders them
+    when = [SAME_TIME] * 5 + [datetime(2026, 3, 1, 8), datetime(2026, 3, 3, 8), datetime(2026, 2, 27, 20)]
+    with api_sessions() as db:
+        crud.bulk_create_expenses(db, [
+            schemas.ExpenseCreate(user_id=USER, amount=float(i + 1), category="餐饮" if i % 2 else "交通",
+                                  item_name=f"item {i}, \"quoted\"\nsecond line", transaction_date=moment)
+            for i, moment in enumerate(when)
+        ])
+        crud.create_user_expense(db, schemas.ExpenseCreate(user_id="u2", amount=1.0, category="餐饮", item_name="other"))
+
+
+def _all_pages(api, limit, **params):
+    ids, cursor, pages = [], None, 0
+    while True:
+        query = {"user_id": USER, "limit": limit, **params}
+        if cursor:
+            query["cursor"] = cursor
+        response = api.get("/expenses/query", params=query)
+        assert response.status_code == 200
+        body = response.json()
+        assert len(body["expenses"]) <= limit
+        ids += [(e["transaction_date"], e["id"]) for e in body["expenses"]]
+        pages += 1
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return ids, pages
+
+
+def test_pages_cover_every_row_once_across_equal_dates(api, api_sessions):
+    _seed(api_sessions)
+    everything, _ = _all_pages(api, limit=100)
+    assert len(everything) == 8
+    assert everything == sorted(everything, reverse=True)
+
+    for limit in (1, 2, 3):
+        paged, pages = _all_pages(api, limit=limit)
+        assert paged == everything
+        assert pages == -(-8 // limit)
+
+    paged, _ = _all_pages(api, limit=2, date="2026-03-02")
+    assert [expense_id for _, expense_id in paged] == [5, 4, 3, 2, 1]
+
+
+def test_bad_cursor_is_rejected(api):
+    for cursor in ("not a cursor", base64.urlsafe_b64encode(b"2026-03-02|x").decode(), "8J+Ssw=="):
+        response = api.get("/expenses/query", params={"user_id": USER, "limit": 2, "cursor": cursor})
+        assert response.status_code == 422
+    assert crud.decode_cursor(crud.encode_cursor(SAME_TIME, 7)) == (SAME_TIME, 7)
+
+
+def test_export_streams_all_rows_oldest_first(api, api_sessions, monkeypatch):
+    import main
+    _seed(api_sessions)
+    monkeypatch.setattr(main, "EXPORT_BATCH_SIZE", 3)
+
+    response = api.get("/expenses/export", params={"user_id": USER})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["id"] for row in rows] == [8, 6, 1, 2, 3, 4, 5, 7]
+    assert set(rows[0]) == set(main.EXPORT_FIELDS)
+    assert rows[0]["transaction_date"] == "2026-02-27T20:00:00"
+    assert rows[0]["item_name"] == 'item 7, "quoted"\nsecond line'
+
+    response = api.get("/expenses/export", params={"user_id": USER, "format": "csv", "category": "餐饮",
+                                                   "start": "2026-03-02", "end": "2026-03-02"})
+    assert response.headers["content-type"].startswith("text/csv")
+    table = list(csv.reader(io.StringIO(response.text)))
+    assert table[0] == main.EXPORT_FIELDS
+    assert [(row[0], row[3], row[5]) for row in table[1:]] == [
+        ("2", "餐饮", "2026-03-02T12:00:00"), ("4", "餐饮", "2026-03-02T12:00:00"),
+    ]
+    assert table[1][4] == 'item 1, "quoted"\nsecond line'
@@ -0,0 +1,88 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.orm import sessionmaker
+
+import models, crud, migrations, schemas
+
+INDEX_NAME = "ix_expenses_user_id_transaction_date"
+
+
+@pytest.fixture
+def statements(memory_engine):
+    """(statement, parameters) of everything the `db` session sends."""
+    statements = []
+
+    @event.listens_for(memory_engine, "before_cursor_execute")
+    def log(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    return statements
+
+
+def _plan(db, statement, parameters) -> str:
+    rows = db.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    return " | ".join(row[-1] for row in rows)
+
+
+def test_get_expenses_by_date_uses_user_date_index(db, statements):
+    crud.get_expenses(db, user_id="u1", target_date=datetime(2025, 12, 1))
+
+    statement, parameters = next(s for s in statements if s[0].lstrip().startswith("SELECT") and "FROM expenses" in s[0])
+    plan = _plan(db, statement, parameters)
+    assert f"USING INDEX {INDEX_NAME} (user_id=? AND transaction_date>? AND transaction_date<?)" in plan
+
+
+def test_delete_expenses_by_date_uses_user_date_index(db, statements):
+    crud.delete_expenses(db, user_id="u1", target_date=datetime(2025, 12, 1))
+
+    statement, parameters = next(s for s in statements if s[0].lstrip().startswith("DELETE FROM expenses"))
+    plan = _plan(db, statement, parameters)
+    # With RETURNING, SQLite first collects the matching rowids from the index alone (COVERING)
+    assert f"INDEX {INDEX_NAME} (user_id=? AND transaction_date>? AND transaction_date<?)" in plan
+
+
+def test_migration_adds_index_to_existing_database(memory_engine):
+    models.Base.metadata.create_all(bind=memory_engine)
+    with memory_engine.begin() as conn:
+        # Recreate the pre-migration layout: single-column user_id index only
+        conn.exec_driver_sql(f"DROP INDEX {INDEX_NAME}")
+        conn.exec_driver_sql("CREATE INDEX ix_expenses_user_id ON expenses (user_id)")
+
+    with sessionmaker(bind=memory_engine)() as db:
+        assert migrations.run_migrations(db) == len(migrations.MIGRATIONS)
+        indexes = {row[1] for row in db.execute(text("PRAGMA index_list('expenses')"))}
+        assert migrations.run_migrations(db) == 0
+
+    assert INDEX_NAME in indexes
+    assert "ix_expenses_user_id" not in indexes
+
+
+def test_search_uses_fts_index_and_stays_in_sync(db, statements):
+    migrations.run_migrations(db)
+    crud.bulk_create_expenses(db, [
+        schemas.ExpenseCreate(user_id=user_id, amount=amount, category="餐饮", item_name=item,
+                              transaction_date=datetime(2025, 12, day))
+        for user_id, amount, item, day in [
+            ("u1", 30.0, "Starbucks Coffee", 1),
+            ("u1", 12.0, "星巴克 拿铁", 2),
+            ("u1", 9.0, "奶茶", 3),
+            ("u2", 99.0, "Starbucks Coffee", 1),
+        ]
+    ])
+
+    statements.clear()
+    count, total, rows = crud.search_expenses(db, "u1", "starbu", start=datetime(2025, 11, 1))
+    assert (count, total) == (1, 30.0)
+    plan = _plan(db, *next(s for s in statements if "count(" in s[0]))
+    assert "expenses_fts VIRTUAL TABLE" in plan
+    assert "SCAN expenses" not in plan.replace("SCAN expenses_fts", "")
+
+    # CJK substrings; terms under three characters fall back to LIKE within the user's rows
+    assert crud.search_expenses(db, "u1", "星巴克")[:2] == (1, 12.0)
+    assert crud.search_expenses(db, "u1", "奶茶")[:2] == (1, 9.0)
+
+    # Deletes leave the index through the triggers
+    crud.delete_expenses(db, "u1", expense_id=rows[0].id)
+    assert crud.search_expenses(db, "u1", "Starbucks")[:2] == (0, 0.0)
@@ -0,0 +1,80 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import render_engine
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    """A one-worker RenderEngine with max_pending=2, installed as render_engine.engine.
+
+    The worker is a thread, so tests can hold it with `block()` and submit plain functions.
+    """
+    engine = render_engine.RenderEngine(workers=1, max_pending=2)
+    engine._pool = ThreadPoolExecutor(max_workers=1)
+    released = threading.Event()
+
+    def block():
+        # Occupies the worker (and one pending slot) until the test ends
+        return engine.submit(released.wait, 10)
+
+    engine.block = block
+    monkeypatch.setattr(render_engine, "engine", engine)
+    yield engine
+    released.set()
+    engine.shutdown()
+
+
+def _add(api):
+    api.post("/expenses/add", json={"user_id": "u1", "amount": 35.0, "category": "餐饮", "item_name": "item"})
+
+
+def test_submit_rejects_past_max_pending_and_frees_slots(engine):
+    engine.block()
+    queued = engine.submit(sum, [1, 2])
+    with pytest.raises(render_engine.RendererBusy):
+        engine.submit(sum, [3])
+    assert engine._pending == 2
+
+    queued.cancel()
+    assert engine.submit(sum, [3]) is not None
+
+
+def test_crashed_pool_is_dropped_and_reported_busy(engine):
+    def crash():
+        raise BrokenProcessPool("worker died")
+
+    pool = engine._pool
+    with pytest.raises(render_engine.RendererBusy):
+        asyncio.run(engine._run_async(crash, timeout=5))
+    # The next render starts a fresh pool; the failed one no longer counts as pending
+    assert engine._pool is None and engine._pending == 0
+    pool.shutdown()
+
+
+def test_full_queue_answers_503_with_retry_after(api, engine):
+    _add(api)
+    engine.block()
+    engine.block()
+
+    for path in ("/analysis/visual_report", "/analysis/visual_report.png"):
+        response = api.get(path, params={"user_id": "u1"})
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "5"
+
+
+def test_render_timeout_answers_503_with_retry_after(api, engine, monkeypatch):
+    _add(api)
+    engine.block()
+    render_async = engine.render_async
+    monkeypatch.setattr(engine, "render_async", lambda data: render_async(data, timeout=0.05))
+
+    response = api.get("/analysis/visual_report.png", params={"user_id": "u1"})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "5"
+    # The abandoned render is cancelled and gives its slot back
+    assert engine._pending == 1
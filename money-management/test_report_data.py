@@ -0,0 +1,40 @@
+from datetime import date, datetime, timedelta
+
+
+def _add(api, amount, category, days_ago=0):
+    when = datetime.combine(date.today() - timedelta(days=days_ago), datetime.min.time()) + timedelta(hours=12)
+    api.post("/expenses/add", json={"user_id": "u1", "amount": amount, "category": category, "item_name": "item",
+                                    "transaction_date": when.isoformat()})
+
+
+def test_report_data_returns_the_chart_series(api):
+    _add(api, 100.0, "餐饮", days_ago=2)
+    _add(api, 60.0, "餐饮")
+    _add(api, 120.0, "交通", days_ago=1)
+    _add(api, 8.0, "学习")  # Under 5% of the total: folded into 其他
+    _add(api, 999.0, "娱乐", days_ago=30)  # Outside the 7-day window
+
+    response = api.get("/analysis/report_data", params={"user_id": "u1"})
+    assert response.status_code == 200
+    body = response.json()
+    today = date.today()
+    assert body == {
+        "user_id": "u1",
+        "window_days": 7,
+        "total_spent": 288.0,
+        "top_category": "餐饮",
+        "top_category_amount": 160.0,
+        "date_range": f"{today - timedelta(days=2):%m/%d} - {today:%m/%d}",
+        "categories": [["餐饮", 160.0], ["交通", 120.0], ["其他", 8.0]],
+        "daily": [[f"{today - timedelta(days=2)}", 100.0], [f"{today - timedelta(days=1)}", 120.0], [f"{today}", 68.0]],
+        "png_url": "/analysis/visual_report.png?user_id=u1",
+    }
+    etag = response.headers["etag"]
+    assert api.get("/analysis/report_data", params={"user_id": "u1"}, headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_report_data_without_data_is_404(api):
+    _add(api, 999.0, "娱乐", days_ago=30)
+    response = api.get("/analysis/report_data", params={"user_id": "u1"})
+    assert response.status_code == 404
+    assert api.get("/analysis/report_data", params={"user_id": "nobody"}).status_code == 404
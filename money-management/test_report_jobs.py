@@ -0,0 +1,67 @@
+import time
+
+import pytest
+
+import report_jobs
+
+
+def test_pending_jobs_are_coalesced_and_depth_is_bounded():
+    # No job threads: everything submitted stays queued
+    jobs = report_jobs.ReportJobQueue(workers=0, max_depth=2)
+
+    first = jobs.submit("u1", "fp1", {"total_spent": 1.0}, "static/a.png")
+    assert jobs.submit("u1", "fp1", {"total_spent": 1.0}, "static/a.png") is first
+    assert jobs.submit("u1", "fp2", {"total_spent": 2.0}, "static/b.png") is not first
+
+    with pytest.raises(report_jobs.QueueFull):
+        jobs.submit("u2", "fp3", {"total_spent": 3.0}, "static/c.png")
+    assert jobs.get(first.id).status == report_jobs.QUEUED
+
+
+def test_finished_job_releases_its_slot(monkeypatch):
+    rendered = []
+    monkeypatch.setattr(report_jobs.render_engine.engine, "render_to_file", lambda data, path: rendered.append(path))
+    jobs = report_jobs.ReportJobQueue(workers=0, max_depth=1)
+
+    job = jobs.submit("u1", "fp1", {"total_spent": 1.0}, "static/a.png")
+    jobs._execute(*jobs._queue.get_nowait())
+
+    assert rendered == ["static/a.png"]
+    assert job.status == report_jobs.DONE and job.filename == "a.png"
+    # The slot is free again, and the same data now gets a new job
+    assert jobs.submit("u1", "fp1", {"total_spent": 1.0}, "static/a.png") is not job
+
+
+def test_submitted_job_is_polled_until_done(api):
+    api.post("/expenses/add", json={"user_id": "u1", "amount": 18.0, "category": "交通", "item_name": "Bus"})
+    job = api.post("/analysis/visual_report/jobs", params={"user_id": "u1"}).json()
+    assert job["status"] in (report_jobs.QUEUED, report_jobs.RUNNING, report_jobs.DONE)
+
+    deadline = time.monotonic() + 60
+    while job["status"] not in (report_jobs.DONE, report_jobs.FAILED) and time.monotonic() < deadline:
+        time.sleep(0.1)
+        job = api.get(f"/analysis/visual_report/jobs/{job['job_id']}", params={"user_id": "u1"}).json()
+    assert job["status"] == report_jobs.DONE
+    assert api.get(job["image_url"]).headers["content-type"] == "image/png"
+    # The image is cached now: submitting again is answered as done right away
+    assert api.post("/analysis/visual_report/jobs", params={"user_id": "u1"}).json()["status"] == report_jobs.DONE
+
+    assert api.get(f"/analysis/visual_report/jobs/{job['job_id']}", params={"user_id": "u2"}).status_code == 404
+    assert api.get("/analysis/visual_report/jobs/unknown", params={"user_id": "u1"}).status_code == 404
+
+
+def test_job_accepted_by_another_process_is_found_once_rendered(api):
+    import main
+    # Another worker process accepted the job: this process has never seen it
+    other = report_jobs.ReportJobQueue(workers=0)
+    fingerprint = "ab" * 20
+    job = other.submit("u1", fingerprint, {"total_spent": 1.0}, main._report_file_path("u1", fingerprint))
+    url = f"/analysis/visual_report/jobs/{job.id}"
+
+    assert api.get(url, params={"user_id": "u1"}).status_code == 404
+    with open(job.path, "wb") as f:
+        f.write(b"png")
+    body = api.get(url, params={"user_id": "u1"}).json()
+    assert body["status"] == report_jobs.DONE
+    assert body["image_url"].endswith(f"/static/report_u1_{fingerprint[:16]}.png")
+    assert api.get(url, params={"user_id": "u2"}).status_code == 404
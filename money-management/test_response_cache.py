@@ -0,0 +1,56 @@
+import crud, schemas
+
+USER = "u1"
+
+
+def _add(api, item="Coffee", **fields):
+    response = api.post("/expenses/add", json={"user_id": USER, "amount": 10.0, "category": "餐饮",
+                                               "item_name": item, **fields})
+    assert response.status_code == 200
+    return response
+
+
+def _etag(api, path="/report/weekly", etag=None):
+    headers = {"If-None-Match": etag} if etag else {}
+    response = api.get(f"{path}?user_id={USER}", headers=headers)
+    return response.status_code, response.headers["etag"]
+
+
+def test_repeat_request_is_not_modified(api):
+    _add(api)
+    for path in ("/report/weekly", "/analysis/toxic_prediction"):
+        status, etag = _etag(api, path)
+        assert status == 200
+        assert _etag(api, path, etag) == (304, etag)
+        # Weak validators and lists of tags match too
+        assert _etag(api, path, f'"other", W/{etag}')[0] == 304
+
+
+def test_every_write_path_changes_the_etag(api):
+    first = _add(api).json()
+    _add(api, item="Tea", transaction_date="2026-01-05T12:00:00")
+    writes = [
+        lambda: _add(api, item="Cake"),
+        lambda: api.post("/expenses/bulk_add", json=[{"user_id": USER, "amount": 1.0, "category": "交通", "item_name": "Bus"}]),
+        lambda: api.get(f"/expenses/delete?user_id={USER}&expense_id={first['id']}"),
+        lambda: api.get(f"/expenses/delete?user_id={USER}&date=2026-01-05"),
+    ]
+    _, etag = _etag(api)
+    for write in writes:
+        assert write().status_code == 200
+        status, new_etag = _etag(api, etag=etag)
+        assert status == 200 and new_etag != etag
+        etag = new_etag
+
+    # Another user's writes leave this user's responses valid
+    api.post("/expenses/add", json={"user_id": "u2", "amount": 1.0, "category": "餐饮", "item_name": "x"})
+    assert _etag(api, etag=etag)[0] == 304
+
+
+def test_rolled_back_write_keeps_the_etag(api, api_sessions):
+    _add(api)
+    _, etag = _etag(api)
+    with api_sessions() as db:
+        crud.add_user_expense(db, schemas.ExpenseCreate(user_id=USER, amount=5.0, category="餐饮", item_name="x"))
+        db.rollback()
+    assert _etag(api, etag=etag) == (304, etag)
@@ -0,0 +1,86 @@
+from datetime import datetime
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import sessionmaker
+
+import models, crud, schemas, database
+
+DAY = datetime(2026, 3, 2, 9)
+
+
+def _expense(user_id="u1", amount=10.0, category="餐饮", when=DAY):
+    return schemas.ExpenseCreate(user_id=user_id, amount=amount, category=category, item_name="item",
+                                 transaction_date=when)
+
+
+def _assert_rollups_match_expenses(db):
+    expected = db.execute(text(
+        "SELECT user_id, date(transaction_date), category_id, round(sum(amount), 6), count(*) "
+        "FROM expenses GROUP BY 1, 2, 3 ORDER BY 1, 2, 3"
+    )).all()
+    stored = db.execute(text(
+        "SELECT user_id, day, category_id, round(total, 6), count FROM daily_rollups ORDER BY 1, 2, 3"
+    )).all()
+    assert stored == expected
+
+
+def test_rollups_follow_every_write(db):
+    first = crud.create_user_expense(db, _expense())
+    crud.create_user_expense(db, _expense(amount=2.5))
+    crud.create_user_expense(db, _expense(user_id="u2", category="交通"))
+    _assert_rollups_match_expenses(db)
+
+    crud.bulk_create_expenses(db, [
+        _expense(amount=1.25),
+        _expense(category="学习", when=datetime(2026, 3, 3, 23, 59)),
+        _expense(user_id="u2", when=datetime(2026, 3, 4)),
+    ])
+    _assert_rollups_match_expenses(db)
+
+    assert crud.delete_expenses(db, "u1", expense_id=first.id) == 1
+    _assert_rollups_match_expenses(db)
+
+    assert crud.delete_expenses(db, "u1", target_date=DAY) == 2
+    _assert_rollups_match_expenses(db)
+    # Emptied (user, day, category) groups are removed, not kept at zero
+    assert db.execute(text("SELECT count(*) FROM daily_rollups WHERE count <= 0")).scalar() == 0
+
+
+def test_rebuild_repairs_drift(db):
+    crud.bulk_create_expenses(db, [_expense(), _expense(user_id="u2", amount=3.0), _expense(category="交通")])
+    db.execute(text("UPDATE daily_rollups SET total = 999"))
+    db.execute(text("DELETE FROM daily_rollups WHERE user_id = 'u2'"))
+    db.commit()
+
+    crud.rebuild_daily_rollups(db, user_id="u2")
+    assert db.execute(text("SELECT total FROM daily_rollups WHERE user_id = 'u2'")).scalars().all() == [3.0]
+    assert db.execute(text("SELECT count(*) FROM daily_rollups WHERE total = 999")).scalar() == 2
+
+    assert crud.rebuild_daily_rollups(db) == 3
+    _assert_rollups_match_expenses(db)
+
+
+def test_row_committed_just_before_a_delete_leaves_the_rollups(tmp_path):
+    # Another connection commits a same-day expense right before the delete takes the write lock
+    # (its first write statement); the rollup deltas must still cover exactly the rows removed
+    engine = database.make_engine(str(tmp_path / "sql_app.db"))
+    models.Base.metadata.create_all(bind=engine)
+    sessions = sessionmaker(bind=engine)
+    with sessions() as db:
+        crud.create_user_expense(db, _expense(amount=1.0))
+
+    interleaved = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def insert_before_first_write(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().startswith(("INSERT", "UPDATE", "DELETE")) and not interleaved:
+            interleaved.append(statement)
+            with sessions() as other:
+                crud.create_user_expense(other, _expense(amount=99.0))
+
+    with sessions() as db:
+        assert crud.delete_expenses(db, "u1", target_date=DAY) == 2
+        assert interleaved
+        _assert_rollups_match_expenses(db)
+        assert db.execute(text("SELECT count(*) FROM daily_rollups")).scalar() == 0
+    engine.dispose()
@@ -0,0 +1,63 @@
+from datetime import datetime
+
+import crud, schemas
+
+ITEMS = [
+    ("Starbucks Coffee", 35.0, datetime(2026, 1, 5, 9)),
+    ("starbucks latte", 30.0, datetime(2026, 2, 1, 9)),
+    ("星巴克咖啡", 28.0, datetime(2026, 2, 3, 9)),
+    ("珍珠奶茶", 15.0, datetime(2026, 2, 4, 9)),
+    ("100% juice_box", 6.0, datetime(2026, 2, 5, 9)),
+    ("Coffee OR tea", 4.0, datetime(2026, 2, 6, 9)),
+]
+
+
+def _seed(api_sessions):
+    with api_sessions() as db:
+        crud.bulk_create_expenses(db, [
+            schemas.ExpenseCreate(user_id="u1", amount=amount, category="餐饮", item_name=item, transaction_date=when)
+            for item, amount, when in ITEMS
+        ] + [schemas.ExpenseCreate(user_id="u2", amount=99.0, category="餐饮", item_name="Starbucks Coffee")])
+
+
+def _search(api, q, **params):
+    response = api.get("/expenses/search", params={"user_id": "u1", "q": q, **params})
+    assert response.status_code == 200
+    body = response.json()
+    return body["count"], body["total_amount"], [e["item_name"] for e in body["expenses"]]
+
+
+def test_search_matches_substrings_of_every_term(api, api_sessions):
+    _seed(api_sessions)
+    assert _search(api, "STARBUCKS") == (2, 65.0, ["starbucks latte", "Starbucks Coffee"])
+    assert _search(api, "starbucks coffee") == (1, 35.0, ["Starbucks Coffee"])
+    assert _search(api, "巴克咖") == (1, 28.0, ["星巴克咖啡"])
+    # Shorter than a trigram: LIKE fallback
+    assert _search(api, "奶茶") == (1, 15.0, ["珍珠奶茶"])
+    assert _search(api, "ff") == (2, 39.0, ["Coffee OR tea", "Starbucks Coffee"])
+
+
+def test_search_input_is_literal(api, api_sessions):
+    _seed(api_sessions)
+    assert _search(api, "0%")[2] == ["100% juice_box"]
+    assert _search(api, "e_b")[2] == ["100% juice_box"]
+    assert _search(api, "e%b")[0] == 0
+    # FTS5 operators and quotes in the query are plain text
+    assert _search(api, "Coffee OR tea")[2] == ["Coffee OR tea"]
+    assert _search(api, 'tea"')[0] == 0
+    assert api.get("/expenses/search", params={"user_id": "u1", "q": "   "}).status_code == 422
+
+
+def test_totals_cover_all_matches_and_ranges(api, api_sessions):
+    _seed(api_sessions)
+    assert _search(api, "Coffee", limit=1) == (2, 39.0, ["Coffee OR tea"])
+    assert _search(api, "starbucks", start="2026-02-01", end="2026-02-01") == (1, 30.0, ["starbucks latte"])
+    assert _search(api, "starbucks", end="2026-01-31") == (1, 35.0, ["Starbucks Coffee"])
+
+
+def test_index_follows_deletes(api, api_sessions):
+    _seed(api_sessions)
+    api.get("/expenses/delete", params={"user_id": "u1", "date": "2026-01-05"})
+    assert _search(api, "starbucks") == (1, 30.0, ["starbucks latte"])
+    api.post("/expenses/add", json={"user_id": "u1", "amount": 5.0, "category": "餐饮", "item_name": "Starbucks Cake"})
+    assert _search(api, "starbucks")[:2] == (2, 35.0)
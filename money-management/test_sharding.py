@@ -0,0 +1,62 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+import models, crud, schemas, database, sharding
+
+USERS = [f"user_{i}" for i in range(12)]
+
+
+def _single_database(path):
+    engine = database.make_engine(str(path))
+    models.Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        crud.bulk_create_expenses(db, [
+            schemas.ExpenseCreate(user_id=user_id, amount=10.0 + i, category="餐饮", item_name="item",
+                                  transaction_date=datetime(2025, 12, 1 + i % 3, 12))
+            for i, user_id in enumerate(USERS * 2)
+        ])
+    engine.dispose()
+
+
+def _users_by_shard(directory, shards):
+    placement = {}
+    for index in range(shards):
+        engine = database.make_engine(database.shard_path(index, directory))
+        with Session(engine) as db:
+            for table in (models.Expense, models.DailyRollup):
+                for user_id in db.scalars(select(table.user_id).distinct()):
+                    placement.setdefault(user_id, set()).add(index)
+        engine.dispose()
+    return placement
+
+
+def test_split_then_rebalance(tmp_path):
+    source = tmp_path / "sql_app.db"
+    _single_database(source)
+
+    copied = sharding.copy_into_shards([str(source)], 3, str(tmp_path / "three"))
+    assert copied["expenses"] == len(USERS) * 2
+    # Every user lives on exactly the shard routing picks, rollups included
+    placement = _users_by_shard(tmp_path / "three", 3)
+    assert placement == {user_id: {database.shard_for(user_id, 3)} for user_id in USERS}
+
+    sources = [database.shard_path(i, str(tmp_path / "three")) for i in range(3)]
+    copied = sharding.copy_into_shards(sources, 2, str(tmp_path / "two"))
+    assert copied["expenses"] == len(USERS) * 2
+    assert _users_by_shard(tmp_path / "two", 2) == {user_id: {database.shard_for(user_id, 2)} for user_id in USERS}
+
+    engine = database.make_engine(database.shard_path(database.shard_for("user_0", 2), str(tmp_path / "two")))
+    with Session(engine) as db:
+        assert db.scalar(select(func.sum(models.Expense.amount)).where(models.Expense.user_id == "user_0")) == 10.0 + 22.0
+    engine.dispose()
+
+
+def test_refuses_non_empty_target(tmp_path):
+    source = tmp_path / "sql_app.db"
+    _single_database(source)
+    sharding.copy_into_shards([str(source)], 2, str(tmp_path / "shards"))
+    with pytest.raises(ValueError):
+        sharding.copy_into_shards([str(source)], 2, str(tmp_path / "shards"))
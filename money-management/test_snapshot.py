@@ -0,0 +1,38 @@
+from datetime import datetime
+
+import pytest
+
+import crud, schemas, snapshot, analysis_service
+
+pytest.importorskip("pyarrow")
+
+
+def _seed(db):
+    crud.bulk_create_expenses(db, [
+        schemas.ExpenseCreate(user_id=user_id, amount=amount, category=category, item_name="item", transaction_date=when)
+        for user_id, amount, category, when in [
+            ("u/1", 10.0, "餐饮", datetime(2025, 12, 1, 8)),
+            ("u/1", 5.0, "交通", datetime(2025, 12, 1, 18)),
+            ("u/1", 7.0, "餐饮", datetime(2025, 12, 3, 12)),
+            ("u2", 3.0, "学习", datetime(2025, 12, 2, 12)),
+        ]
+    ])
+
+
+def test_snapshot_round_trip_feeds_analysis(db, tmp_path):
+    _seed(db)
+    assert snapshot.export_snapshots(db, directory=str(tmp_path)) == {"u/1": 3, "u2": 1}
+
+    table = snapshot.load_expenses("u/1", columns=["amount"], start=datetime(2025, 12, 2), directory=str(tmp_path))
+    assert table.column_names == ["amount"]
+    assert table["amount"].to_pylist() == [7.0]
+
+    data = snapshot.report_data("u/1", directory=str(tmp_path))
+    assert data["total_spent"] == 22.0
+    # Expenses on the same day (different times) form one point of the daily series
+    assert [amount for _, amount in data["daily"]] == [15.0, 7.0]
+
+    forecast = analysis_service.batch_forecast(snapshot.load_daily_totals(directory=str(tmp_path)),
+                                               now=datetime(2025, 12, 10))
+    assert forecast.loc["u/1", "current_total"] == 22.0
+    assert forecast.loc["u2", "current_total"] == 3.0
@@ -0,0 +1,12 @@
+import os
+import subprocess
+import sys
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_importing_api_does_not_load_analysis_stack():
+    # A fresh interpreter: this test process may already have imported pandas/matplotlib
+    probe = "import sys, main; print('loaded:' + ','.join(m for m in ('pandas', 'matplotlib') if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", probe], cwd=APP_DIR, capture_output=True, text=True, check=True)
+    assert result.stdout.rsplit("loaded:", 1)[-1].strip() == ""
@@ -0,0 +1,73 @@
+import base64
+import os
+
+import pytest
+
+import render_engine
+
+USER = "u1"
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def _add(api, amount, category="餐饮"):
+    api.post("/expenses/add", json={"user_id": USER, "amount": amount, "category": category, "item_name": "item"})
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    """Paths rendered through the worker pool during the test."""
+    rendered = []
+    render_to_file_async = render_engine.engine.render_to_file_async
+
+    async def counting(data, path, **kwargs):
+        rendered.append(path)
+        return await render_to_file_async(data, path, **kwargs)
+
+    monkeypatch.setattr(render_engine.engine, "render_to_file_async", counting)
+    return rendered
+
+
+def test_unchanged_data_reuses_the_rendered_report(api, renders):
+    _add(api, 35.0)
+    _add(api, 45.0, "交通")
+
+    first = api.get("/analysis/visual_report", params={"user_id": USER}).json()["image_url"]
+    assert api.get("/analysis/visual_report", params={"user_id": USER}).json()["image_url"] == first
+    assert len(renders) == 1
+    filename = first.rsplit("/", 1)[-1]
+    assert os.path.exists(os.path.join("static", filename))
+    assert api.get(f"/static/{filename}").headers["content-type"] == "image/png"
+
+    # A cache entry whose file is gone is rendered again
+    os.remove(os.path.join("static", filename))
+    assert api.get("/analysis/visual_report", params={"user_id": USER}).json()["image_url"] == first
+    assert len(renders) == 2
+
+    # New data: a new fingerprint, so a new file
+    _add(api, 10.0)
+    second = api.get("/analysis/visual_report", params={"user_id": USER}).json()["image_url"]
+    assert second != first
+    assert len(renders) == 3
+
+
+def test_no_data_renders_nothing(api, renders):
+    body = api.get("/analysis/visual_report", params={"user_id": USER}).json()
+    assert body["image_url"] == "" and "message" in body
+    assert renders == []
+
+
+def test_png_is_returned_as_raw_bytes(api, renders):
+    assert api.get("/analysis/visual_report.png", params={"user_id": USER}).status_code == 404
+    _add(api, 35.0)
+
+    response = api.get("/analysis/visual_report.png", params={"user_id": USER})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert response.content.startswith(PNG_SIGNATURE)
+    # Kept on disk for the URL mode: same bytes, no second render
+    url = api.get("/analysis/visual_report", params={"user_id": USER}).json()["image_url"]
+    assert api.get(url).content == response.content
+    assert renders == []
+
+    encoded = api.get("/analysis/visual_report", params={"user_id": USER, "format": "base64"}).json()["image_base64"]
+    assert base64.b64decode(encoded) == response.content